@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import User, P9Form, TaxRecord, TaxZip, ClientProfile
+from .models import User, P9Form, TaxRecord, TaxZip, ClientProfile, TaxYearRules, P9Job, P9Line, TaxSummary
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 
 # 🔐 Custom User Admin to show roles
@@ -15,3 +15,7 @@ admin.site.register(P9Form)
 admin.site.register(TaxRecord)
 admin.site.register(TaxZip)
 admin.site.register(ClientProfile)
+admin.site.register(TaxYearRules)
+admin.site.register(P9Job)
+admin.site.register(P9Line)
+admin.site.register(TaxSummary)
@@ -0,0 +1,80 @@
+import time
+import zlib
+import struct
+
+# Kept free of model imports so process-pool workers can load it without Django
+
+CSV_HEADER = "Tax Year,Gross Income,Taxable Income,Computed PAYE"
+
+_LOCAL_HEADER = struct.Struct("<IHHHHHIIIHH")
+_CENTRAL_HEADER = struct.Struct("<IHHHHHHIIIHHHHHII")
+_END_RECORD = struct.Struct("<IHHHHIIH")
+_UTF8_NAMES = 0x800
+_DEFLATED = 8
+_MAX_SIZE = 0xFFFFFFFF
+
+
+def _dos_time(timestamp=None):
+    t = time.localtime(timestamp)
+    dos_date = (t.tm_year - 1980) << 9 | t.tm_mon << 5 | t.tm_mday
+    dos_time = t.tm_hour << 11 | t.tm_min << 5 | t.tm_sec // 2
+    return dos_time, dos_date
+
+
+def summary_line(year, gross, taxable, paye):
+    return f"\n{year},{gross},{taxable},{paye}"
+
+
+def summary_csv(rows):
+    return CSV_HEADER + "".join(summary_line(*row) for row in rows)
+
+
+# 🗜️ Render and raw-deflate one client's summary; runs in pool workers
+def render_summary_member(arcname, rows):
+    return deflate_member(arcname, summary_csv(rows))
+
+
+def deflate_member(arcname, text):
+    data = text.encode("utf-8")
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    compressed = compressor.compress(data) + compressor.flush()
+    return arcname, compressed, zlib.crc32(data), len(data)
+
+
+# 📦 Minimal ZIP writer for members that were already deflated elsewhere
+class DeflatedZipWriter:
+    def __init__(self, fp):
+        self.fp = fp
+        self.offset = 0
+        self.entries = []
+        self.dos_time, self.dos_date = _dos_time()
+
+    def _write(self, data):
+        self.fp.write(data)
+        self.offset += len(data)
+
+    def add(self, arcname, compressed, crc, size):
+        if max(self.offset, len(compressed), size) > _MAX_SIZE or len(self.entries) >= 0xFFFF:
+            raise ValueError("Archive too large for a non-ZIP64 writer.")
+        name = arcname.encode("utf-8")
+        header_offset = self.offset
+        self._write(_LOCAL_HEADER.pack(
+            0x04034B50, 20, _UTF8_NAMES, _DEFLATED, self.dos_time, self.dos_date,
+            crc, len(compressed), size, len(name), 0,
+        ))
+        self._write(name)
+        self._write(compressed)
+        self.entries.append((name, crc, len(compressed), size, header_offset))
+
+    def close(self):
+        directory_offset = self.offset
+        for name, crc, compressed_size, size, header_offset in self.entries:
+            self._write(_CENTRAL_HEADER.pack(
+                0x02014B50, 20, 20, _UTF8_NAMES, _DEFLATED, self.dos_time, self.dos_date,
+                crc, compressed_size, size, len(name), 0, 0, 0, 0, 0o600 << 16, header_offset,
+            ))
+            self._write(name)
+        count = len(self.entries)
+        self._write(_END_RECORD.pack(
+            0x06054B50, 0, 0, count, count, self.offset - directory_offset, directory_offset, 0,
+        ))
@@ -0,0 +1,252 @@
+import os
+import asyncio
+import datetime
+import functools
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.files import File
+from django.http import HttpResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from .dashboard import etag_matches
+from .instrumentation import serializing
+from .downloads import download_url, serve_file
+from .exports import ZipStream, atax_summary_lines, zip_response, find_cached_zip
+from .jobs import accept_p9
+from .models import TaxRecord, TaxZip, TaxYearRules
+from .p9 import P9UploadHandler
+from .permissions import IsTaxpayer, IsAgent
+from .renderers import dumps
+from .routers import read_from_replica
+from .serializers import P9UploadSerializer, TaxRecordSerializer
+from .tax import get_rules
+from .throttling import UploadTooLarge, admit_request, release_when_sent
+from .views import AgentClientListView, p9_job_accepted
+
+_pool = None
+
+
+# 🧵 Bounded pool for CSV parsing, compression and file I/O, so the event loop never blocks on them
+def cpu_pool():
+    global _pool
+    if _pool is None:
+        workers = getattr(settings, "ASYNC_CPU_WORKERS", None) or min(4, os.cpu_count() or 1)
+        _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="taxika-cpu")
+    return _pool
+
+
+async def run_in_pool(func, *args, **kwargs):
+    # Nothing run here may touch the ORM; DB work goes through sync_to_async
+    return await asyncio.get_running_loop().run_in_executor(cpu_pool(), functools.partial(func, *args, **kwargs))
+
+
+def _json(data, status=200, headers=None):
+    with serializing():
+        content = dumps(data)
+    return HttpResponse(content, status=status, headers=headers, content_type="application/json")
+
+
+def _error(exc):
+    # As DRF's exception handler renders it, Retry-After included
+    headers = {"Retry-After": "%d" % exc.wait} if getattr(exc, "wait", None) else None
+    return _json({"detail": exc.detail}, status=exc.status_code, headers=headers)
+
+
+def _authenticate(request, permission):
+    # Same authenticators and permission classes as the DRF views
+    drf_request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    try:
+        allowed = permission().has_permission(drf_request, None)
+    except exceptions.APIException as e:
+        return drf_request, _error(e)
+    if allowed:
+        return drf_request, None
+    if not drf_request.successful_authenticator:
+        return drf_request, _json({"detail": exceptions.NotAuthenticated.default_detail}, status=401)
+    return drf_request, _json({"detail": exceptions.PermissionDenied.default_detail}, status=403)
+
+
+async def authenticate(request, permission):
+    return await sync_to_async(_authenticate)(request, permission)
+
+
+def _admit(drf_request, scope, max_bytes):
+    try:
+        return admit_request(drf_request, scope, max_bytes), None
+    except exceptions.APIException as e:
+        return None, _error(e)
+
+
+# 🛂 Rate limits, upload size and a concurrency slot, as AdmissionMixin applies them to the DRF views
+async def admit(drf_request, scope, max_bytes=None):
+    return await sync_to_async(_admit)(drf_request, scope, max_bytes)
+
+
+async def _holding_slot(release, response):
+    try:
+        response = await response
+    except UploadTooLarge as e:
+        response = _error(e)
+    except BaseException:
+        release()
+        raise
+    return release_when_sent(response, release)
+
+
+# 📦 iter_zip for async rows: lines are batched off the cursor, each batch deflated in the pool
+async def aiter_zip(arcname, lines, batch_size=2000):
+    stream = ZipStream()
+    stream.open(arcname)
+    batch = []
+    async for line in lines:
+        batch.append(line)
+        if len(batch) >= batch_size:
+            chunk = await run_in_pool(stream.write, batch)
+            batch = []
+            if chunk:
+                yield chunk
+    if batch:
+        yield await run_in_pool(stream.write, batch)
+    yield await run_in_pool(stream.close)
+
+
+# 💾 build_zip_file for async rows: spooled to a temp file chunk by chunk, never held whole
+async def abuild_zip_file(arcname, lines, name):
+    tmp = tempfile.TemporaryFile()
+    try:
+        async for chunk in aiter_zip(arcname, lines):
+            await run_in_pool(tmp.write, chunk)
+    except BaseException:
+        tmp.close()
+        raise
+    tmp.seek(0)
+    return File(tmp, name=name)
+
+
+def _flag(request, name, default=False):
+    value = request.GET.get(name)
+    if value is None:
+        return default
+    return value.lower() in ("1", "true", "yes")
+
+
+def _parse_multipart(request):
+    return request.POST, request.FILES
+
+
+# 📤 Async P9 upload: slow bodies wait on the event loop, parsing runs in the pool
+@method_decorator(csrf_exempt, name="dispatch")
+class AsyncP9UploadView(View):
+    http_method_names = ["post"]
+
+    async def post(self, request):
+        drf_request, denied = await authenticate(request, IsTaxpayer)
+        if denied:
+            return denied
+        max_bytes = getattr(settings, "P9_UPLOAD_MAX_BYTES", 10 * 1024 * 1024)
+        release, denied = await admit(drf_request, "upload", max_bytes)
+        if denied:
+            return denied
+        return await _holding_slot(release, self.upload(request, drf_request))
+
+    async def upload(self, request, drf_request):
+        user_id = drf_request.user.id
+        background = _flag(request, "background", getattr(settings, "P9_BACKGROUND_UPLOADS", False))
+
+        p9_handler = P9UploadHandler(request, parse=not background)
+        request.upload_handlers.insert(0, p9_handler)
+        data, files = await run_in_pool(_parse_multipart, request)
+
+        upload = files.get("file")
+        if upload is None:
+            return _json({"file": ["No file was submitted."]}, status=400)
+        if p9_handler.error:
+            return _json({"file": [p9_handler.error]}, status=400)
+        try:
+            rules = await sync_to_async(get_rules)(data.get("year"))
+        except TaxYearRules.DoesNotExist:
+            return _json({"year": ["No tax rules for this year."]}, status=400)
+
+        incremental = _flag(request, "incremental", getattr(settings, "P9_INCREMENTAL_UPLOADS", True))
+        p9, job, tax_record, changed, duplicate = await sync_to_async(accept_p9)(
+            user_id, rules, p9_handler.content_hash, p9_handler.totals, upload, background, incremental
+        )
+        if job:
+            return _json(p9_job_accepted(request, job), status=202)
+        body = {
+            "p9": P9UploadSerializer(p9, context={"request": drf_request}).data,
+            "tax_record": TaxRecordSerializer(tax_record).data,
+            "changed_months": changed
+        }
+        if duplicate:
+            body["duplicate"] = True
+        return _json(body)
+
+
+# 📦 Async taxpayer ZIP: rows via async iteration, compression in the pool
+class AsyncGenerateZipView(View):
+    http_method_names = ["get"]
+
+    async def get(self, request):
+        drf_request, denied = await authenticate(request, IsTaxpayer)
+        if denied:
+            return denied
+        release, denied = await admit(drf_request, "export")
+        if denied:
+            return denied
+        return await _holding_slot(release, self.export(request, drf_request))
+
+    async def export(self, request, drf_request):
+        user = drf_request.user
+        await sync_to_async(read_from_replica)(user)
+        tax_records = TaxRecord.objects.filter(user_id=user.id)
+        if not await tax_records.aexists():
+            return _json({"error": "No tax records found."}, status=404)
+
+        arcname = "tax_summary.csv"
+        tax_zip, fingerprint = await sync_to_async(find_cached_zip)(user, arcname, tax_records)
+        username = await sync_to_async(getattr)(user, "username")
+        file_name = f"taxika_{username}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+        if _flag(request, "stream"):
+            if tax_zip:
+                return await sync_to_async(serve_file)(request, tax_zip.zip_file)
+            return zip_response(aiter_zip(arcname, atax_summary_lines(tax_records)), file_name)
+
+        if tax_zip is None:
+            zip_file = await abuild_zip_file(arcname, atax_summary_lines(tax_records), file_name)
+            with zip_file:
+                tax_zip = await TaxZip.objects.acreate(
+                    user_id=user.id, created_by_id=user.id, zip_file=zip_file, fingerprint=fingerprint
+                )
+
+        return _json({
+            "message": "ZIP generated",
+            "download_url": download_url(drf_request, "zip", tax_zip)
+        })
+
+
+# 🧑‍💼 Async agent client list: same cache, ETags and cursor pages as the sync view
+class AsyncAgentClientListView(View):
+    http_method_names = ["get"]
+
+    async def get(self, request):
+        drf_request, denied = await authenticate(request, IsAgent)
+        if denied:
+            return denied
+        # DRF's cursor paginator is synchronous, so the page is built in one thread hop
+        entry = await sync_to_async(self.cached_page)(drf_request)
+
+        headers = {"ETag": entry["etag"]}
+        if etag_matches(request, entry["etag"]):
+            return HttpResponse(status=304, headers=headers)
+        return _json(entry["data"], headers=headers)
+
+    def cached_page(self, drf_request):
+        read_from_replica(drf_request.user)
+        return AgentClientListView().cached_page(drf_request)
@@ -0,0 +1,82 @@
+import time
+from threading import Lock
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.utils.functional import SimpleLazyObject
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from .models import User
+
+# Per-process cache of {user_id: (expires_at, status)}
+_user_status = {}
+_lock = Lock()
+_MAX_CACHED_USERS = 10000
+
+
+def _status_ttl():
+    return getattr(settings, "JWT_USER_STATUS_SECONDS", 60)
+
+
+# 🔎 Role/active flags for a user, re-read from the DB at most once per TTL
+def user_status(user_id):
+    now = time.monotonic()
+    cached = _user_status.get(user_id)
+    if cached and cached[0] > now:
+        return cached[1]
+
+    status = User.objects.filter(pk=user_id).values("role", "is_active", "is_staff").first()
+    with _lock:
+        if len(_user_status) >= _MAX_CACHED_USERS:
+            _user_status.clear()
+        _user_status[user_id] = (now + _status_ttl(), status)
+    return status
+
+
+def forget_user_status(user_id):
+    with _lock:
+        _user_status.pop(user_id, None)
+
+
+# 🪪 request.user that answers permission checks from claims and loads the row on demand
+class ClaimsUser(SimpleLazyObject):
+    def __init__(self, user_id, status):
+        super().__init__(lambda: User.objects.get(pk=user_id))
+        self.__dict__["_claims"] = {
+            "id": user_id,
+            "pk": user_id,
+            "role": status["role"],
+            "is_active": status["is_active"],
+            "is_staff": status["is_staff"],
+            "is_authenticated": True,
+            "is_anonymous": False,
+        }
+
+    def __bool__(self):
+        # DRF's IsAdminUser starts with bool(request.user); a token's user always exists
+        return True
+
+    def __getattr__(self, name):
+        claims = self.__dict__.get("_claims", {})
+        if name in claims:
+            return claims[name]
+        return super().__getattr__(name)
+
+
+# 🔐 JWT auth without the per-request User lookup
+class StatelessJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        try:
+            # Claims carry the id as a string; use the same type as User.pk
+            user_id = User._meta.pk.to_python(validated_token[api_settings.USER_ID_CLAIM])
+        except (KeyError, ValidationError) as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        status = user_status(user_id)
+        if status is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        if api_settings.CHECK_USER_IS_ACTIVE and not status["is_active"]:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        return ClaimsUser(user_id, status)
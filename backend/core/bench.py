@@ -0,0 +1,438 @@
+import io
+import os
+import sys
+import json
+import time
+import asyncio
+import random
+import itertools
+import platform
+import statistics
+import gzip
+import subprocess
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from decimal import Decimal
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.wsgi import get_wsgi_application
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from rest_framework.renderers import JSONRenderer
+from rest_framework_simplejwt.tokens import RefreshToken
+from .compression import BROTLI_QUALITY, brotli
+from .models import User, TaxRecord, ClientProfile, TaxYearRules
+from .renderers import FastJSONRenderer, orjson
+from .routers import coordination_cache
+from .serializers import TaxRecordSerializer, TAX_RECORD_ROWS
+from .summaries import rebuild_summaries
+from .tax import get_rules
+
+MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+BATCH_SIZE = 5000
+
+
+class RequestFailed(Exception):
+    pass
+
+
+def _batches(items, size=BATCH_SIZE):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# 🧾 Synthetic P9 CSV with `rows` monthly lines
+def synthetic_p9(rows=12, seed=0):
+    rng = random.Random(seed)
+    lines = ["Month,Basic Salary,Benefits"]
+    for i in range(rows):
+        salary = rng.randrange(20000, 400000, 500)
+        benefits = rng.randrange(0, 50000, 250)
+        lines.append(f"{MONTHS[i % 12]},{salary},{benefits}")
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+# 🌱 Seed taxpayers, agents, assignments and multi-year TaxRecords
+def seed(taxpayers, agents, clients_per_agent, years, seed=0, prefix="bench_", stdout=None):
+    rng = random.Random(seed)
+    password = make_password("bench-password")
+    say = stdout.write if stdout else (lambda message: None)
+
+    def users(role, count):
+        for i in range(count):
+            yield User(username=f"{prefix}{role}_{i}", email=f"{prefix}{role}_{i}@example.com",
+                       role=role, password=password)
+
+    for role, count in (("taxpayer", taxpayers), ("agent", agents)):
+        for batch in _batches(users(role, count)):
+            User.objects.bulk_create(batch, ignore_conflicts=True)
+        say(f"Seeded {count} {role}s")
+
+    taxpayer_ids = list(
+        User.objects.filter(username__startswith=f"{prefix}taxpayer_").order_by("id").values_list("id", flat=True)
+    )
+    agent_ids = list(
+        User.objects.filter(username__startswith=f"{prefix}agent_").order_by("id").values_list("id", flat=True)
+    )
+
+    per_agent = min(clients_per_agent, len(taxpayer_ids))
+    profiles = (
+        ClientProfile(agent_id=agent_id, taxpayer_id=taxpayer_id)
+        for agent_id in agent_ids
+        for taxpayer_id in rng.sample(taxpayer_ids, per_agent)
+    )
+    for batch in _batches(profiles):
+        ClientProfile.objects.bulk_create(batch, ignore_conflicts=True)
+    say(f"Assigned {per_agent} clients to each of {len(agent_ids)} agents")
+
+    configured = set(TaxYearRules.objects.values_list("year", flat=True))
+    created = 0
+    for batch in _batches(taxpayer_ids, BATCH_SIZE // max(len(years), 1) or 1):
+        records = []
+        for year in years:
+            rules = get_rules(year if year in configured else None)
+            incomes = [rng.randrange(100000, 6000000, 100) for _ in batch]
+            for user_id, income, paye in zip(batch, incomes, rules.paye_many(incomes)):
+                records.append(TaxRecord(
+                    user_id=user_id, year=year, gross_income=income, taxable_income=income,
+                    computed_paye=Decimal(f"{paye:.2f}"),
+                ))
+        with transaction.atomic():
+            TaxRecord.objects.bulk_create(records)
+        created += len(records)
+    say(f"Created {created} tax records across {len(years)} years")
+    # Records were bulk-created, so the summaries are built in one pass afterwards
+    drift = rebuild_summaries()
+    say(f"Rebuilt {len(drift)} summary rows")
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _summary(latencies_ms, elapsed, peak_bytes, statuses):
+    ordered = sorted(latencies_ms)
+    return {
+        "requests": len(ordered),
+        "p50_ms": round(statistics.median(ordered), 2),
+        "p99_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))], 2),
+        "mean_ms": round(statistics.fmean(ordered), 2),
+        "throughput_rps": round(len(ordered) / elapsed, 2) if elapsed else None,
+        "peak_memory_kb": round(peak_bytes / 1024, 1) if peak_bytes is not None else None,
+        "statuses": sorted(set(statuses)),
+    }
+
+
+# 🚦 Time the endpoints, not the admission limits in front of them: no rate limits, a slot for
+# every request, and no throttle history from earlier runs
+@contextmanager
+def unthrottled():
+    rest = dict(getattr(settings, "REST_FRAMEWORK", {}), DEFAULT_THROTTLE_RATES={})
+    with override_settings(REST_FRAMEWORK=rest, EXPENSIVE_REQUEST_SLOTS=sys.maxsize, EXPENSIVE_SLOTS_BY_ROLE={}):
+        cache.clear()
+        coordination_cache().clear()
+        yield
+
+
+def _check(name, statuses):
+    # An error answered fast would pass for a fast endpoint
+    failed = sorted({status for status in statuses if not 200 <= status < 300})
+    if failed:
+        raise RequestFailed(f"{name} answered {', '.join(map(str, failed))}; fix the setup before timing it.")
+
+
+# ⏱️ Time one endpoint: a timed pass, then a traced pass for peak memory
+def measure(call, iterations, memory_iterations, before=None):
+    latencies, statuses = [], []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        if before:
+            before()
+        t = time.perf_counter()
+        response = call()
+        if getattr(response, "streaming", False):
+            for _chunk in response.streaming_content:
+                pass
+        latencies.append((time.perf_counter() - t) * 1000)
+        statuses.append(response.status_code)
+        _check(response.request["PATH_INFO"], statuses[-1:])
+    elapsed = time.perf_counter() - started
+
+    peak = 0
+    for _ in range(memory_iterations):
+        if before:
+            before()
+        tracemalloc.start()
+        response = call()
+        if getattr(response, "streaming", False):
+            for _chunk in response.streaming_content:
+                pass
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        _check(response.request["PATH_INFO"], [response.status_code])
+    return _summary(latencies, elapsed, peak, statuses)
+
+
+# 🏁 Benchmark the hot endpoints against seeded data
+def run_benchmark(iterations=50, memory_iterations=3, p9_rows=12, prefix="bench_", cold=False, host="localhost"):
+    taxpayer = User.objects.filter(username__startswith=f"{prefix}taxpayer_", role="taxpayer").order_by("id").first()
+    agent = (
+        User.objects.filter(username__startswith=f"{prefix}agent_", role="agent", clients__isnull=False)
+        .order_by("id").first()
+    )
+    if taxpayer is None or agent is None:
+        raise LookupError("No seeded data found; run `manage.py seed_data` first.")
+    client_id = agent.clients.order_by("id").values_list("taxpayer_id", flat=True).first()
+
+    def http(user):
+        token = RefreshToken.for_user(user).access_token
+        return Client(HTTP_HOST=host, HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    as_taxpayer, as_agent = http(taxpayer), http(agent)
+    before = cache.clear if cold else None
+    salts = itertools.count(1)
+
+    def post_p9(p9):
+        return as_taxpayer.post("/api/upload-p9/", {"file": SimpleUploadedFile("bench_p9.csv", p9)})
+
+    def upload():
+        # A different file every time: resending the last upload's bytes takes the duplicate shortcut
+        return post_p9(synthetic_p9(p9_rows, seed=next(salts)))
+
+    duplicate = synthetic_p9(p9_rows)
+
+    def upload_duplicate():
+        return post_p9(duplicate)
+
+    endpoints = {
+        "upload-p9/": upload,
+        "upload-p9/ duplicate": upload_duplicate,
+        "generate-zip/": lambda: as_taxpayer.get("/api/generate-zip/"),
+        "agent/clients/": lambda: as_agent.get("/api/agent/clients/"),
+        "agent/clients/<id>/zip/": lambda: as_agent.get(f"/api/agent/clients/{client_id}/zip/"),
+    }
+    results = {}
+    with unthrottled():
+        for name, call in endpoints.items():
+            if call is upload_duplicate:
+                # Store these bytes once so every timed request repeats the latest upload
+                post_p9(duplicate)
+            results[name] = measure(call, iterations, memory_iterations, before)
+
+    return {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "database": connection.vendor,
+        "dataset": {
+            "users": User.objects.count(),
+            "tax_records": TaxRecord.objects.count(),
+            "client_profiles": ClientProfile.objects.count(),
+            "agent_clients": agent.clients.count(),
+            "p9_rows": p9_rows,
+        },
+        "settings": {"iterations": iterations, "memory_iterations": memory_iterations, "cold_cache": cold},
+        "endpoints": results,
+    }
+
+
+class _SlowInput:
+    # wsgi.input that trickles the body in like a slow client
+    def __init__(self, body, chunk_bytes, delay):
+        self.body = io.BytesIO(body)
+        self.chunk_bytes = chunk_bytes
+        self.delay = delay
+
+    def read(self, size=-1):
+        time.sleep(self.delay)
+        size = self.chunk_bytes if size is None or size < 0 else min(size, self.chunk_bytes)
+        return self.body.read(size)
+
+    def readline(self, size=-1):
+        return self.body.readline(size)
+
+
+def _call_wsgi(app, method, path, headers, body, chunk_bytes, delay):
+    environ = {
+        "REQUEST_METHOD": method, "PATH_INFO": path, "SCRIPT_NAME": "", "QUERY_STRING": "",
+        "SERVER_NAME": headers["host"], "SERVER_PORT": "80", "SERVER_PROTOCOL": "HTTP/1.1",
+        "CONTENT_LENGTH": str(len(body)), "wsgi.input": _SlowInput(body, chunk_bytes, delay),
+        "wsgi.url_scheme": "http", "wsgi.errors": sys.stderr, "wsgi.version": (1, 0),
+        "wsgi.multithread": True, "wsgi.multiprocess": False, "wsgi.run_once": False,
+    }
+    for name, value in headers.items():
+        key = name.upper().replace("-", "_")
+        environ[key if key == "CONTENT_TYPE" else f"HTTP_{key}"] = value
+
+    status = []
+    result = app(environ, lambda line, response_headers, exc_info=None: status.append(line))
+    try:
+        for _chunk in result:
+            pass
+    finally:
+        getattr(result, "close", lambda: None)()
+    return int(status[0].split()[0])
+
+
+async def _call_asgi(app, method, path, headers, body, chunk_bytes, delay):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method,
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": [(name.encode(), value.encode()) for name, value in headers.items()]
+        + [(b"content-length", str(len(body)).encode())],
+        "client": ("127.0.0.1", 0), "server": (headers["host"], 80),
+    }
+    chunks = [body[i:i + chunk_bytes] for i in range(0, len(body), chunk_bytes)] or [b""]
+    status = []
+
+    async def receive():
+        if chunks:
+            await asyncio.sleep(delay)
+            chunk = chunks.pop(0)
+            return {"type": "http.request", "body": chunk, "more_body": bool(chunks)}
+        # Stay connected; Django cancels this wait once the response is sent
+        await asyncio.Future()
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    await app(scope, receive, send)
+    return status[0]
+
+
+# 🐢 Same burst of concurrent requests through a fixed WSGI worker pool and one ASGI event loop
+def compare_servers(concurrency=50, workers=4, p9_rows=12, chunk_bytes=256, chunk_delay=0.02,
+                    prefix="bench_", host="localhost"):
+    taxpayer = User.objects.filter(username__startswith=f"{prefix}taxpayer_", role="taxpayer").order_by("id").first()
+    agent = User.objects.filter(username__startswith=f"{prefix}agent_", role="agent").order_by("id").first()
+    if taxpayer is None or agent is None:
+        raise LookupError("No seeded data found; run `manage.py seed_data` first.")
+
+    def headers(user, **extra):
+        return {"host": host, "authorization": f"Bearer {RefreshToken.for_user(user).access_token}", **extra}
+
+    salts = itertools.count(1)
+
+    def upload_bodies():
+        # One distinct P9 per request, so none of them is a duplicate of the last upload
+        return [
+            encode_multipart(BOUNDARY, {"file": SimpleUploadedFile("bench_p9.csv", synthetic_p9(p9_rows, seed=next(salts)))})
+            for _ in range(concurrency)
+        ]
+
+    def no_bodies():
+        return [b""] * concurrency
+
+    # (name, method, WSGI path, ASGI path, headers, bodies for one burst)
+    cases = [
+        ("upload-p9/", "POST", "/api/upload-p9/", "/api/async/upload-p9/",
+         headers(taxpayer, **{"content-type": MULTIPART_CONTENT}), upload_bodies),
+        ("generate-zip/", "GET", "/api/generate-zip/", "/api/async/generate-zip/", headers(taxpayer), no_bodies),
+        ("agent/clients/", "GET", "/api/agent/clients/", "/api/async/agent/clients/", headers(agent), no_bodies),
+    ]
+    wsgi_app, asgi_app = get_wsgi_application(), get_asgi_application()
+
+    # Every request arrives at once, so latency includes time spent queued for a worker
+    def run_wsgi(method, path, request_headers, bodies):
+        def timed(body):
+            code = _call_wsgi(wsgi_app, method, path, request_headers, body, chunk_bytes, chunk_delay)
+            return (time.perf_counter() - started) * 1000, code
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(timed, bodies))
+        return results, time.perf_counter() - started
+
+    async def run_asgi(method, path, request_headers, bodies):
+        async def timed(body):
+            code = await _call_asgi(asgi_app, method, path, request_headers, body, chunk_bytes, chunk_delay)
+            return (time.perf_counter() - started) * 1000, code
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(timed(body) for body in bodies))
+        return results, time.perf_counter() - started
+
+    comparison = {}
+    upload_bytes = 0
+    with unthrottled():
+        for name, method, wsgi_path, asgi_path, request_headers, bodies in cases:
+            comparison[name] = {}
+            wsgi_bodies, asgi_bodies = bodies(), bodies()
+            upload_bytes = max(upload_bytes, *map(len, wsgi_bodies))
+            for server, (results, elapsed) in (
+                ("wsgi", run_wsgi(method, wsgi_path, request_headers, wsgi_bodies)),
+                ("asgi", asyncio.run(run_asgi(method, asgi_path, request_headers, asgi_bodies))),
+            ):
+                statuses = [code for _, code in results]
+                _check(f"{name} ({server})", statuses)
+                comparison[name][server] = _summary([latency for latency, _ in results], elapsed, None, statuses)
+
+    return {
+        "concurrency": concurrency,
+        "wsgi_workers": workers,
+        "upload_bytes": upload_bytes,
+        "slow_client": {"chunk_bytes": chunk_bytes, "chunk_delay_s": chunk_delay},
+        "endpoints": comparison,
+    }
+
+
+# 🧮 CPU per 10k TaxRecords to fetch, serialize and render: ModelSerializer + stdlib JSON
+# (before) against .values() rows + the fast renderer (after); best of `repeat` runs
+def compare_serializers(records=10000, repeat=5):
+    queryset = TaxRecord.objects.order_by("id")[:records]
+    count = queryset.count()
+    if not count:
+        raise LookupError("No tax records found; run `manage.py seed_data` first.")
+
+    def before():
+        return JSONRenderer().render(TaxRecordSerializer(list(queryset), many=True).data)
+
+    def after():
+        return FastJSONRenderer().render(TAX_RECORD_ROWS.many(TAX_RECORD_ROWS.rows(queryset)))
+
+    def cpu_ms(call):
+        best = None
+        for _ in range(repeat):
+            started = time.process_time()
+            body = call()
+            spent = time.process_time() - started
+            best = spent if best is None else min(best, spent)
+        return round(best * 1000 * 10000 / count, 2), body
+
+    before_ms, body = cpu_ms(before)
+    after_ms, fast_body = cpu_ms(after)
+    if json.loads(body) != json.loads(fast_body):
+        raise AssertionError("Fast rows do not match TaxRecordSerializer output.")
+    return {
+        "records": count,
+        "orjson": orjson is not None,
+        "cpu_ms_per_10k": {"before": before_ms, "after": after_ms},
+        "speedup": round(before_ms / after_ms, 2) if after_ms else None,
+        "json_bytes": len(fast_body),
+        "gzip_bytes": len(gzip.compress(fast_body, compresslevel=6)),
+        "brotli_bytes": len(brotli.compress(fast_body, quality=BROTLI_QUALITY)) if brotli else None,
+    }
+
+
+def write_results(results, path):
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.http import FileResponse
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.regex_helper import _lazy_re_compile
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is used without it
+    brotli = None
+
+# Dynamic responses: fast levels, most of the size win
+BROTLI_QUALITY = 5
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+
+_accepts_br = _lazy_re_compile(r"\bbr\b")
+
+
+def _compressible(response):
+    content_type = response.get("Content-Type", "")
+    # File downloads (even text/csv P9s) keep their length, strong ETag, byte ranges and sendfile()
+    if (
+        isinstance(response, FileResponse)
+        or response.has_header("Accept-Ranges")
+        or response.get("Content-Disposition", "").startswith("attachment")
+    ):
+        return False
+    return response.status_code != 206 and content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+# 🗜️ Brotli for clients that accept it, gzip otherwise, JSON and text only.
+# API responses carry bearer-token data, not CSRF secrets in pages, which is what BREACH targets.
+class CompressionMiddleware(GZipMiddleware):
+    def process_response(self, request, response):
+        if not getattr(settings, "RESPONSE_COMPRESSION", True) or not _compressible(response):
+            return response
+        accepts_br = _accepts_br.search(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if brotli is None or response.streaming or not accepts_br:
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        if len(response.content) < self.min_length or response.has_header("Content-Encoding"):
+            return response
+        compressed = brotli.compress(response.content, quality=BROTLI_QUALITY)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response.headers["Content-Length"] = str(len(compressed))
+        # Same bytes, different encoding: the validator can only be weak now (as GZipMiddleware does)
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = "br"
+        return response
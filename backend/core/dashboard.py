@@ -0,0 +1,55 @@
+import json
+import uuid
+import hashlib
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from .models import ClientProfile
+from .routers import reading_from_replica, pin_seconds
+
+# Entries are also dropped by signals; this only bounds how long unused ones linger
+DASHBOARD_CACHE_SECONDS = 15 * 60
+
+
+def _version_key(agent_id):
+    return f"dashboard:version:{agent_id}"
+
+
+# 🔑 Cache key for one agent's client list page (filters + cursor + host)
+def dashboard_cache_key(agent_id, request):
+    version = cache.get_or_set(_version_key(agent_id), uuid.uuid4().hex, None)
+    params = sorted(request.query_params.lists())
+    digest = hashlib.sha1(repr((request.get_host(), params)).encode("utf-8")).hexdigest()
+    return f"dashboard:clients:{agent_id}:{version}:{digest}"
+
+
+def cache_dashboard(key, data):
+    body = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True).encode("utf-8")
+    entry = {"etag": f'"{hashlib.sha1(body).hexdigest()}"', "data": data}
+    # A lagging replica may have missed the write that bumped the version
+    timeout = pin_seconds() if reading_from_replica() else DASHBOARD_CACHE_SECONDS
+    cache.set(key, entry, timeout)
+    return entry
+
+
+def _opaque(tag):
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def etag_matches(request, etag):
+    header = request.headers.get("If-None-Match", "")
+    # Weak comparison (RFC 9110): compressed responses hand out W/"..." tags
+    return header.strip() == "*" or _opaque(etag) in [_opaque(tag) for tag in header.split(",")]
+
+
+# 🧹 Drop cached dashboards for these agents
+def invalidate_agents(agent_ids):
+    cache.set_many({_version_key(agent_id): uuid.uuid4().hex for agent_id in set(agent_ids)}, None)
+
+
+# 🧹 Drop cached dashboards of every agent managing these taxpayers
+def invalidate_taxpayers(taxpayer_ids):
+    agent_ids = ClientProfile.objects.filter(taxpayer_id__in=list(taxpayer_ids)).values_list(
+        "agent_id", flat=True
+    )
+    invalidate_agents(agent_ids)
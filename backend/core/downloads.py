@@ -0,0 +1,145 @@
+import os
+import re
+import hashlib
+import mimetypes
+from urllib.parse import quote
+from django.conf import settings
+from django.core import signing
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.http import content_disposition_header
+from .dashboard import etag_matches
+from .models import P9Form, TaxZip, ClientProfile
+
+# Signed download links stop working after this long
+DOWNLOAD_LINK_SECONDS = 15 * 60
+# Read size for ranged responses served by Django itself
+RANGE_CHUNK_BYTES = 64 * 1024
+
+_SALT = "core.downloads"
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+# kind -> (model, file field, url name)
+DOWNLOADS = {
+    "zip": (TaxZip, "zip_file", "download-zip"),
+    "p9": (P9Form, "file", "download-p9"),
+}
+
+
+# 🔗 Short-lived link to a file, bound to the user who was allowed to see it
+def download_url(request, kind, obj):
+    token = signing.dumps({"kind": kind, "id": obj.pk, "user": request.user.id}, salt=_SALT)
+    url = reverse(DOWNLOADS[kind][2], args=[obj.pk])
+    return request.build_absolute_uri(f"{url}?token={token}")
+
+
+# 🔓 User id a download link was issued to, or None if it is missing, forged or expired
+def link_user_id(token, kind, pk):
+    try:
+        claims = signing.loads(token, salt=_SALT, max_age=DOWNLOAD_LINK_SECONDS)
+    except signing.BadSignature:
+        return None
+    if claims.get("kind") != kind or claims.get("id") != pk:
+        return None
+    return claims.get("user")
+
+
+# 🛂 Owners can fetch their files; agents can fetch files of their assigned clients
+def can_download(user_id, owner_id):
+    if user_id == owner_id:
+        return True
+    return ClientProfile.objects.filter(agent_id=user_id, taxpayer_id=owner_id).exists()
+
+
+# 🏷️ Strong validator: stored files are never rewritten in place, so name + size + mtime pin the bytes
+def file_etag(field_file, size):
+    storage = field_file.storage
+    try:
+        modified = storage.get_modified_time(field_file.name).timestamp()
+    except (NotImplementedError, OSError):
+        modified = ""
+    digest = hashlib.sha1(f"{field_file.name}:{size}:{modified}".encode("utf-8")).hexdigest()
+    return f'"{digest}"'
+
+
+def _byte_range(header, size):
+    # Single "bytes=a-b" ranges only; anything else gets the whole file (RFC 9110 allows ignoring Range)
+    match = _RANGE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first == "":
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if last and int(last) < start:
+            return None
+    return start, end
+
+
+def _read_range(handle, start, length):
+    try:
+        handle.seek(start)
+        while length > 0:
+            chunk = handle.read(min(RANGE_CHUNK_BYTES, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        handle.close()
+
+
+def _offloaded(field_file, mode):
+    # The proxy streams the bytes (and handles Range itself); Django only authorizes
+    response = HttpResponse()
+    if mode == "x-accel-redirect":
+        prefix = getattr(settings, "DOWNLOAD_ACCEL_PREFIX", "/protected-media/")
+        response["X-Accel-Redirect"] = prefix.rstrip("/") + "/" + quote(field_file.name)
+    else:
+        response["X-Sendfile"] = field_file.path
+    # Let nginx pick the type from the file, not from this empty response
+    del response["Content-Type"]
+    return response
+
+
+# 📥 Serve a stored file: proxy offload if configured, else sendfile-able FileResponse with ranges
+def serve_file(request, field_file, filename=None):
+    filename = filename or os.path.basename(field_file.name)
+    size = field_file.size
+    etag = file_etag(field_file, size)
+    headers = {"ETag": etag, "Accept-Ranges": "bytes", "Cache-Control": "private"}
+
+    if etag_matches(request, etag):
+        response = HttpResponse(status=304)
+    elif mode := getattr(settings, "DOWNLOAD_OFFLOAD", None):
+        response = _offloaded(field_file, mode)
+        response["Content-Disposition"] = content_disposition_header(True, filename)
+    else:
+        byte_range = None
+        range_header = request.headers.get("Range")
+        if_range = request.headers.get("If-Range")
+        if range_header and (if_range is None or if_range.strip() == etag):
+            byte_range = _byte_range(range_header, size)
+
+        if byte_range and byte_range[0] >= size:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+        elif byte_range:
+            start, end = byte_range
+            length = end - start + 1
+            content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+            response = StreamingHttpResponse(
+                _read_range(field_file.open("rb"), start, length), status=206, content_type=content_type
+            )
+            response["Content-Length"] = str(length)
+            response["Content-Range"] = f"bytes {start}-{end}/{size}"
+            response["Content-Disposition"] = content_disposition_header(True, filename)
+        else:
+            # WSGI servers hand a real file to sendfile() via wsgi.file_wrapper
+            response = FileResponse(field_file.open("rb"), as_attachment=True, filename=filename)
+
+    for name, value in headers.items():
+        response[name] = value
+    return response
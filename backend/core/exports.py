@@ -0,0 +1,233 @@
+import os
+import uuid
+import hashlib
+import tempfile
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files import File
+from django.http import StreamingHttpResponse
+from .models import TaxZip, TaxRecord, active_clients
+from .routers import reading_from_replica, pin_seconds
+from .archives import CSV_HEADER, summary_line, render_summary_member, DeflatedZipWriter
+
+# Hand compressed bytes on once at least this much has built up
+FLUSH_BYTES = 64 * 1024
+# How long a computed fingerprint is trusted between record writes
+EXPORT_CACHE_SECONDS = 60 * 60
+# Agent bulk exports only fan out to worker processes past this many clients
+PARALLEL_EXPORT_MIN_CLIENTS = 20
+
+
+# 🧾 Tax summary CSV, one line at a time, straight off a DB cursor
+def tax_summary_lines(tax_records):
+    yield CSV_HEADER
+    rows = tax_records.order_by("pk").values_list(
+        "year", "gross_income", "taxable_income", "computed_paye"
+    )
+    for year, gross, taxable, paye in rows.iterator(chunk_size=2000):
+        yield summary_line(year, gross, taxable, paye)
+
+
+# 🧾 Same CSV lines for async views, fetched with async iteration
+async def atax_summary_lines(tax_records):
+    yield CSV_HEADER
+    # values_list() iterables run their query eagerly, which aiterator() can't hand off to a thread
+    rows = tax_records.order_by("pk").only("year", "gross_income", "taxable_income", "computed_paye")
+    async for r in rows.aiterator(chunk_size=2000):
+        yield summary_line(r.year, r.gross_income, r.taxable_income, r.computed_paye)
+
+
+class _ZipBuffer:
+    # Write-only sink for zipfile; holds compressed bytes until drained
+    def __init__(self):
+        self._chunks = []
+        self.size = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        self.size = 0
+        return data
+
+
+# 📦 Deflates lines pushed into it; each call hands back whatever compressed bytes are ready
+class ZipStream:
+    def __init__(self):
+        self._buffer = _ZipBuffer()
+        self._zf = zipfile.ZipFile(self._buffer, "w", zipfile.ZIP_DEFLATED)
+        self._entry = None
+
+    def open(self, arcname):
+        self._close_entry()
+        self._entry = self._zf.open(arcname, "w")
+
+    def write(self, lines):
+        for line in lines:
+            self._entry.write(line.encode("utf-8"))
+        return self._buffer.drain() if self._buffer.size >= FLUSH_BYTES else b""
+
+    def close(self):
+        self._close_entry()
+        self._zf.close()
+        return self._buffer.drain()
+
+    def _close_entry(self):
+        if self._entry is not None:
+            self._entry.close()
+            self._entry = None
+
+
+# 📦 Deflate (arcname, lines) entries into ZIP bytes as they are produced
+def iter_zip(entries):
+    stream = ZipStream()
+    for arcname, lines in entries:
+        stream.open(arcname)
+        for line in lines:
+            chunk = stream.write((line,))
+            if chunk:
+                yield chunk
+    yield stream.close()
+
+
+# 💾 Build the archive in a temp file so memory stays flat, then hand it to storage
+def build_zip_file(entries, name):
+    tmp = tempfile.TemporaryFile()
+    for chunk in iter_zip(entries):
+        tmp.write(chunk)
+    tmp.seek(0)
+    return File(tmp, name=name)
+
+
+# 🌊 Send the archive to the client while it is being built; chunks may also be an async iterator
+def zip_response(chunks, name):
+    response = StreamingHttpResponse(chunks, content_type="application/zip")
+    response["Content-Disposition"] = f'attachment; filename="{name}"'
+    return response
+
+
+def _version_key(user_id):
+    return f"exports:version:{user_id}"
+
+
+# 🧹 Forget cached fingerprints after a user's records change
+def invalidate_export_cache(user_ids):
+    cache.set_many({_version_key(user_id): uuid.uuid4().hex for user_id in user_ids}, None)
+
+
+# 🔑 Content hash of exactly what the archive would contain
+def export_fingerprint(arcname, tax_records):
+    digest = hashlib.sha256(arcname.encode("utf-8"))
+    for line in tax_summary_lines(tax_records):
+        digest.update(line.encode("utf-8"))
+    return digest.hexdigest()
+
+
+# ♻️ Reuse a stored archive when the user's records haven't changed
+def find_cached_zip(user, arcname, tax_records):
+    version = cache.get_or_set(_version_key(user.id), uuid.uuid4().hex, None)
+    fingerprint_key = f"exports:fingerprint:{user.id}:{version}:{arcname}"
+    fingerprint = cache.get(fingerprint_key)
+    if fingerprint is None:
+        fingerprint = export_fingerprint(arcname, tax_records)
+        # Replica reads may lag the write that bumped the version; don't trust them for long
+        timeout = pin_seconds() if reading_from_replica() else EXPORT_CACHE_SECONDS
+        cache.set(fingerprint_key, fingerprint, timeout)
+
+    return _stored_zip(TaxZip.objects.filter(user=user), fingerprint), fingerprint
+
+
+def _stored_zip(zips, fingerprint):
+    tax_zip = zips.filter(fingerprint=fingerprint).order_by("-id").first()
+    if tax_zip and tax_zip.zip_file.storage.exists(tax_zip.zip_file.name):
+        return tax_zip
+    return None
+
+
+# 👥 (arcname, rows) for every client of an agent, merged off two DB cursors
+def agent_client_members(agent, year=None):
+    clients = active_clients(agent=agent)
+    records = TaxRecord.objects.filter(user__in=clients.values("taxpayer"))
+    if year:
+        records = records.filter(year=year)
+    rows = records.order_by("user_id", "pk").values_list(
+        "user_id", "year", "gross_income", "taxable_income", "computed_paye"
+    ).iterator(chunk_size=2000)
+
+    pending = next(rows, None)
+    taxpayers = clients.order_by("taxpayer_id").values_list("taxpayer_id", "taxpayer__username")
+    for taxpayer_id, username in taxpayers.iterator(chunk_size=2000):
+        client_rows = []
+        while pending is not None and pending[0] <= taxpayer_id:
+            if pending[0] == taxpayer_id:
+                client_rows.append(pending[1:])
+            pending = next(rows, None)
+        yield f"{username}_summary.csv", client_rows
+
+
+def _deflate_members(members, processes):
+    if processes <= 1:
+        for arcname, rows in members:
+            yield render_summary_member(arcname, rows)
+        return
+
+    # Keep only a few clients per worker in flight so memory stays bounded
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        in_flight = deque()
+        for arcname, rows in members:
+            in_flight.append(pool.submit(render_summary_member, arcname, rows))
+            if len(in_flight) >= processes * 4:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+
+
+# 📦 One archive with a summary CSV per client, deflated across a process pool
+def build_agent_zip_file(agent, name, year=None, processes=None):
+    client_count = active_clients(agent=agent).count()
+    if processes is None:
+        processes = getattr(settings, "BULK_EXPORT_PROCESSES", None) or os.cpu_count() or 1
+    if client_count < PARALLEL_EXPORT_MIN_CLIENTS:
+        processes = 1
+
+    tmp = tempfile.TemporaryFile()
+    writer = DeflatedZipWriter(tmp)
+    for member in _deflate_members(agent_client_members(agent, year), processes):
+        writer.add(*member)
+    writer.close()
+    tmp.seek(0)
+    return File(tmp, name=name), client_count
+
+
+# 🔑 Content hash of an agent's bulk archive: every member's name and rows, in archive order
+def agent_export_fingerprint(agent, year=None):
+    digest = hashlib.sha256(f"agent-clients:{year or ''}".encode("utf-8"))
+    for arcname, rows in agent_client_members(agent, year):
+        digest.update(arcname.encode("utf-8"))
+        for row in rows:
+            digest.update(summary_line(*row).encode("utf-8"))
+    return digest.hexdigest()
+
+
+# ♻️ The agent's bulk archive as a stored TaxZip, reused while the clients and their records stay
+# the same; shared by the endpoint and export_agent_clients. Returns (tax_zip, client count)
+def agent_zip(agent, name, year=None, processes=None):
+    fingerprint = agent_export_fingerprint(agent, year)
+    tax_zip = _stored_zip(TaxZip.objects.filter(user=agent, created_by=agent), fingerprint)
+    if tax_zip:
+        return tax_zip, active_clients(agent=agent).count()
+
+    zip_file, client_count = build_agent_zip_file(agent, name, year=year, processes=processes)
+    with zip_file:
+        tax_zip = TaxZip.objects.create(user=agent, created_by=agent, zip_file=zip_file, fingerprint=fingerprint)
+    return tax_zip, client_count
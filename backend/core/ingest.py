@@ -0,0 +1,210 @@
+import os
+import zipfile
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import PurePosixPath
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.utils import timezone
+from .dashboard import invalidate_taxpayers
+from .exports import invalidate_export_cache
+from .models import User, P9Form, P9Line, TaxRecord, active_clients
+from .p9 import parse_p9_bytes
+from .p9_records import diff_months, money
+from .summaries import refresh_taxpayers
+
+# Batches smaller than this are parsed in-process
+PARALLEL_INGEST_MIN_FILES = 8
+MAX_BULK_FILES = 1000
+MAX_BULK_BYTES = 50 * 1024 * 1024
+
+
+class IngestError(Exception):
+    pass
+
+
+# 👤 "jdoe.csv" and "jdoe/anything.csv" both belong to client jdoe
+def client_username(path):
+    path = PurePosixPath(path)
+    return path.parts[0] if len(path.parts) > 1 else path.stem
+
+
+def _check_limits(count, size):
+    if count > MAX_BULK_FILES:
+        raise IngestError(f"At most {MAX_BULK_FILES} files per batch.")
+    if size > MAX_BULK_BYTES:
+        raise IngestError(f"At most {MAX_BULK_BYTES // (1024 * 1024)} MB of P9 data per batch.")
+
+
+# 📚 (name, bytes) for every P9 in an uploaded ZIP and/or a list of uploaded files
+def collect_files(archive=None, files=()):
+    collected = []
+    size = 0
+    if archive is not None:
+        try:
+            zf = zipfile.ZipFile(archive)
+        except zipfile.BadZipFile:
+            raise IngestError("archive is not a valid ZIP file.")
+        with zf:
+            members = [
+                info for info in zf.infolist()
+                if not info.is_dir() and "__MACOSX" not in info.filename
+                and not PurePosixPath(info.filename).name.startswith(".")
+            ]
+            _check_limits(len(members), sum(info.file_size for info in members))
+            for info in members:
+                # Declared sizes can lie; never inflate past the batch limit
+                with zf.open(info) as member:
+                    data = member.read(MAX_BULK_BYTES - size + 1)
+                size += len(data)
+                _check_limits(len(members), size)
+                collected.append((info.filename, data))
+    for upload in files:
+        data = upload.read()
+        size += len(data)
+        _check_limits(len(collected) + 1, size)
+        collected.append((upload.name, data))
+    if not collected:
+        raise IngestError("Send an archive or one or more files.")
+    return collected
+
+
+def _parse_all(blobs, processes):
+    if processes is None:
+        processes = getattr(settings, "BULK_INGEST_PROCESSES", None) or os.cpu_count() or 1
+    if processes <= 1 or len(blobs) < PARALLEL_INGEST_MIN_FILES:
+        return [parse_p9_bytes(data) for data in blobs]
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        return list(pool.map(parse_p9_bytes, blobs, chunksize=4))
+
+
+# 🏭 Ingest many clients' P9s for one tax year; returns one report entry per file
+def ingest_p9_files(agent, rules, files, processes=None):
+    report = [{"file": name, "client": client_username(name)} for name, _ in files]
+
+    # One query for every assignment named in the batch
+    assigned = dict(
+        active_clients(agent=agent, taxpayer__username__in={r["client"] for r in report})
+        .values_list("taxpayer__username", "taxpayer_id")
+    )
+    pending = []
+    seen = set()
+    for entry, (_, data) in zip(report, files):
+        user_id = assigned.get(entry["client"])
+        if user_id is None:
+            entry.update(status="error", error="Not one of your clients.")
+        elif user_id in seen:
+            entry.update(status="error", error="Another file in this batch is for the same client.")
+        else:
+            seen.add(user_id)
+            pending.append((entry, user_id, data))
+
+    parsed = _parse_all([data for _, _, data in pending], processes)
+    accepted = []
+    for (entry, user_id, data), result in zip(pending, parsed):
+        if "error" in result:
+            entry.update(status="error", error=result["error"])
+        elif not result["months"]:
+            entry.update(status="error", error="No P9 rows found.")
+        else:
+            accepted.append((entry, user_id, data, result))
+
+    if accepted:
+        _write(rules, accepted)
+        user_ids = [user_id for _, user_id, _, _ in accepted]
+        # bulk writes skip the model signals
+        invalidate_export_cache(user_ids)
+        invalidate_taxpayers(user_ids)
+    return report
+
+
+def _write(rules, accepted):
+    year = rules.year
+    user_ids = [user_id for _, user_id, _, _ in accepted]
+    now = timezone.now()
+    storage = P9Form._meta.get_field("file").storage
+
+    with transaction.atomic():
+        list(User.objects.select_for_update().filter(id__in=user_ids).values_list("id", flat=True))
+
+        latest_hash = {}
+        for user_id, content_hash in (
+            P9Form.objects.filter(user_id__in=user_ids, year=year).order_by("user_id", "-id")
+            .values_list("user_id", "content_hash")
+        ):
+            latest_hash.setdefault(user_id, content_hash)
+        records = {}
+        for record in TaxRecord.objects.filter(user_id__in=user_ids, year=year).order_by("user_id", "-created_at"):
+            records.setdefault(record.user_id, record)
+
+        fresh = []
+        for entry, user_id, data, result in accepted:
+            record = records.get(user_id)
+            if record is not None and latest_hash.get(user_id) == result["content_hash"]:
+                entry.update(status="duplicate", tax_record=record.id, changed_months=0)
+            else:
+                fresh.append((entry, user_id, data, result))
+        if not fresh:
+            return
+
+        hashes = {result["content_hash"] for _, _, _, result in fresh}
+        shared = dict(
+            P9Form.objects.filter(content_hash__in=hashes).exclude(file="").values_list("content_hash", "file")
+        )
+        share = getattr(settings, "P9_SHARE_IDENTICAL_FILES", True)
+        forms = []
+        for entry, user_id, data, result in fresh:
+            p9 = P9Form(user_id=user_id, year=year, content_hash=result["content_hash"])
+            name = shared.get(result["content_hash"]) if share else None
+            if name and storage.exists(name):
+                p9.file.name = name
+            else:
+                p9.file.save(PurePosixPath(entry["file"]).name, ContentFile(data), save=False)
+                shared[result["content_hash"]] = p9.file.name
+            forms.append(p9)
+        P9Form.objects.bulk_create(forms)
+
+        stored = defaultdict(dict)
+        for line in P9Line.objects.filter(user_id__in=[user_id for _, user_id, _, _ in fresh], year=year):
+            stored[line.user_id][line.month] = line
+
+        added, changed, removed = [], [], []
+        new_records, updated_records = [], []
+        for (entry, user_id, _, result), p9 in zip(fresh, forms):
+            months = {month: (money(s), money(b)) for month, (s, b) in result["months"].items()}
+            user_added, user_changed, user_removed = diff_months(user_id, year, months, stored[user_id], p9, now)
+            added += user_added
+            changed += user_changed
+            removed += user_removed
+            change_count = len(user_added) + len(user_changed) + len(user_removed)
+
+            # After the diff the stored lines are exactly this file's months
+            total_income = sum(salary + benefits for salary, benefits in months.values())
+            paye = rules.paye(float(total_income))
+            record = records.get(user_id)
+            if record is None:
+                record = TaxRecord(
+                    user_id=user_id, year=year, gross_income=total_income,
+                    taxable_income=total_income, computed_paye=paye
+                )
+                new_records.append(record)
+                entry["status"] = "created"
+            else:
+                record.gross_income = record.taxable_income = total_income
+                record.computed_paye = paye
+                updated_records.append(record)
+                entry["status"] = "updated"
+            entry.update(record=record, changed_months=change_count)
+
+        P9Line.objects.bulk_create(added)
+        P9Line.objects.bulk_update(changed, ["basic_salary", "benefits", "p9", "updated_at"])
+        if removed:
+            P9Line.objects.filter(id__in=removed).delete()
+        TaxRecord.objects.bulk_create(new_records)
+        TaxRecord.objects.bulk_update(updated_records, ["gross_income", "taxable_income", "computed_paye"])
+        refresh_taxpayers(user_id for _, user_id, _, _ in fresh)
+
+    for entry, _, _, _ in fresh:
+        record = entry.pop("record")
+        entry.update(tax_record=record.id, computed_paye=money(record.computed_paye))
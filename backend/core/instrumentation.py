@@ -0,0 +1,199 @@
+import os
+import json
+import time
+import heapq
+import socket
+import logging
+import contextvars
+from contextlib import contextmanager
+from bisect import bisect_left
+from pathlib import Path
+from threading import Lock
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger("core.performance")
+
+# Latency histogram bucket upper bounds in ms (last bucket is open-ended)
+BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+# Each process writes its histograms to disk at most this often
+FLUSH_SECONDS = 10
+WORST_QUERIES = 3
+
+_current = contextvars.ContextVar("request_metrics", default=None)
+
+
+# ⏱️ What one request spent its time on
+class RequestMetrics:
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.worst = []  # min-heap of (seconds, sql)
+        self._serializer_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        # Installed as a DB execute_wrapper on every connection
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.db_seconds += elapsed
+            entry = (elapsed, sql[:300])
+            if len(self.worst) < WORST_QUERIES:
+                heapq.heappush(self.worst, entry)
+            elif elapsed > self.worst[0][0]:
+                heapq.heapreplace(self.worst, entry)
+
+
+def _execute(execute, sql, params, many, context):
+    # Permanent wrapper on every connection; follows the request's context into
+    # sync_to_async threads, so async views are measured too
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics(execute, sql, params, many, context)
+
+
+def _install_wrapper(connection, **kwargs):
+    if _execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute)
+
+
+# ⏱️ Count the block as the current request's serialization time (rows and JSON
+# rendering); blocks nested in another one count once
+@contextmanager
+def serializing():
+    metrics = _current.get()
+    if metrics is None or metrics._serializer_depth:
+        yield
+        return
+    metrics._serializer_depth += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics._serializer_depth -= 1
+        metrics.serializer_seconds += time.perf_counter() - started
+
+
+# 📊 Per-endpoint latency histograms for this process
+class EndpointStats:
+    def __init__(self):
+        self.endpoints = {}
+        self.lock = Lock()
+        self.last_flush = time.monotonic()
+        self.path = None
+
+    def record(self, endpoint, wall_ms, queries, bytes_read, bytes_written):
+        with self.lock:
+            stats = self.endpoints.get(endpoint)
+            if stats is None:
+                stats = self.endpoints[endpoint] = {
+                    "count": 0, "total_ms": 0.0, "max_ms": 0.0, "queries": 0,
+                    "bytes_read": 0, "bytes_written": 0, "buckets": [0] * (len(BUCKETS_MS) + 1),
+                }
+            stats["count"] += 1
+            stats["total_ms"] += wall_ms
+            stats["max_ms"] = max(stats["max_ms"], wall_ms)
+            stats["queries"] += queries
+            stats["bytes_read"] += bytes_read
+            stats["bytes_written"] += bytes_written
+            stats["buckets"][bisect_left(BUCKETS_MS, wall_ms)] += 1
+
+    def maybe_flush(self):
+        if time.monotonic() - self.last_flush < FLUSH_SECONDS:
+            return
+        self.flush()
+
+    def flush(self):
+        directory = metrics_dir()
+        with self.lock:
+            self.last_flush = time.monotonic()
+            snapshot = json.dumps({"buckets_ms": BUCKETS_MS, "endpoints": self.endpoints})
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"{socket.gethostname()}-{os.getpid()}.json"
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(snapshot)
+        os.replace(tmp, path)
+
+
+def metrics_dir():
+    return Path(getattr(settings, "PERF_METRICS_DIR", settings.BASE_DIR / ".perf"))
+
+
+_stats = EndpointStats()
+
+
+# 🩺 Times every request and reports it via Server-Timing, histograms and the slow log
+class PerformanceMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_ms = getattr(settings, "SLOW_REQUEST_MS", 1000)
+        connection_created.connect(_install_wrapper, dispatch_uid="core.instrumentation")
+        for connection in connections.all(initialized_only=True):
+            _install_wrapper(connection)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.report(request, response, metrics, started)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.report(request, response, metrics, started)
+
+    def report(self, request, response, metrics, started):
+        wall_ms = (time.perf_counter() - started) * 1000
+
+        bytes_read = int(request.META.get("CONTENT_LENGTH") or 0)
+        if getattr(response, "streaming", False):
+            bytes_written = int(response.get("Content-Length") or 0)
+        else:
+            bytes_written = len(response.content)
+
+        db_ms = metrics.db_seconds * 1000
+        ser_ms = metrics.serializer_seconds * 1000
+        response["Server-Timing"] = (
+            f'app;dur={wall_ms:.1f}, db;dur={db_ms:.1f};desc="{metrics.queries} queries", '
+            f"ser;dur={ser_ms:.1f}"
+        )
+
+        match = request.resolver_match
+        endpoint = f"{request.method} /{match.route}" if match else f"{request.method} <unresolved>"
+        _stats.record(endpoint, wall_ms, metrics.queries, bytes_read, bytes_written)
+        _stats.maybe_flush()
+
+        if wall_ms >= self.slow_ms:
+            worst = "".join(
+                f"\n  {seconds * 1000:.1f}ms {sql}" for seconds, sql in sorted(metrics.worst, reverse=True)
+            )
+            logger.warning(
+                "Slow request %s %s: %.0fms, %d queries (%.0fms db, %.0fms serializers), "
+                "%d bytes in, %d bytes out. Worst queries:%s",
+                request.method, request.path, wall_ms, metrics.queries, db_ms, ser_ms,
+                bytes_read, bytes_written, worst,
+            )
+        return response
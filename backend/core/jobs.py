@@ -0,0 +1,114 @@
+import time
+import datetime
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import P9Job
+from .offboarding import claim_next_deletion, process_deletion
+from .p9 import P9Totals
+from .p9_records import record_p9, find_duplicate_upload, save_p9
+from .tax import get_rules
+
+# Running jobs untouched for this long are assumed to belong to a dead worker
+STALE_JOB_SECONDS = 15 * 60
+MAX_ATTEMPTS = 3
+# Write progress back roughly every this many bytes
+PROGRESS_EVERY = 1024 * 1024
+
+
+# 📥 Queue an uploaded P9 for the background workers
+def enqueue_p9(p9, year, incremental=True):
+    return P9Job.objects.create(p9=p9, year=year, incremental=incremental, total_bytes=p9.file.size)
+
+
+# 📥 A parsed upload, for the sync and async views alike: the duplicate shortcut, else store the
+# file and queue it or record it now. Returns (p9, job, tax_record, changed months, duplicate)
+def accept_p9(user_id, rules, content_hash, totals, upload, background=False, incremental=True):
+    # Same bytes as this year's last upload: nothing to store or compute
+    duplicate = find_duplicate_upload(user_id, rules.year, content_hash)
+    if duplicate:
+        p9, job, tax_record = duplicate
+        return p9, job, tax_record, 0, True
+
+    p9 = save_p9(user_id, rules.year, content_hash, upload)
+    if background:
+        return p9, enqueue_p9(p9, rules.year, incremental=incremental), None, 0, False
+    tax_record, changed = record_p9(user_id, rules, totals, p9, incremental)
+    return p9, None, tax_record, changed, False
+
+
+# 🔒 Claim the next queued job; the conditional UPDATE keeps workers from racing
+def claim_next_job():
+    now = timezone.now()
+    stale = now - datetime.timedelta(seconds=STALE_JOB_SECONDS)
+    # A worker that died on the last attempt leaves nothing to retry; fail the job so its status resolves
+    P9Job.objects.filter(status='running', started_at__lt=stale, attempts__gte=MAX_ATTEMPTS).update(
+        status='failed', error='Worker stopped before finishing the last attempt.', finished_at=now
+    )
+    ready = P9Job.objects.filter(
+        Q(status='queued') | Q(status='running', started_at__lt=stale),
+        attempts__lt=MAX_ATTEMPTS,
+    ).order_by('id')
+
+    for job_id, status, attempts in ready.values_list('id', 'status', 'attempts')[:10]:
+        claimed = P9Job.objects.filter(id=job_id, status=status, attempts=attempts).update(
+            status='running', started_at=now, attempts=attempts + 1
+        )
+        if claimed:
+            return P9Job.objects.select_related('p9__user').get(id=job_id)
+    return None
+
+
+# 🧮 Parse, compute and save one job's TaxRecord
+def process_job(job):
+    try:
+        rules = get_rules(job.year)
+        totals = P9Totals()
+        processed = reported = 0
+        with job.p9.file.open('rb') as f:
+            for chunk in f.chunks():
+                totals.feed(chunk)
+                processed += len(chunk)
+                if processed - reported >= PROGRESS_EVERY:
+                    P9Job.objects.filter(id=job.id).update(processed_bytes=processed)
+                    reported = processed
+        totals.close()
+
+        with transaction.atomic():
+            tax_record, _ = record_p9(job.p9.user_id, rules, totals, job.p9, job.incremental)
+            job.tax_record = tax_record
+            job.status = 'done'
+            job.processed_bytes = processed
+            job.error = ''
+            job.finished_at = timezone.now()
+            job.save(update_fields=['tax_record', 'status', 'processed_bytes', 'error', 'finished_at'])
+    except Exception as exc:
+        job.status = 'failed' if job.attempts >= MAX_ATTEMPTS else 'queued'
+        job.error = f"{type(exc).__name__}: {exc}"
+        job.finished_at = timezone.now() if job.status == 'failed' else None
+        job.save(update_fields=['status', 'error', 'finished_at'])
+    return job
+
+
+# 🔁 Worker loop: process jobs until the queue is empty (once) or forever.
+# P9 uploads go first; queued user deletions run when there are none.
+def run_worker(once=False, poll_interval=2.0, stdout=None):
+    processed = 0
+    while True:
+        job = claim_next_job()
+        if job is not None:
+            process_job(job)
+            label = f"P9 job {job.id}"
+        else:
+            job = claim_next_deletion()
+            if job is None:
+                if once:
+                    return processed
+                time.sleep(poll_interval)
+                continue
+            process_deletion(job)
+            label = f"Deletion of {job.username}"
+
+        processed += 1
+        if stdout is not None:
+            stdout.write(f"{label}: {job.status}")
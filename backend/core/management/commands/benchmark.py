@@ -0,0 +1,80 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from core.bench import RequestFailed, run_benchmark, compare_servers, compare_serializers, write_results
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure p50/p99 latency, throughput and peak memory of the hot endpoints against "
+        "data from seed_data. Uploads and exports write rows and files, so use a benchmark database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=50, help="Timed requests per endpoint.")
+        parser.add_argument("--memory-iterations", type=int, default=3,
+                            help="Extra requests per endpoint traced for peak memory.")
+        parser.add_argument("--p9-rows", type=int, default=12, help="Monthly rows in the uploaded P9.")
+        parser.add_argument("--prefix", default="bench_", help="Username prefix used by seed_data.")
+        parser.add_argument("--cold", action="store_true", help="Clear the cache before every request.")
+        parser.add_argument("--host", default="localhost", help="Host header sent with each request.")
+        parser.add_argument("--output", help="Write the results to this JSON file.")
+        parser.add_argument("--compare-servers", action="store_true",
+                            help="Also fire concurrent bursts through the WSGI views and the ASGI variants.")
+        parser.add_argument("--concurrency", type=int, default=50, help="Simultaneous requests per burst.")
+        parser.add_argument("--wsgi-workers", type=int, default=4, help="Worker threads on the WSGI side.")
+        parser.add_argument("--slow-chunk-bytes", type=int, default=256,
+                            help="Upload bodies arrive in chunks of this size...")
+        parser.add_argument("--slow-chunk-delay", type=float, default=0.02, help="...one every this many seconds.")
+        parser.add_argument("--compare-serializers", action="store_true",
+                            help="Also measure CPU per 10k records for DRF serializers vs the fast row path.")
+        parser.add_argument("--serializer-records", type=int, default=10000, help="TaxRecords to serialize.")
+
+    def handle(self, *args, **options):
+        if options["iterations"] < 1:
+            raise CommandError("--iterations must be at least 1.")
+        try:
+            results = run_benchmark(
+                iterations=options["iterations"], memory_iterations=options["memory_iterations"],
+                p9_rows=options["p9_rows"], prefix=options["prefix"], cold=options["cold"],
+                host=options["host"],
+            )
+            if options["compare_servers"]:
+                results["servers"] = compare_servers(
+                    concurrency=options["concurrency"], workers=options["wsgi_workers"],
+                    p9_rows=options["p9_rows"], chunk_bytes=options["slow_chunk_bytes"],
+                    chunk_delay=options["slow_chunk_delay"], prefix=options["prefix"], host=options["host"],
+                )
+            if options["compare_serializers"]:
+                results["serializers"] = compare_serializers(records=options["serializer_records"])
+        except (LookupError, RequestFailed) as e:
+            raise CommandError(str(e))
+
+        if options["output"]:
+            write_results(results, options["output"])
+            self.stdout.write(f"Results written to {options['output']}")
+        else:
+            self.stdout.write(json.dumps(results, indent=2))
+
+        self.stdout.write(f"{'endpoint':<28} {'p50':>9} {'p99':>9} {'req/s':>8} {'peak mem':>10}")
+        for endpoint, stats in results["endpoints"].items():
+            self.stdout.write(
+                f"{endpoint:<28} {stats['p50_ms']:>7.1f}ms {stats['p99_ms']:>7.1f}ms "
+                f"{stats['throughput_rps']:>8.1f} {stats['peak_memory_kb']:>8.0f}kB"
+            )
+
+        if "servers" in results:
+            self.stdout.write(f"\n{'burst':<20} {'server':<6} {'p50':>9} {'p99':>9} {'req/s':>8}")
+            for endpoint, servers in results["servers"]["endpoints"].items():
+                for server, stats in servers.items():
+                    self.stdout.write(
+                        f"{endpoint:<20} {server:<6} {stats['p50_ms']:>7.1f}ms {stats['p99_ms']:>7.1f}ms "
+                        f"{stats['throughput_rps']:>8.1f}"
+                    )
+
+        if "serializers" in results:
+            stats = results["serializers"]
+            self.stdout.write(
+                f"\nTaxRecord lists ({stats['records']} rows, orjson={stats['orjson']}): "
+                f"{stats['cpu_ms_per_10k']['before']:.1f}ms -> {stats['cpu_ms_per_10k']['after']:.1f}ms CPU "
+                f"per 10k ({stats['speedup']}x); {stats['json_bytes']} bytes, {stats['gzip_bytes']} gzipped"
+            )
@@ -0,0 +1,29 @@
+import datetime
+from django.core.management.base import BaseCommand, CommandError
+from core.models import User
+from core.exports import agent_zip
+
+
+class Command(BaseCommand):
+    help = "Build one ZIP holding a tax summary CSV for every client of an agent."
+
+    def add_arguments(self, parser):
+        parser.add_argument("agent", help="Username of the agent.")
+        parser.add_argument("--year", help="Only include records for this tax year.")
+        parser.add_argument("--processes", type=int, help="Worker processes (default: CPU count).")
+
+    def handle(self, *args, **options):
+        try:
+            agent = User.objects.get(username=options["agent"], role="agent")
+        except User.DoesNotExist:
+            raise CommandError(f"No agent named {options['agent']!r}.")
+
+        year = options["year"]
+        suffix = f"_{year}" if year else ""
+        file_name = f"{agent.username}_clients{suffix}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+        # Same archive as the endpoint's: an unchanged one is reused, not rebuilt
+        tax_zip, client_count = agent_zip(agent, file_name, year=year, processes=options["processes"])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported {client_count} clients to {tax_zip.zip_file.name}"
+        ))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from core.retention import collect_garbage
+
+
+def _mb(size):
+    return f"{size / (1024 * 1024):.1f} MB"
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete exports and P9 files past their retention policy, plus stored files with no row, "
+        "in batches, and report the bytes reclaimed. Meant to run from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Report what would go without deleting it.")
+        parser.add_argument("--skip-orphans", action="store_true", help="Only apply the retention policies.")
+
+    def handle(self, *args, **options):
+        dry_run = options["dry_run"]
+        report = collect_garbage(dry_run=dry_run, orphans=not options["skip_orphans"])
+
+        verb = "would free" if dry_run else "freed"
+        for key, label in (
+            ("expired_exports", "Expired exports"),
+            ("expired_p9_uploads", "Expired P9 uploads"),
+            ("orphan_files", "Orphan files"),
+        ):
+            if key in report:
+                entry = report[key]
+                self.stdout.write(f"{label}: {entry['files']} files, {verb} {_mb(entry['bytes'])}")
+        for model, count in report.get("missing_files", {}).items():
+            action = "would be cleaned up" if dry_run else "cleaned up"
+            self.stdout.write(self.style.WARNING(f"{count} {model} rows point at missing files ({action})"))
+        self.stdout.write(self.style.SUCCESS(
+            f"Reclaimed {report['reclaimed_bytes']} bytes" if not dry_run
+            else f"Would reclaim {report['reclaimed_bytes']} bytes"
+        ))
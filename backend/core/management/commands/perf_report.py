@@ -0,0 +1,60 @@
+import json
+from django.core.management.base import BaseCommand
+from core.instrumentation import metrics_dir
+
+
+def _percentile(buckets, bounds, fraction):
+    # Upper bound of the bucket holding the requested rank
+    total = sum(buckets)
+    rank = fraction * total
+    seen = 0
+    for count, bound in zip(buckets, bounds + [None]):
+        seen += count
+        if seen >= rank and count:
+            return f"<={bound}ms" if bound is not None else f">{bounds[-1]}ms"
+    return "-"
+
+
+class Command(BaseCommand):
+    help = "Summarise per-endpoint latency histograms recorded by PerformanceMiddleware."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--json", action="store_true", help="Print the merged histograms as JSON.")
+        parser.add_argument("--reset", action="store_true", help="Delete recorded histograms afterwards.")
+
+    def handle(self, *args, **options):
+        files = sorted(metrics_dir().glob("*.json"))
+        merged = {}
+        bounds = []
+        for path in files:
+            snapshot = json.loads(path.read_text())
+            bounds = snapshot["buckets_ms"]
+            for endpoint, stats in snapshot["endpoints"].items():
+                total = merged.setdefault(endpoint, {
+                    "count": 0, "total_ms": 0.0, "max_ms": 0.0, "queries": 0,
+                    "bytes_read": 0, "bytes_written": 0, "buckets": [0] * len(stats["buckets"]),
+                })
+                for key in ("count", "total_ms", "queries", "bytes_read", "bytes_written"):
+                    total[key] += stats[key]
+                total["max_ms"] = max(total["max_ms"], stats["max_ms"])
+                total["buckets"] = [a + b for a, b in zip(total["buckets"], stats["buckets"])]
+
+        if options["json"]:
+            self.stdout.write(json.dumps({"buckets_ms": bounds, "endpoints": merged}, indent=2))
+        elif not merged:
+            self.stdout.write("No request metrics recorded yet.")
+        else:
+            self.stdout.write(f"{'endpoint':<48} {'reqs':>7} {'mean':>9} {'p50':>9} {'p99':>9} {'max':>9} {'q/req':>6}")
+            for endpoint, stats in sorted(merged.items(), key=lambda item: -item[1]["total_ms"]):
+                count = stats["count"]
+                self.stdout.write(
+                    f"{endpoint:<48} {count:>7} {stats['total_ms'] / count:>7.1f}ms "
+                    f"{_percentile(stats['buckets'], bounds, 0.5):>9} "
+                    f"{_percentile(stats['buckets'], bounds, 0.99):>9} "
+                    f"{stats['max_ms']:>7.1f}ms {stats['queries'] / count:>6.1f}"
+                )
+
+        if options["reset"]:
+            for path in files:
+                path.unlink(missing_ok=True)
+            self.stdout.write(f"Removed {len(files)} histogram files.")
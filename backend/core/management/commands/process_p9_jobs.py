@@ -0,0 +1,47 @@
+import multiprocessing
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+def _worker_process(once, poll_interval):
+    # Spawned children (Windows/macOS) start without Django configured
+    django.setup()
+    from core.jobs import run_worker
+    run_worker(once=once, poll_interval=poll_interval)
+
+
+class Command(BaseCommand):
+    help = "Process queued P9 uploads and user deletions in the background."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=1, help="Number of worker processes.")
+        parser.add_argument("--once", action="store_true", help="Exit once the queue is empty.")
+        parser.add_argument("--poll-interval", type=float, default=2.0, help="Seconds to wait when idle.")
+
+    def handle(self, *args, **options):
+        processes = max(1, options["processes"])
+        once = options["once"]
+        poll_interval = options["poll_interval"]
+
+        if processes == 1:
+            from core.jobs import run_worker
+            count = run_worker(once=once, poll_interval=poll_interval, stdout=self.stdout)
+            self.stdout.write(self.style.SUCCESS(f"Processed {count} jobs"))
+            return
+
+        # Children must open their own database connections
+        connections.close_all()
+        workers = [
+            multiprocessing.Process(target=_worker_process, args=(once, poll_interval))
+            for _ in range(processes)
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f"Started {processes} P9 workers")
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            for worker in workers:
+                worker.terminate()
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.summaries import rebuild_summaries
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-taxpayer and per-agent year summaries from TaxRecords, or check them for drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--check", action="store_true", help="Report drift without fixing it; exit 1 if any.")
+        parser.add_argument("--show", type=int, default=20, help="Max drifted rows to print.")
+
+    def handle(self, *args, **options):
+        check = options["check"]
+        drift = rebuild_summaries(check_only=check)
+
+        for table, (owner, year), stored, expected in drift[:options["show"]]:
+            owner = "all taxpayers" if owner is None else f"{table} {owner}"
+            self.stdout.write(f"{owner} ({year}): stored {stored} expected {expected}")
+        if not drift:
+            self.stdout.write(self.style.SUCCESS("Summaries match the tax records"))
+        elif check:
+            raise CommandError(f"{len(drift)} summary rows have drifted; run rebuild_summaries to fix them")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt {len(drift)} summary rows"))
@@ -0,0 +1,85 @@
+import time
+from collections import defaultdict
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from core.models import TaxRecord, TaxYearRules
+from core.tax import get_rules
+from core.exports import invalidate_export_cache
+from core.dashboard import invalidate_taxpayers
+from core.summaries import refresh_taxpayers
+
+
+class Command(BaseCommand):
+    help = "Recompute computed_paye for stored TaxRecords in chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--year", help="Only recompute records for this tax year.")
+        parser.add_argument("--chunk-size", type=int, default=5000)
+        parser.add_argument("--dry-run", action="store_true", help="Report changes without writing them.")
+        parser.add_argument("--show", type=int, default=20, help="Max changed rows to print in a dry run.")
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        dry_run = options["dry_run"]
+        show = options["show"]
+
+        records = TaxRecord.objects.order_by("pk")
+        if options["year"]:
+            records = records.filter(year=options["year"])
+
+        scanned = changed = skipped = 0
+        last_pk = 0
+        started = time.perf_counter()
+
+        # Keyset chunks keep memory flat and stay safe while we write back
+        while True:
+            rows = list(
+                records.filter(pk__gt=last_pk)
+                .values_list("pk", "year", "taxable_income", "computed_paye", "user_id")[:chunk_size]
+            )
+            if not rows:
+                break
+            last_pk = rows[-1][0]
+            scanned += len(rows)
+
+            by_year = defaultdict(list)
+            for row in rows:
+                by_year[row[1]].append(row)
+
+            updates = []
+            touched_users = set()
+            for year, year_rows in by_year.items():
+                try:
+                    rules = get_rules(year)
+                except TaxYearRules.DoesNotExist:
+                    skipped += len(year_rows)
+                    continue
+
+                paye = rules.paye_many([float(income) for _, _, income, _, _ in year_rows])
+                for (pk, _, income, old, user_id), new in zip(year_rows, paye):
+                    new = Decimal(f"{new:.2f}")
+                    if new == old:
+                        continue
+                    if dry_run and changed < show:
+                        self.stdout.write(f"TaxRecord {pk} ({year}): income {income} PAYE {old} -> {new}")
+                    changed += 1
+                    updates.append(TaxRecord(pk=pk, computed_paye=new))
+                    touched_users.add(user_id)
+
+            if updates and not dry_run:
+                with transaction.atomic():
+                    TaxRecord.objects.bulk_update(updates, ["computed_paye"], batch_size=chunk_size)
+                    refresh_taxpayers(touched_users)
+                # bulk_update skips signals, so drop cached responses ourselves
+                invalidate_export_cache(touched_users)
+                invalidate_taxpayers(touched_users)
+
+        elapsed = time.perf_counter() - started
+        rate = scanned / elapsed if elapsed else 0
+        verb = "would change" if dry_run else "updated"
+        if skipped:
+            self.stdout.write(self.style.WARNING(f"Skipped {skipped} records with no tax rules for their year"))
+        self.stdout.write(self.style.SUCCESS(
+            f"Scanned {scanned} records, {verb} {changed} in {elapsed:.2f}s ({rate:,.0f} records/s)"
+        ))
@@ -0,0 +1,38 @@
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from core.bench import seed, synthetic_p9
+
+
+class Command(BaseCommand):
+    help = "Seed a reproducible synthetic dataset of taxpayers, agents and tax records for benchmarking."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--taxpayers", type=int, default=1000)
+        parser.add_argument("--agents", type=int, default=10)
+        parser.add_argument("--clients-per-agent", type=int, default=100)
+        parser.add_argument("--years", default="2023,2024,2025", help="Comma-separated tax years.")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed; same seed, same data.")
+        parser.add_argument("--prefix", default="bench_", help="Username prefix for seeded users.")
+        parser.add_argument("--p9-dir", help="Also write synthetic P9 CSVs to this directory.")
+        parser.add_argument("--p9-files", type=int, default=1)
+        parser.add_argument("--p9-rows", type=int, default=12, help="Monthly rows per synthetic P9.")
+
+    def handle(self, *args, **options):
+        years = [year.strip() for year in options["years"].split(",") if year.strip()]
+        if options["taxpayers"] < 1 or not years:
+            raise CommandError("Need at least one taxpayer and one tax year.")
+
+        seed(
+            options["taxpayers"], options["agents"], options["clients_per_agent"], years,
+            seed=options["seed"], prefix=options["prefix"], stdout=self.stdout,
+        )
+
+        if options["p9_dir"]:
+            directory = Path(options["p9_dir"])
+            directory.mkdir(parents=True, exist_ok=True)
+            for i in range(options["p9_files"]):
+                path = directory / f"p9_{options['p9_rows']}rows_{i}.csv"
+                path.write_bytes(synthetic_p9(options["p9_rows"], seed=options["seed"] + i))
+            self.stdout.write(f"Wrote {options['p9_files']} synthetic P9 files to {directory}")
+
+        self.stdout.write(self.style.SUCCESS("Seeding complete."))
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:04
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+def seed_2025_rules(apps, schema_editor):
+    TaxYearRules = apps.get_model('core', 'TaxYearRules')
+    TaxYearRules.objects.get_or_create(
+        year='2025',
+        defaults={
+            'bands': [[24000, 0.10], [32333, 0.25], [500000, 0.30], [800000, 0.325], [None, 0.35]],
+            'personal_relief': Decimal('2400'),
+            'shif_rate': Decimal('0.0275'),
+            'shif_minimum': Decimal('300'),
+            'nssf': Decimal('1080'),
+            'housing_levy_rate': Decimal('0.015'),
+        },
+    )
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_clientprofile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaxYearRules',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.CharField(max_length=10, unique=True)),
+                ('bands', models.JSONField()),
+                ('personal_relief', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('shif_rate', models.DecimalField(decimal_places=4, max_digits=6)),
+                ('shif_minimum', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('nssf', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('housing_levy_rate', models.DecimalField(decimal_places=4, max_digits=6)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(seed_2025_rules, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:08
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def drop_duplicate_assignments(apps, schema_editor):
+    # Keep the oldest row for each (agent, taxpayer) pair before adding the constraint
+    ClientProfile = apps.get_model('core', 'ClientProfile')
+    duplicates = (
+        ClientProfile.objects.values('agent', 'taxpayer')
+        .annotate(first_id=Min('id'), rows=Count('id'))
+        .filter(rows__gt=1)
+    )
+    for dup in duplicates:
+        ClientProfile.objects.filter(agent=dup['agent'], taxpayer=dup['taxpayer']).exclude(
+            id=dup['first_id']
+        ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_taxzip_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='taxzip',
+            name='fingerprint',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='role',
+            field=models.CharField(choices=[('taxpayer', 'Taxpayer'), ('agent', 'Tax Agent'), ('admin', 'Admin')], db_index=True, default='taxpayer', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='taxrecord',
+            index=models.Index(fields=['user', 'year', 'created_at'], name='taxrecord_user_year_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='taxrecord',
+            index=models.Index(fields=['user', 'created_at'], name='taxrecord_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='taxzip',
+            index=models.Index(fields=['user', 'fingerprint'], name='taxzip_user_fingerprint_idx'),
+        ),
+        migrations.RunPython(drop_duplicate_assignments, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='clientprofile',
+            constraint=models.UniqueConstraint(fields=('agent', 'taxpayer'), name='unique_agent_taxpayer'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_p9line'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='p9form',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='p9form',
+            name='year',
+            field=models.CharField(blank=True, max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='p9form',
+            index=models.Index(fields=['user', 'year'], name='p9form_user_year_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='p9form',
+            index=models.Index(fields=['content_hash'], name='p9form_content_hash_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:29
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_p9form_content_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaxpayerSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.CharField(max_length=10)),
+                ('gross_income', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('taxable_income', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('computed_paye', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'year'), name='unique_taxpayer_summary')],
+            },
+        ),
+        migrations.CreateModel(
+            name='TaxSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.CharField(max_length=10)),
+                ('filed', models.IntegerField(default=0)),
+                ('gross_income', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('taxable_income', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('computed_paye', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('agent', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('agent', 'year'), name='unique_agent_tax_summary'), models.UniqueConstraint(condition=models.Q(('agent__isnull', True)), fields=('year',), name='unique_global_tax_summary')],
+            },
+        ),
+    ]
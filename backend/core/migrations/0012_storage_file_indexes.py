@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_user_deletion'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='p9form',
+            index=models.Index(fields=['file'], name='p9form_file_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='taxzip',
+            index=models.Index(fields=['zip_file'], name='taxzip_zip_file_idx'),
+        ),
+    ]
@@ -10,7 +10,9 @@ class User(AbstractUser):
         ('agent', 'Tax Agent'),
         ('admin', 'Admin'),
     )
-    role = models.CharField(max_length=10, choices=ROLE_CHOICES, default='taxpayer')
+    role = models.CharField(max_length=10, choices=ROLE_CHOICES, default='taxpayer', db_index=True)
+    # Set when a background deletion is queued; the user is deactivated until the worker removes them
+    deleted_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return f"{self.username} ({self.role})"
@@ -20,8 +22,19 @@ class User(AbstractUser):
 class P9Form(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     file = models.FileField(upload_to='p9_uploads/')
+    year = models.CharField(max_length=10, blank=True)
+    # sha256 of the uploaded bytes; identical uploads may share one stored file
+    content_hash = models.CharField(max_length=64, blank=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'year'], name='p9form_user_year_idx'),
+            models.Index(fields=['content_hash'], name='p9form_content_hash_idx'),
+            # Storage cleanup looks rows up by file name
+            models.Index(fields=['file'], name='p9form_file_idx'),
+        ]
+
     def __str__(self):
         return f"P9 uploaded by {self.user.username} on {self.uploaded_at}"
 
@@ -35,10 +48,77 @@ class TaxRecord(models.Model):
     computed_paye = models.DecimalField(max_digits=12, decimal_places=2)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'year', 'created_at'], name='taxrecord_user_year_idx'),
+            models.Index(fields=['user', 'created_at'], name='taxrecord_user_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - Tax Year {self.year}"
 
 
+# 📊 A taxpayer's figures for one year (their latest TaxRecord), kept so summaries can be updated by difference
+class TaxpayerSummary(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    year = models.CharField(max_length=10)
+    gross_income = models.DecimalField(max_digits=14, decimal_places=2)
+    taxable_income = models.DecimalField(max_digits=14, decimal_places=2)
+    computed_paye = models.DecimalField(max_digits=14, decimal_places=2)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'year'], name='unique_taxpayer_summary'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.year} summary"
+
+
+# 📊 Year totals across an agent's book; agent is null for the totals across every taxpayer
+class TaxSummary(models.Model):
+    agent = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.CASCADE)
+    year = models.CharField(max_length=10)
+    # Clients with a TaxRecord for this year
+    filed = models.IntegerField(default=0)
+    gross_income = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    taxable_income = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    computed_paye = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['agent', 'year'], name='unique_agent_tax_summary'),
+            models.UniqueConstraint(
+                fields=['year'], condition=models.Q(agent__isnull=True), name='unique_global_tax_summary'
+            ),
+        ]
+
+    def __str__(self):
+        owner = self.agent.username if self.agent_id else "all taxpayers"
+        return f"{owner} - {self.year} summary"
+
+
+# 🗓️ One month of a user's P9 for a tax year, kept so re-uploads can be diffed
+class P9Line(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    year = models.CharField(max_length=10)
+    month = models.CharField(max_length=20)
+    basic_salary = models.DecimalField(max_digits=12, decimal_places=2)
+    benefits = models.DecimalField(max_digits=12, decimal_places=2)
+    # Upload that last changed this line
+    p9 = models.ForeignKey(P9Form, null=True, blank=True, on_delete=models.SET_NULL)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'year', 'month'], name='unique_p9_line'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.year} {self.month}"
+
+
 # 📦 ZIP file export path
 def zip_upload_path(instance, filename):
     return os.path.join("zip_exports", f"user_{instance.user.id}", filename)
@@ -47,9 +127,21 @@ def zip_upload_path(instance, filename):
 # 📦 ZIP export record for taxpayer or agent
 class TaxZip(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    # Who asked for it (an agent exporting a client's records); retention counts it against them
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name='+'
+    )
     zip_file = models.FileField(upload_to=zip_upload_path)
+    # sha256 of the archive's inputs, so identical exports can be reused
+    fingerprint = models.CharField(max_length=64, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'fingerprint'], name='taxzip_user_fingerprint_idx'),
+            models.Index(fields=['zip_file'], name='taxzip_zip_file_idx'),
+        ]
+
     def __str__(self):
         return f"ZIP by {self.user.username} on {self.created_at.strftime('%Y-%m-%d')}"
 
@@ -68,5 +160,97 @@ class ClientProfile(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['agent', 'taxpayer'], name='unique_agent_taxpayer'),
+        ]
+
     def __str__(self):
         return f"{self.agent.username} manages {self.taxpayer.username}"
+
+
+# 🗑️ Users queued for deletion are already gone for exports, ingest and counts
+def active_users():
+    return User.objects.filter(deleted_at__isnull=True)
+
+
+def active_clients(**filters):
+    return ClientProfile.objects.filter(taxpayer__deleted_at__isnull=True, **filters)
+
+
+# 📐 PAYE rules per tax year, stored as data
+class TaxYearRules(models.Model):
+    year = models.CharField(max_length=10, unique=True)
+    # [[upper_limit, rate], ...] in ascending order; null marks the open top band
+    bands = models.JSONField()
+    personal_relief = models.DecimalField(max_digits=12, decimal_places=2)
+    shif_rate = models.DecimalField(max_digits=6, decimal_places=4)
+    shif_minimum = models.DecimalField(max_digits=12, decimal_places=2)
+    nssf = models.DecimalField(max_digits=12, decimal_places=2)
+    housing_levy_rate = models.DecimalField(max_digits=6, decimal_places=4)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"PAYE rules {self.year}"
+
+
+# ⏳ Background processing job for an uploaded P9
+class P9Job(models.Model):
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+    p9 = models.OneToOneField(P9Form, on_delete=models.CASCADE, related_name='job')
+    year = models.CharField(max_length=10)
+    # Diff against stored P9 lines and update the year's TaxRecord instead of adding one
+    incremental = models.BooleanField(default=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued', db_index=True)
+    processed_bytes = models.BigIntegerField(default=0)
+    total_bytes = models.BigIntegerField(default=0)
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    tax_record = models.ForeignKey(TaxRecord, null=True, blank=True, on_delete=models.SET_NULL)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def progress(self):
+        if self.status == 'done':
+            return 1.0
+        if not self.total_bytes:
+            return 0.0
+        return round(min(self.processed_bytes / self.total_bytes, 1.0), 4)
+
+    def __str__(self):
+        return f"P9 job {self.id} ({self.status})"
+
+
+# 🗑️ Background removal of a user's rows and files, in bounded batches
+class UserDeletionJob(models.Model):
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+    # Null once the user row itself is gone
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name='deletion_jobs'
+    )
+    username = models.CharField(max_length=150)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued', db_index=True)
+    deleted_rows = models.BigIntegerField(default=0)
+    deleted_files = models.BigIntegerField(default=0)
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Bumped after every batch, so long deletions are not mistaken for dead workers
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Deletion of {self.username} ({self.status})"
@@ -0,0 +1,146 @@
+import datetime
+import contextvars
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .authentication import forget_user_status
+from .dashboard import invalidate_agents, invalidate_taxpayers
+from .models import (
+    User, UserDeletionJob, ClientProfile, P9Job, P9Line, P9Form, TaxRecord, TaxZip, TaxSummary, TaxpayerSummary
+)
+from .retention import delete_files
+from .summaries import forget_taxpayers
+
+# Rows removed per transaction; small enough that no lock is held for long
+DELETE_BATCH_SIZE = 500
+# Running deletions with no batch finished for this long belong to a dead worker
+STALE_DELETION_SECONDS = 15 * 60
+MAX_ATTEMPTS = 3
+
+# (model, lookup to the user being deleted, file field) in dependency order
+STEPS = [
+    (ClientProfile, "taxpayer_id", None),
+    (ClientProfile, "agent_id", None),
+    (P9Job, "p9__user_id", None),
+    (P9Line, "user_id", None),
+    (TaxpayerSummary, "user_id", None),
+    (TaxSummary, "agent_id", None),
+    (TaxRecord, "user_id", None),
+    (TaxZip, "user_id", "zip_file"),
+    (P9Form, "user_id", "file"),
+]
+
+_deleting = contextvars.ContextVar("deleting_user", default=None)
+
+
+# 🔇 Id of the user this worker is deleting; per-row signal handlers skip their work while set
+def deleting_user():
+    return _deleting.get()
+
+
+# 🚫 Deactivate users at once and queue their deletion; returns their pending jobs
+def request_deletion(users):
+    ids = [user.id for user in users]
+    with transaction.atomic():
+        User.objects.filter(id__in=ids).update(is_active=False, deleted_at=timezone.now())
+        pending = set(
+            UserDeletionJob.objects.filter(user_id__in=ids, status__in=("queued", "running"))
+            .values_list("user_id", flat=True)
+        )
+        UserDeletionJob.objects.bulk_create(
+            UserDeletionJob(user_id=user.id, username=user.username) for user in users if user.id not in pending
+        )
+        # Their records stop counting now, not when the worker gets to them
+        forget_taxpayers(ids)
+
+    # update() skips the signals that drop cached user status and dashboards
+    for user_id in ids:
+        forget_user_status(user_id)
+    invalidate_taxpayers(ids)
+    invalidate_agents(ids)
+    return list(UserDeletionJob.objects.filter(user_id__in=ids, status__in=("queued", "running")).order_by("id"))
+
+
+def _claim(job_id, status, attempts, now):
+    claimed = UserDeletionJob.objects.filter(id=job_id, status=status, attempts=attempts).update(
+        status="running", started_at=now, updated_at=now, attempts=attempts + 1
+    )
+    return UserDeletionJob.objects.get(id=job_id) if claimed else None
+
+
+# 🔒 Claim the next queued deletion; the conditional UPDATE keeps workers from racing
+def claim_next_deletion():
+    now = timezone.now()
+    stale = now - datetime.timedelta(seconds=STALE_DELETION_SECONDS)
+    # A worker that died on the last attempt leaves nothing to retry; fail the job so its status resolves
+    UserDeletionJob.objects.filter(status="running", updated_at__lt=stale, attempts__gte=MAX_ATTEMPTS).update(
+        status="failed", error="Worker stopped before finishing the last attempt.", finished_at=now, updated_at=now
+    )
+    ready = UserDeletionJob.objects.filter(
+        Q(status="queued") | Q(status="running", updated_at__lt=stale),
+        attempts__lt=MAX_ATTEMPTS,
+    ).order_by("id")
+
+    for job_id, status, attempts in ready.values_list("id", "status", "attempts")[:10]:
+        job = _claim(job_id, status, attempts, now)
+        if job:
+            return job
+    return None
+
+
+# 🔒 Claim one queued deletion for the caller; None if a worker got to it first
+def claim_deletion(job):
+    if job.status != "queued" or job.attempts >= MAX_ATTEMPTS:
+        return None
+    return _claim(job.id, "queued", job.attempts, timezone.now())
+
+
+def _delete_batch(model, lookup, user_id, file_field):
+    with transaction.atomic():
+        ids = list(model.objects.filter(**{lookup: user_id}).values_list("pk", flat=True)[:DELETE_BATCH_SIZE])
+        if not ids:
+            return 0, 0
+        batch = model.objects.filter(pk__in=ids)
+        names = []
+        if file_field:
+            names = list(batch.exclude(**{file_field: ""}).values_list(file_field, flat=True))
+        deleted, _ = batch.delete()
+    # Files go only after the rows are committed, so a rollback never leaves rows without files
+    return deleted, delete_files(model, file_field, names)[0] if file_field else 0
+
+
+# 🗑️ Delete one user's rows batch by batch, then their files, then the user
+def process_deletion(job):
+    token = _deleting.set(job.user_id)
+    try:
+        user_id = job.user_id
+        if user_id is not None:
+            # Again, in case anything was written for them since the request
+            forget_taxpayers([user_id])
+            invalidate_taxpayers([user_id])
+            invalidate_agents([user_id])
+            for model, lookup, file_field in STEPS:
+                while True:
+                    rows, files = _delete_batch(model, lookup, user_id, file_field)
+                    if not rows:
+                        break
+                    job.deleted_rows += rows
+                    job.deleted_files += files
+                    job.save(update_fields=["deleted_rows", "deleted_files", "updated_at"])
+            # What is left (tokens, admin log entries, group links) is small
+            deleted, _ = User.objects.filter(id=user_id).delete()
+            job.deleted_rows += deleted
+
+        job.user = None
+        job.status = "done"
+        job.error = ""
+        job.finished_at = timezone.now()
+        job.save(update_fields=["user", "deleted_rows", "status", "error", "finished_at", "updated_at"])
+    except Exception as exc:
+        job.status = "failed" if job.attempts >= MAX_ATTEMPTS else "queued"
+        job.error = f"{type(exc).__name__}: {exc}"
+        job.finished_at = timezone.now() if job.status == "failed" else None
+        job.save(update_fields=["status", "error", "finished_at", "updated_at"])
+    finally:
+        _deleting.reset(token)
+    return job
@@ -0,0 +1,182 @@
+import codecs
+import csv
+import hashlib
+from django.core.files.uploadhandler import FileUploadHandler
+
+MONTH_COLUMN = "Month"
+SALARY_COLUMN = "Basic Salary"
+BENEFITS_COLUMN = "Benefits"
+# A P9 covers one year; rows past this many distinct months are added up under OVERFLOW_MONTH
+MAX_MONTHS = 24
+OVERFLOW_MONTH = "#other"
+
+
+# 🧾 Incremental P9 CSV parser: totals income chunk by chunk
+class P9Totals:
+    def __init__(self, encoding="utf-8"):
+        self._decoder = codecs.getincrementaldecoder(encoding)()
+        self._tail = ""
+        self._record = []
+        self._record_size = 0
+        self._quotes = 0
+        self._month_idx = None
+        self._salary_idx = None
+        self._benefits_idx = None
+        self._header_seen = False
+        self.total_income = 0
+        self.rows = 0
+        # {month: [salary, benefits]}; repeated months add up, files without a Month column key by row,
+        # at most MAX_MONTHS keys (plus OVERFLOW_MONTH)
+        self.months = {}
+
+    def feed(self, chunk):
+        text = self._tail + self._decoder.decode(chunk)
+        lines = text.splitlines()
+        # The last piece may be a partial line; hold it for the next chunk
+        self._tail = lines.pop() if lines and not _ends_line(text) else ""
+        _check_size(len(self._tail))
+        self._consume(lines)
+
+    def close(self):
+        text = self._tail + self._decoder.decode(b"", final=True)
+        self._tail = ""
+        self._consume(text.splitlines())
+        if self._record:
+            self._consume_records(["\n".join(self._record)])
+            self._record = []
+        return self.total_income
+
+    def _consume(self, lines):
+        # Group physical lines into CSV records (quoted fields may span lines)
+        records = []
+        for line in lines:
+            self._record.append(line)
+            self._record_size += len(line)
+            self._quotes += line.count('"')
+            if self._quotes % 2 == 0:
+                records.append("\n".join(self._record))
+                self._record = []
+                self._record_size = 0
+                self._quotes = 0
+            else:
+                # An unbalanced quote must not buffer the rest of the upload
+                _check_size(self._record_size)
+        if records:
+            self._consume_records(records)
+
+    def _consume_records(self, records):
+        for row in csv.reader(records):
+            if not self._header_seen:
+                self._read_header(row)
+                continue
+            if not row:
+                continue
+            self.rows += 1
+            try:
+                salary = float(self._value(row, self._salary_idx))
+                benefits = float(self._value(row, self._benefits_idx))
+                self.total_income += salary + benefits
+            except (TypeError, ValueError):
+                continue
+            month = (self._value(row, self._month_idx) or "").strip() or f"#{self.rows}"
+            if month not in self.months and len(self.months) >= MAX_MONTHS:
+                month = OVERFLOW_MONTH
+            amounts = self.months.setdefault(month, [0.0, 0.0])
+            amounts[0] += salary
+            amounts[1] += benefits
+
+    def _read_header(self, header):
+        self._header_seen = True
+        # Mirror csv.DictReader: a repeated column name keeps its last position
+        for idx, name in enumerate(header):
+            if name == MONTH_COLUMN:
+                self._month_idx = idx
+            elif name == SALARY_COLUMN:
+                self._salary_idx = idx
+            elif name == BENEFITS_COLUMN:
+                self._benefits_idx = idx
+
+    @staticmethod
+    def _value(row, idx):
+        if idx is None:
+            return 0
+        return row[idx] if idx < len(row) else None
+
+
+def _check_size(size):
+    # Same limit (and error) as the csv module applies to a single field
+    limit = csv.field_size_limit()
+    if size > limit:
+        raise csv.Error(f"field larger than field limit ({limit})")
+
+
+def _ends_line(text):
+    # Same line boundaries as str.splitlines(), which the old parser used
+    return text[-1:].splitlines() == [""]
+
+
+def total_income_from_file(file):
+    totals = P9Totals()
+    for chunk in file.chunks():
+        totals.feed(chunk)
+    return totals.close()
+
+
+# 🧾 Parse a whole P9 held in memory; top-level so process pools can run it
+def parse_p9_bytes(data):
+    totals = P9Totals()
+    try:
+        totals.feed(data)
+        totals.close()
+    except (UnicodeDecodeError, csv.Error) as e:
+        return {"error": f"Could not read P9: {e}"}
+    return {
+        "content_hash": hashlib.sha256(data).hexdigest(),
+        "total_income": totals.total_income,
+        "months": totals.months,
+        "rows": totals.rows,
+    }
+
+
+# 📥 Upload handler that hashes (and unless parse=False, parses) the P9 while it streams in
+class P9UploadHandler(FileUploadHandler):
+    def __init__(self, request=None, field_name="file", parse=True):
+        super().__init__(request)
+        self.target_field = field_name
+        self.parse = parse
+        self.totals = None
+        self.content_hash = None
+        # Why the P9 could not be parsed; the rest of the body is still hashed and stored
+        self.error = None
+        self._sha256 = None
+        self._active = False
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self._active = field_name == self.target_field
+        if self._active:
+            self._sha256 = hashlib.sha256()
+            if self.parse:
+                self.totals = P9Totals()
+
+    def receive_data_chunk(self, raw_data, start):
+        if self._active:
+            self._sha256.update(raw_data)
+            if self.parse and self.error is None:
+                self._parse(self.totals.feed, raw_data)
+        # Pass the chunk on so the storage handlers still write the file
+        return raw_data
+
+    def file_complete(self, file_size):
+        if self._active:
+            self.content_hash = self._sha256.hexdigest()
+            if self.parse and self.error is None:
+                self._parse(self.totals.close)
+            self._active = False
+        return None
+
+    def _parse(self, step, *args):
+        try:
+            step(*args)
+        except (UnicodeDecodeError, csv.Error) as e:
+            self.error = f"Could not read P9: {e}"
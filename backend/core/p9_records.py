@@ -0,0 +1,119 @@
+from decimal import Decimal
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+from .models import User, P9Form, P9Job, P9Line, TaxRecord
+
+
+def money(value):
+    return Decimal(f"{value:.2f}")
+
+
+# 🔍 A P9's months against the stored lines (month -> P9Line): (lines to add, lines updated in
+# place, ids of lines for months the file no longer has)
+def diff_months(user_id, year, months, stored, p9, now):
+    stored = dict(stored)
+    added, changed = [], []
+    for month, (salary, benefits) in months.items():
+        line = stored.pop(month, None)
+        if line is None:
+            added.append(P9Line(
+                user_id=user_id, year=year, month=month, basic_salary=salary, benefits=benefits, p9=p9
+            ))
+        elif (line.basic_salary, line.benefits) != (salary, benefits):
+            line.basic_salary, line.benefits, line.p9, line.updated_at = salary, benefits, p9, now
+            changed.append(line)
+    # Months missing from the new upload no longer count
+    return added, changed, [line.id for line in stored.values()]
+
+
+# 🗓️ Store a parsed P9's months and bring the year's TaxRecord up to date.
+# Incremental: only changed months are written and PAYE is recomputed from the
+# stored lines, updating the year's TaxRecord in place. Otherwise the lines are
+# replaced and a new TaxRecord is added. Returns (tax_record, changed months).
+def record_p9(user_id, rules, totals, p9=None, incremental=True):
+    year = rules.year
+    months = {month: (money(salary), money(benefits)) for month, (salary, benefits) in totals.months.items()}
+    lines = P9Line.objects.filter(user_id=user_id, year=year)
+
+    with transaction.atomic():
+        # Serialise one user's uploads so two first uploads can't both insert the same months
+        list(User.objects.select_for_update().filter(id=user_id).values_list("id", flat=True))
+        if not incremental:
+            lines.delete()
+            P9Line.objects.bulk_create(
+                P9Line(user_id=user_id, year=year, month=month, basic_salary=salary, benefits=benefits, p9=p9)
+                for month, (salary, benefits) in months.items()
+            )
+            total_income = totals.total_income
+            return TaxRecord.objects.create(
+                user_id=user_id,
+                year=year,
+                gross_income=total_income,
+                taxable_income=total_income,
+                computed_paye=rules.paye(total_income)
+            ), len(months)
+
+        added, changed, removed = diff_months(
+            user_id, year, months, {line.month: line for line in lines}, p9, timezone.now()
+        )
+        P9Line.objects.bulk_create(added)
+        P9Line.objects.bulk_update(changed, ["basic_salary", "benefits", "p9", "updated_at"])
+        if removed:
+            P9Line.objects.filter(id__in=removed).delete()
+        change_count = len(added) + len(changed) + len(removed)
+
+        tax_record = TaxRecord.objects.filter(user_id=user_id, year=year).order_by("-created_at").first()
+        if tax_record is not None and not change_count:
+            return tax_record, 0
+
+        sums = lines.aggregate(salary=Sum("basic_salary"), benefits=Sum("benefits"))
+        total_income = (sums["salary"] or 0) + (sums["benefits"] or 0)
+        paye = rules.paye(float(total_income))
+        if tax_record is None:
+            tax_record = TaxRecord.objects.create(
+                user_id=user_id, year=year, gross_income=total_income,
+                taxable_income=total_income, computed_paye=paye
+            )
+        else:
+            tax_record.gross_income = tax_record.taxable_income = total_income
+            tax_record.computed_paye = paye
+            tax_record.save(update_fields=["gross_income", "taxable_income", "computed_paye"])
+        return tax_record, change_count
+
+
+# ♻️ The user's latest upload for this year, if it was exactly these bytes: (p9, job, tax_record)
+def find_duplicate_upload(user_id, year, content_hash):
+    latest = P9Form.objects.filter(user_id=user_id, year=year).order_by("-id").first()
+    if latest is None or not content_hash or latest.content_hash != content_hash:
+        return None
+    job = P9Job.objects.filter(p9=latest).first()
+    tax_record = TaxRecord.objects.filter(user_id=user_id, year=year).order_by("-created_at").first()
+    if job is not None and job.status in ("queued", "running"):
+        return latest, job, None
+    if tax_record is None or (job is not None and job.status == "failed"):
+        return None
+    return latest, None, tax_record
+
+
+# 🔗 Stored file that already holds these bytes, so identical uploads share one blob
+def shared_file_name(content_hash):
+    if not content_hash or not getattr(settings, "P9_SHARE_IDENTICAL_FILES", True):
+        return None
+    storage = P9Form._meta.get_field("file").storage
+    for name in P9Form.objects.filter(content_hash=content_hash).exclude(file="").values_list("file", flat=True)[:1]:
+        if storage.exists(name):
+            return name
+    return None
+
+
+def save_p9(user_id, year, content_hash, upload):
+    p9 = P9Form(user_id=user_id, year=year, content_hash=content_hash or "")
+    name = shared_file_name(content_hash)
+    if name:
+        p9.file.name = name
+    else:
+        p9.file.save(upload.name, upload, save=False)
+    p9.save()
+    return p9
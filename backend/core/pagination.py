@@ -0,0 +1,8 @@
+from rest_framework.pagination import CursorPagination
+
+
+# 📄 Keyset pagination on the primary key: no OFFSET scans, no COUNT(*)
+class KeysetPagination(CursorPagination):
+    ordering = 'id'
+    page_size_query_param = 'page_size'
+    max_page_size = 500
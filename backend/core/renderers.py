@@ -0,0 +1,41 @@
+import json
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+from .instrumentation import serializing
+
+try:
+    import orjson
+except ImportError:  # optional; DRF's stdlib renderer is used without it
+    orjson = None
+
+_encoder = JSONEncoder()
+if orjson is not None:
+    # Datetimes go through DRF's encoder so both paths format them the same way
+    _OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+# 🚀 Compact JSON bytes, via orjson when installed; anything it can't take natively
+# (Decimal, datetimes, lazy strings) is handed to DRF's encoder
+def dumps(data):
+    if orjson is not None:
+        try:
+            return orjson.dumps(data, default=_encoder.default, option=_OPTIONS)
+        except orjson.JSONEncodeError:
+            # e.g. integers beyond 64 bits; the stdlib copes
+            pass
+    return json.dumps(data, cls=JSONEncoder, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Counted as serialization in Server-Timing
+        with serializing():
+            return self._render(data, accepted_media_type, renderer_context)
+
+    def _render(self, data, accepted_media_type, renderer_context):
+        if orjson is None or data is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Pretty-printing (?indent or the browsable API) is not a hot path
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data)
@@ -0,0 +1,238 @@
+import datetime
+from collections import Counter
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import P9Form, TaxZip
+
+# Rows (and their files) removed per transaction
+RETENTION_BATCH_SIZE = 500
+# Files younger than this may belong to an upload or export whose row is not saved yet
+ORPHAN_GRACE_SECONDS = 60 * 60
+
+# (model, file field, storage directory) for everything users leave on disk
+STORED_FILES = [
+    (TaxZip, "zip_file", "zip_exports"),
+    (P9Form, "file", "p9_uploads"),
+]
+
+
+def _storage(model, field):
+    return model._meta.get_field(field).storage
+
+
+def _size(storage, name):
+    try:
+        return storage.size(name)
+    except (OSError, NotImplementedError):
+        return 0
+
+
+def _chunks(items, size=RETENTION_BATCH_SIZE):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# 🧹 Remove stored files that no row points at any more (identical P9s share one blob);
+# returns (files removed, bytes freed)
+def delete_files(model, field, names):
+    names = set(names)
+    if not names:
+        return 0, 0
+    still_used = set(model.objects.filter(**{f"{field}__in": names}).values_list(field, flat=True))
+    storage = _storage(model, field)
+    removed = freed = 0
+    for name in names - still_used:
+        size = _size(storage, name)
+        try:
+            storage.delete(name)
+        except OSError:
+            # Left for the next run's orphan scan; the rows are gone either way
+            continue
+        removed += 1
+        freed += size
+    return removed, freed
+
+
+# 📏 {"keep_last": n, "max_age_days": d} for one role's exports; None turns a limit off
+def zip_policy(role):
+    policy = {
+        "keep_last": getattr(settings, "TAXZIP_KEEP_LAST", 5),
+        "max_age_days": getattr(settings, "TAXZIP_MAX_AGE_DAYS", 30),
+    }
+    policy.update(getattr(settings, "TAXZIP_RETENTION_BY_ROLE", {}).get(role, {}))
+    return policy
+
+
+# ⌛ Ids of exports past their creator's policy: beyond the creator's newest keep_last for that
+# user, or older than max_age_days. An agent's exports of a client count against the agent, not
+# the client's own. Users are walked in keyset pages so memory stays flat.
+def expired_zip_ids(now=None):
+    now = now or timezone.now()
+    policies = {}
+    last_user = 0
+    while True:
+        user_ids = list(
+            TaxZip.objects.filter(user_id__gt=last_user).order_by("user_id")
+            .values_list("user_id", flat=True).distinct()[:RETENTION_BATCH_SIZE]
+        )
+        if not user_ids:
+            return
+        last_user = user_ids[-1]
+        rows = TaxZip.objects.filter(user_id__in=user_ids).order_by("user_id", "-created_at", "-id").values_list(
+            "id", "user_id", "user__role", "created_by_id", "created_by__role", "created_at"
+        )
+        kept = Counter()
+        expired = []
+        for zip_id, user_id, role, creator_id, creator_role, created_at in rows.iterator(chunk_size=2000):
+            # Exports from before creators were recorded belong to the owner
+            if creator_id is None:
+                creator_id, creator_role = user_id, role
+            if creator_role not in policies:
+                policies[creator_role] = zip_policy(creator_role)
+            keep_last, max_age_days = policies[creator_role]["keep_last"], policies[creator_role]["max_age_days"]
+            kept[user_id, creator_id] += 1
+            if (keep_last is not None and kept[user_id, creator_id] > keep_last) or (
+                max_age_days is not None and created_at < now - datetime.timedelta(days=max_age_days)
+            ):
+                expired.append(zip_id)
+        # Handed on only once this page's cursor is done, since the caller deletes as it goes
+        yield from expired
+
+
+# ⌛ Ids of P9 uploads whose CSV can go; the parsed months stay in P9Line either way.
+# Walked in keyset pages like expired_zip_ids
+def expired_p9_ids(now=None):
+    max_age_days = getattr(settings, "P9_UPLOAD_MAX_AGE_DAYS", None)
+    if max_age_days is None:
+        return
+    cutoff = (now or timezone.now()) - datetime.timedelta(days=max_age_days)
+    rows = (
+        P9Form.objects.filter(uploaded_at__lt=cutoff).exclude(file="")
+        .exclude(job__status__in=("queued", "running"))
+        .order_by("id").values_list("id", flat=True)
+    )
+    last_id = 0
+    while True:
+        page = list(rows.filter(id__gt=last_id)[:RETENTION_BATCH_SIZE])
+        if not page:
+            return
+        last_id = page[-1]
+        yield from page
+
+
+def _drop(model, field, ids, keep_rows, dry_run):
+    # Exports are dropped with their rows; P9 rows stay (jobs and lines point at them) with the file cleared
+    rows = files = freed = 0
+    storage = _storage(model, field)
+    for chunk in _chunks(ids):
+        rows += len(chunk)
+        batch = model.objects.filter(pk__in=chunk)
+        names = list(batch.exclude(**{field: ""}).values_list(field, flat=True))
+        if dry_run:
+            files += len(names)
+            freed += sum(_size(storage, name) for name in set(names))
+            continue
+        with transaction.atomic():
+            if keep_rows:
+                batch.update(**{field: ""})
+            else:
+                batch.delete()
+        removed, size = delete_files(model, field, names)
+        files += removed
+        freed += size
+    return {"rows": rows, "files": files, "bytes": freed}
+
+
+def _walk(storage, path):
+    try:
+        directories, files = storage.listdir(path)
+    except (FileNotFoundError, NotImplementedError):
+        return
+    for name in files:
+        yield f"{path}/{name}"
+    for directory in directories:
+        yield from _walk(storage, f"{path}/{directory}")
+
+
+# 🔍 Stored files with no row, past the grace period: (model, field, name)
+def orphan_files(now=None):
+    grace = (now or timezone.now()) - datetime.timedelta(seconds=ORPHAN_GRACE_SECONDS)
+    for model, field, directory in STORED_FILES:
+        storage = _storage(model, field)
+        for chunk in _chunks(_walk(storage, directory)):
+            known = set(model.objects.filter(**{f"{field}__in": chunk}).values_list(field, flat=True))
+            for name in chunk:
+                if name in known:
+                    continue
+                try:
+                    if storage.get_modified_time(name) > grace:
+                        continue
+                except (OSError, NotImplementedError):
+                    pass
+                yield model, field, name
+
+
+# 🔍 Rows whose file is gone from storage: (model, field, pk)
+def missing_files():
+    for model, field, _ in STORED_FILES:
+        storage = _storage(model, field)
+        rows = model.objects.exclude(**{field: ""}).order_by("pk").values_list("pk", field)
+        last_pk = 0
+        while True:
+            chunk = list(rows.filter(pk__gt=last_pk)[:RETENTION_BATCH_SIZE])
+            if not chunk:
+                break
+            last_pk = chunk[-1][0]
+            for pk, name in chunk:
+                if not storage.exists(name):
+                    yield model, field, pk
+
+
+# 🗑️ Apply the retention policies, then clean up orphans both ways; returns what was (or would be) reclaimed
+def collect_garbage(dry_run=False, orphans=True, now=None):
+    now = now or timezone.now()
+    report = {
+        "expired_exports": _drop(TaxZip, "zip_file", expired_zip_ids(now), False, dry_run),
+        "expired_p9_uploads": _drop(P9Form, "file", expired_p9_ids(now), True, dry_run),
+    }
+    if orphans:
+        found = {"files": 0, "bytes": 0}
+        by_model = {}
+        for model, field, name in orphan_files(now):
+            by_model.setdefault((model, field), []).append(name)
+        for (model, field), names in by_model.items():
+            storage = _storage(model, field)
+            for chunk in _chunks(names):
+                if dry_run:
+                    found["files"] += len(chunk)
+                    found["bytes"] += sum(_size(storage, name) for name in chunk)
+                    continue
+                removed, freed = delete_files(model, field, chunk)
+                found["files"] += removed
+                found["bytes"] += freed
+        report["orphan_files"] = found
+
+        missing = {}
+        for model, field, pk in missing_files():
+            missing.setdefault((model, field), []).append(pk)
+        report["missing_files"] = {model.__name__: len(pks) for (model, _), pks in missing.items()}
+        if not dry_run:
+            for (model, field), pks in missing.items():
+                for chunk in _chunks(pks):
+                    rows = model.objects.filter(pk__in=chunk)
+                    if model is TaxZip:
+                        rows.delete()
+                    else:
+                        rows.update(**{field: ""})
+
+    report["reclaimed_bytes"] = sum(
+        entry["bytes"] for entry in report.values() if isinstance(entry, dict) and "bytes" in entry
+    )
+    return report
@@ -0,0 +1,138 @@
+import contextvars
+from contextlib import contextmanager
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+
+PRIMARY = "default"
+PRIMARY_HEADER = "X-Stick-To-Primary"
+
+_state = contextvars.ContextVar("db_routing", default=None)
+
+
+# 🧭 Where this request's reads may go
+class RoutingState:
+    def __init__(self, pinned=False):
+        self.replica_reads = False
+        self.pinned = pinned
+        self.wrote = False
+
+
+# 🗄️ Cache for replica pins and throttle histories, kept apart from page and fingerprint data
+def coordination_cache():
+    alias = getattr(settings, "COORDINATION_CACHE", "default")
+    return caches[alias if alias in settings.CACHES else "default"]
+
+
+def replica_alias():
+    alias = getattr(settings, "REPLICA_DATABASE", "replica")
+    return alias if alias in settings.DATABASES else None
+
+
+def pin_seconds():
+    return getattr(settings, "REPLICA_PIN_SECONDS", 10)
+
+
+def _pin_key(user_id):
+    return f"replica:pinned:{user_id}"
+
+
+def reading_from_replica():
+    state = _state.get()
+    return bool(
+        state and state.replica_reads and not state.pinned and not state.wrote and replica_alias()
+    )
+
+
+# 📖 Let the rest of this request read from the replica, unless the user wrote recently
+def read_from_replica(user=None):
+    state = _state.get()
+    if state is None or replica_alias() is None:
+        return
+    state.replica_reads = True
+    if user is not None and user.is_authenticated and coordination_cache().get(_pin_key(user.id)):
+        state.pinned = True
+
+
+@contextmanager
+def use_primary():
+    state = _state.get()
+    if state is None:
+        yield
+        return
+    pinned = state.pinned
+    state.pinned = True
+    try:
+        yield
+    finally:
+        state.pinned = pinned
+
+
+# 🔀 Reads go to the replica only inside opted-in requests; writes always go to primary
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if reading_from_replica():
+            return replica_alias()
+        return PRIMARY
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            # Anything read after a write in this request must see it
+            state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {PRIMARY, replica_alias()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        # Anything else (e.g. the test runner migrating an unrouted alias): same database only
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema through replication (or the test runner)
+        return True
+
+
+# 📌 Per-request routing state; users who just wrote stay on primary for a while
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = self.start(request)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        self.finish(request, state)
+        return response
+
+    async def __acall__(self, request):
+        state = self.start(request)
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        self.finish(request, state)
+        return response
+
+    def start(self, request):
+        return RoutingState(pinned=request.headers.get(PRIMARY_HEADER, "").lower() in ("1", "true", "yes"))
+
+    def finish(self, request, state):
+        if not state.wrote or replica_alias() is None:
+            return
+        # DRF views have replaced request.user with the token's user by now
+        user = getattr(request, "user", None)
+        if user is not None and user.is_authenticated:
+            coordination_cache().set(_pin_key(user.id), True, pin_seconds())
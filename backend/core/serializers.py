@@ -1,6 +1,11 @@
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
 from rest_framework import serializers
-from .models import User, P9Form, TaxRecord, TaxZip, ClientProfile
+from .models import User, P9Form, TaxRecord, TaxZip, P9Job, TaxSummary, UserDeletionJob
 from django.contrib.auth.password_validation import validate_password
+from .downloads import download_url
+from .instrumentation import serializing
 
 
 class RegisterSerializer(serializers.ModelSerializer):
@@ -22,9 +27,16 @@ class RegisterSerializer(serializers.ModelSerializer):
 
 
 class P9UploadSerializer(serializers.ModelSerializer):
+    # Files are only served through DownloadView, so the stored path is never shown
+    download_url = serializers.SerializerMethodField()
+
     class Meta:
         model = P9Form
-        fields = ['file']
+        fields = ['file', 'download_url']
+        extra_kwargs = {'file': {'write_only': True}}
+
+    def get_download_url(self, obj):
+        return download_url(self.context["request"], "p9", obj)
 
 
 class TaxRecordSerializer(serializers.ModelSerializer):
@@ -33,33 +45,98 @@ class TaxRecordSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class TaxZipSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = TaxZip
-        fields = '__all__'
-
+class P9JobSerializer(serializers.ModelSerializer):
+    tax_record = TaxRecordSerializer(read_only=True)
 
-class ClientTaxRecordSerializer(serializers.ModelSerializer):
     class Meta:
-        model = TaxRecord
-        fields = ['year', 'gross_income', 'taxable_income', 'computed_paye', 'created_at']
+        model = P9Job
+        fields = ['id', 'status', 'year', 'progress', 'error', 'tax_record',
+                  'created_at', 'started_at', 'finished_at']
 
 
-class ClientProfileSerializer(serializers.ModelSerializer):
-    taxpayer_name = serializers.CharField(source='taxpayer.username', read_only=True)
-    taxpayer_email = serializers.EmailField(source='taxpayer.email', read_only=True)
-    tax_records = serializers.SerializerMethodField()
+class TaxZipSerializer(serializers.ModelSerializer):
+    download_url = serializers.SerializerMethodField()
 
     class Meta:
-        model = ClientProfile
-        fields = ['id', 'taxpayer_name', 'taxpayer_email', 'tax_records', 'created_at']
+        model = TaxZip
+        exclude = ['zip_file']
 
-    def get_tax_records(self, obj):
-        records = TaxRecord.objects.filter(user=obj.taxpayer)
-        return ClientTaxRecordSerializer(records, many=True).data
+    def get_download_url(self, obj):
+        return download_url(self.context["request"], "zip", obj)
 
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'role']
+
+
+class UserDeletionJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UserDeletionJob
+        fields = ['id', 'user', 'username', 'status', 'deleted_rows', 'deleted_files', 'error',
+                  'created_at', 'started_at', 'finished_at']
+
+
+class TaxSummarySerializer(serializers.ModelSerializer):
+    # Clients with no TaxRecord for the year; the view passes the book size in context
+    unfiled = serializers.SerializerMethodField()
+
+    class Meta:
+        model = TaxSummary
+        fields = ['year', 'filed', 'unfiled', 'gross_income', 'taxable_income', 'computed_paye', 'updated_at']
+
+    def get_unfiled(self, obj):
+        return max(self.context["clients"] - obj.filed, 0)
+
+
+def _datetime(value, zone):
+    # Same output as DRF's DateTimeField with the default ISO 8601 format
+    if zone is not None:
+        value = value.astimezone(zone) if timezone.is_aware(value) else timezone.make_aware(value, zone)
+    value = value.isoformat()
+    return value[:-6] + "Z" if value.endswith("+00:00") else value
+
+
+# ⚡ Read-only rows from .values(), formatted like the ModelSerializer fields they replace.
+# Field types are looked up once, so hot list endpoints skip per-object field introspection.
+class RowSerializer:
+    def __init__(self, model, fields):
+        self.fields = list(fields)
+        # Foreign keys are read (and rendered, like PrimaryKeyRelatedField) by their id column
+        self.columns = [model._meta.get_field(name).attname for name in self.fields]
+        self.decimals = []
+        self.datetimes = []
+        for name in self.fields:
+            field = model._meta.get_field(name)
+            if isinstance(field, models.DecimalField):
+                self.decimals.append((name, f"{{:.{field.decimal_places}f}}".format))
+            elif isinstance(field, models.DateTimeField):
+                self.datetimes.append(name)
+
+    def rows(self, queryset):
+        return queryset.values(*self.columns)
+
+    def _to_dict(self, row, zone):
+        item = {name: row[column] for name, column in zip(self.fields, self.columns)}
+        for name, convert in self.decimals:
+            if item[name] is not None:
+                item[name] = convert(item[name])
+        for name in self.datetimes:
+            if item[name] is not None:
+                item[name] = _datetime(item[name], zone)
+        return item
+
+    def many(self, rows):
+        # Fetched first, so the query counts as DB time rather than serialization
+        rows = list(rows)
+        with serializing():
+            # The active timezone is looked up once per list, not once per value
+            zone = timezone.get_current_timezone() if settings.USE_TZ else None
+            return [self._to_dict(row, zone) for row in rows]
+
+
+TAX_RECORD_ROWS = RowSerializer(
+    TaxRecord, ['id', 'year', 'gross_income', 'taxable_income', 'computed_paye', 'created_at', 'user']
+)
+USER_ROWS = RowSerializer(User, UserSerializer.Meta.fields)
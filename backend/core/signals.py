@@ -0,0 +1,92 @@
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+from .models import User, TaxYearRules, TaxRecord, ClientProfile
+from .exports import invalidate_export_cache
+from .dashboard import invalidate_agents, invalidate_taxpayers
+from .tax import invalidate_rules
+from .authentication import forget_user_status
+from .summaries import refresh_taxpayers, forget_taxpayers, assign_client
+from .offboarding import deleting_user
+
+
+# 📐 Drop compiled PAYE tables when a tax year's rules change
+@receiver([post_save, post_delete], sender=TaxYearRules)
+def tax_rules_changed(sender, instance, **kwargs):
+    invalidate_rules(instance.year)
+
+
+# 📦 A changed TaxRecord means cached exports for its owner are stale
+@receiver([post_save, post_delete], sender=TaxRecord)
+def tax_record_changed(sender, instance, **kwargs):
+    if deleting_user() is not None:
+        return
+    invalidate_export_cache([instance.user_id])
+    invalidate_taxpayers([instance.user_id])
+
+
+# 🧑‍💼 Assignment changes only affect the agent involved
+@receiver([post_save, post_delete], sender=ClientProfile)
+def client_profile_changed(sender, instance, **kwargs):
+    if deleting_user() is not None:
+        return
+    invalidate_agents([instance.agent_id])
+
+
+# 🪪 Role or active flag may have changed; re-read on the next request here
+@receiver([post_save, post_delete], sender=User)
+def user_status_changed(sender, instance, **kwargs):
+    forget_user_status(instance.id)
+
+
+# 👤 Dashboards show taxpayer names and emails
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= {"last_login"}:
+        return
+    if instance.role == "taxpayer":
+        invalidate_taxpayers([instance.id])
+
+
+def _deleting_user(origin):
+    # The delete cascades from a User (pre_delete below has already handled it),
+    # or a background deletion is removing rows and does the bookkeeping once itself
+    if deleting_user() is not None:
+        return True
+    return isinstance(origin, User) or getattr(origin, "model", None) is User
+
+
+# 📊 Keep year summaries in step with the records they add up
+@receiver([post_save, post_delete], sender=TaxRecord)
+def tax_record_summary(sender, instance, origin=None, **kwargs):
+    if not _deleting_user(origin):
+        refresh_taxpayers([instance.user_id])
+
+
+@receiver(pre_save, sender=ClientProfile)
+def client_profile_before_save(sender, instance, **kwargs):
+    instance._assigned = None
+    if instance.pk:
+        instance._assigned = ClientProfile.objects.filter(pk=instance.pk).values_list(
+            "agent_id", "taxpayer_id"
+        ).first()
+
+
+@receiver(post_save, sender=ClientProfile)
+def client_profile_summary(sender, instance, created, **kwargs):
+    assigned = (instance.agent_id, instance.taxpayer_id)
+    previous = getattr(instance, "_assigned", None)
+    if created or (previous and previous != assigned):
+        if previous:
+            assign_client(*previous, sign=-1)
+        assign_client(*assigned)
+
+
+@receiver(post_delete, sender=ClientProfile)
+def client_profile_removed(sender, instance, origin=None, **kwargs):
+    if not _deleting_user(origin):
+        assign_client(instance.agent_id, instance.taxpayer_id, sign=-1)
+
+
+@receiver(pre_delete, sender=User)
+def user_deleting(sender, instance, **kwargs):
+    forget_taxpayers([instance.id])
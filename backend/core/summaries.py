@@ -0,0 +1,192 @@
+from collections import defaultdict
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import ClientProfile, TaxRecord, TaxSummary, TaxpayerSummary
+
+FIELDS = ("gross_income", "taxable_income", "computed_paye")
+# Users per query when rebuilding from scratch
+REBUILD_CHUNK_SIZE = 1000
+
+
+# 🧾 {(user_id, year): (gross, taxable, paye)} from each user's latest TaxRecord per year
+def _latest_records(user_ids, records=TaxRecord):
+    latest = {}
+    rows = (
+        records.objects.filter(user_id__in=list(user_ids))
+        .order_by("user_id", "year", "-created_at", "-id")
+        .values_list("user_id", "year", *FIELDS)
+    )
+    for user_id, year, *values in rows:
+        latest.setdefault((user_id, year), tuple(values))
+    return latest
+
+
+def _agents_of(user_ids):
+    agents = defaultdict(list)
+    for taxpayer_id, agent_id in ClientProfile.objects.filter(taxpayer_id__in=list(user_ids)).values_list(
+        "taxpayer_id", "agent_id"
+    ):
+        agents[taxpayer_id].append(agent_id)
+    return agents
+
+
+# ➕ Add (filed, gross, taxable, paye) differences to one summary row
+def _bump(agent_id, year, delta):
+    filed, *amounts = delta
+    if not filed and not any(amounts):
+        return
+    rows = TaxSummary.objects.filter(agent_id=agent_id, year=year)
+    changes = {field: F(field) + amount for field, amount in zip(FIELDS, amounts)}
+    if rows.update(filed=F("filed") + filed, updated_at=timezone.now(), **changes):
+        if filed < 0:
+            rows.filter(filed__lte=0).delete()
+        return
+    # A missing row only needs creating when a client files; anything else
+    # is a row that was just deleted along with its agent
+    if filed <= 0:
+        return
+    try:
+        with transaction.atomic():
+            TaxSummary.objects.create(agent_id=agent_id, year=year, filed=filed, **dict(zip(FIELDS, amounts)))
+    except IntegrityError:
+        rows.update(filed=F("filed") + filed, updated_at=timezone.now(), **changes)
+
+
+# 📈 Apply per-taxpayer differences to their agents' rows and to the all-taxpayer rows
+def _apply(deltas, agents=None):
+    if not deltas:
+        return
+    if agents is None:
+        agents = _agents_of({user_id for user_id, _ in deltas})
+    totals = defaultdict(lambda: [0, 0, 0, 0])
+    for (user_id, year), delta in deltas.items():
+        for agent_id in [None, *agents.get(user_id, ())]:
+            total = totals[(agent_id, year)]
+            for i, value in enumerate(delta):
+                total[i] += value
+    for (agent_id, year), delta in totals.items():
+        _bump(agent_id, year, delta)
+
+
+# 🔄 Bring these taxpayers' summaries in line with their TaxRecords.
+# Callers that write TaxRecords in bulk (skipping signals) must call this themselves.
+def refresh_taxpayers(user_ids):
+    user_ids = set(user_ids)
+    if not user_ids:
+        return
+    with transaction.atomic():
+        current = _latest_records(user_ids)
+        stored = {(row.user_id, row.year): row for row in TaxpayerSummary.objects.filter(user_id__in=user_ids)}
+        deltas = {}
+        added, changed = [], []
+        for key, values in current.items():
+            row = stored.pop(key, None)
+            if row is None:
+                added.append(TaxpayerSummary(user_id=key[0], year=key[1], **dict(zip(FIELDS, values))))
+                deltas[key] = (1, *values)
+                continue
+            old = tuple(getattr(row, field) for field in FIELDS)
+            if old != values:
+                for field, value in zip(FIELDS, values):
+                    setattr(row, field, value)
+                changed.append(row)
+                deltas[key] = (0, *(new - was for new, was in zip(values, old)))
+        # Years with no TaxRecord left
+        for key, row in stored.items():
+            deltas[key] = (-1, *(-getattr(row, field) for field in FIELDS))
+
+        TaxpayerSummary.objects.bulk_create(added)
+        TaxpayerSummary.objects.bulk_update(changed, FIELDS)
+        if stored:
+            TaxpayerSummary.objects.filter(id__in=[row.id for row in stored.values()]).delete()
+        _apply(deltas)
+
+
+# 🗑️ Take a taxpayer out of every summary before their rows cascade away
+def forget_taxpayers(user_ids):
+    with transaction.atomic():
+        rows = TaxpayerSummary.objects.filter(user_id__in=list(user_ids))
+        _apply({
+            (user_id, year): (-1, *(-value for value in values))
+            for user_id, year, *values in rows.values_list("user_id", "year", *FIELDS)
+        })
+        rows.delete()
+
+
+# 🧑‍💼 Add (sign=1) or remove (sign=-1) a taxpayer's years from one agent's rows
+def assign_client(agent_id, taxpayer_id, sign=1):
+    with transaction.atomic():
+        for year, *values in TaxpayerSummary.objects.filter(user_id=taxpayer_id).values_list("year", *FIELDS):
+            _bump(agent_id, year, (sign, *(sign * value for value in values)))
+
+
+def _expected(records, profiles):
+    taxpayers = {}
+    user_ids = records.objects.order_by("user_id").values_list("user_id", flat=True).distinct()
+    last_id = 0
+    while True:
+        chunk = list(user_ids.filter(user_id__gt=last_id)[:REBUILD_CHUNK_SIZE])
+        if not chunk:
+            break
+        last_id = chunk[-1]
+        taxpayers.update(_latest_records(chunk, records))
+
+    agents = defaultdict(list)
+    for taxpayer_id, agent_id in profiles.objects.values_list("taxpayer_id", "agent_id").iterator():
+        agents[taxpayer_id].append(agent_id)
+    books = defaultdict(lambda: [0, 0, 0, 0])
+    for (user_id, year), values in taxpayers.items():
+        for agent_id in [None, *agents.get(user_id, ())]:
+            total = books[(agent_id, year)]
+            total[0] += 1
+            for i, value in enumerate(values, start=1):
+                total[i] += value
+    return taxpayers, {key: tuple(total) for key, total in books.items()}
+
+
+def _drift(label, stored, expected):
+    return [
+        (label, key, stored.get(key), expected.get(key))
+        for key in sorted(stored.keys() | expected.keys(), key=lambda key: (str(key[0]), key[1]))
+        if stored.get(key) != expected.get(key)
+    ]
+
+
+# 🛠️ Recompute every summary from TaxRecords; returns the drifted rows as
+# (table, (owner, year), stored, expected) and rewrites them unless check_only.
+# Migrations pass their historical `apps` so the same rebuild backfills the tables.
+def rebuild_summaries(check_only=False, apps=None):
+    records, profiles, taxpayer_summaries, summaries = (
+        (TaxRecord, ClientProfile, TaxpayerSummary, TaxSummary) if apps is None
+        else [apps.get_model("core", name) for name in ("TaxRecord", "ClientProfile", "TaxpayerSummary", "TaxSummary")]
+    )
+    expected_taxpayers, expected_books = _expected(records, profiles)
+    stored_taxpayers = {
+        (user_id, year): tuple(values)
+        for user_id, year, *values in taxpayer_summaries.objects.values_list("user_id", "year", *FIELDS).iterator()
+    }
+    stored_books = {
+        (agent_id, year): tuple(values)
+        for agent_id, year, *values in summaries.objects.values_list("agent_id", "year", "filed", *FIELDS).iterator()
+    }
+    drift = (
+        _drift("taxpayer", stored_taxpayers, expected_taxpayers) + _drift("agent", stored_books, expected_books)
+    )
+    if check_only or not drift:
+        return drift
+
+    with transaction.atomic():
+        for label, (owner, year), stored, expected in drift:
+            model, owner_field, fields = (
+                (taxpayer_summaries, "user_id", FIELDS) if label == "taxpayer"
+                else (summaries, "agent_id", ("filed", *FIELDS))
+            )
+            rows = model.objects.filter(**{owner_field: owner, "year": year})
+            if expected is None:
+                rows.delete()
+            elif stored is None:
+                model.objects.create(**{owner_field: owner, "year": year}, **dict(zip(fields, expected)))
+            else:
+                rows.update(**dict(zip(fields, expected)))
+    return drift
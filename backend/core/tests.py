@@ -1,3 +1,1459 @@
-from django.test import TestCase
+import io
+import os
+import csv
+import json
+import random
+import datetime
+import re
+import tempfile
+import time
+import zipfile
+from decimal import Decimal
+from types import SimpleNamespace
+from urllib.parse import urlencode
+from asgiref.sync import async_to_sync
+from unittest import mock, skipUnless
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import AsyncClient, TestCase, RequestFactory, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from rest_framework.views import APIView
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import RefreshToken
+from .async_views import aiter_zip
+from .authentication import StatelessJWTAuthentication, forget_user_status
+from .bench import RequestFailed, run_benchmark, seed, synthetic_p9
+from .archives import DeflatedZipWriter, deflate_member
+from .exports import FLUSH_BYTES, PARALLEL_EXPORT_MIN_CLIENTS, build_agent_zip_file, iter_zip
+from .ingest import ingest_p9_files
+from .instrumentation import serializing
+from .jobs import MAX_ATTEMPTS, STALE_JOB_SECONDS, claim_next_job, run_worker
+from .offboarding import MAX_ATTEMPTS as DELETION_MAX_ATTEMPTS, STALE_DELETION_SECONDS, claim_next_deletion
+from .retention import collect_garbage, expired_p9_ids, expired_zip_ids
+from .p9 import MAX_MONTHS, OVERFLOW_MONTH, P9Totals
+from .permissions import IsAgent
+from .renderers import FastJSONRenderer
+from .routers import PrimaryReplicaRouter, coordination_cache
+from .models import (
+    User, P9Form, P9Job, P9Line, TaxRecord, TaxZip, TaxYearRules, ClientProfile, TaxSummary, TaxpayerSummary, UserDeletionJob
+)
+from .serializers import RowSerializer, TaxRecordSerializer, UserSerializer, TAX_RECORD_ROWS, USER_ROWS
+from .summaries import rebuild_summaries
+from .throttling import UploadTooLarge, SizeLimitUploadHandler, admit, gate
+from .tax import get_rules, invalidate_rules
 
-# Create your tests here.
+
+def make_clients(agent, count, years=("2024", "2025")):
+    start = agent.clients.count()
+    for i in range(start, start + count):
+        taxpayer = User.objects.create_user(
+            username=f"{agent.username}_client{i}", email=f"c{i}@example.com", role="taxpayer"
+        )
+        ClientProfile.objects.create(agent=agent, taxpayer=taxpayer)
+        for year in years:
+            TaxRecord.objects.create(
+                user=taxpayer, year=year, gross_income=100000,
+                taxable_income=100000, computed_paye=22383.35
+            )
+
+
+def clear_caches():
+    # Pages and fingerprints, then pins and throttle histories
+    cache.clear()
+    coordination_cache().clear()
+
+
+# 🗂️ Each test writes uploads and exports under its own throwaway MEDIA_ROOT
+class TempMediaMixin:
+    def setUp(self):
+        super().setUp()
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        override = self.settings(MEDIA_ROOT=self.media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+
+def whole_file_total(data):
+    # The parse P9UploadView did before uploads were parsed in chunks
+    total_income = 0
+    for row in csv.DictReader(data.decode("utf-8").splitlines()):
+        try:
+            total_income += float(row.get("Basic Salary", 0)) + float(row.get("Benefits", 0))
+        except (TypeError, ValueError):
+            continue
+    return total_income
+
+
+def parse_chunks(chunks):
+    totals = P9Totals()
+    for chunk in chunks:
+        totals.feed(chunk)
+    totals.close()
+    return totals
+
+
+# 🧾 P9s parse the same however the body is split into chunks
+class P9ParserTests(TestCase):
+    P9 = (
+        'Month,Basic Salary,Benefits,Notes\r\n'
+        'Jan,100000,5000,"bonus, paid late"\r\n'
+        'Feb,100000,5000,"two\nlines"\r\n'
+        'Mar,abc,5000,skipped\r\n'
+        'Apr,120000.50,0,"quoted ""word"""\r\n'
+        'Mai,110000,2500,Zürich\r\n'
+        'Jun,90000\r\n'
+        '\r\n'
+        'Jul,95000,0,last'
+    ).encode("utf-8")
+
+    def test_any_chunk_boundary_matches_whole_file(self):
+        expected = parse_chunks([self.P9])
+        self.assertEqual(expected.total_income, whole_file_total(self.P9))
+        self.assertEqual(sorted(expected.months), ["Apr", "Feb", "Jan", "Jul", "Mai"])
+        # Every split point: mid-row, mid-quote, mid-CRLF and inside the two-byte "ü"
+        for i in range(len(self.P9) + 1):
+            totals = parse_chunks([self.P9[:i], self.P9[i:]])
+            self.assertEqual((totals.total_income, totals.months), (expected.total_income, expected.months), i)
+        for size in (1, 3, 7):
+            totals = parse_chunks(self.P9[i:i + size] for i in range(0, len(self.P9), size))
+            self.assertEqual((totals.total_income, totals.months), (expected.total_income, expected.months), size)
+
+    def test_months_are_bounded_without_month_column(self):
+        data = ("Basic Salary,Benefits\n" + "1000,10\n" * 100).encode()
+        totals = parse_chunks([data])
+        self.assertEqual(len(totals.months), MAX_MONTHS + 1)
+        self.assertEqual(totals.months[OVERFLOW_MONTH], [1000.0 * (100 - MAX_MONTHS), 10.0 * (100 - MAX_MONTHS)])
+        self.assertEqual(totals.total_income, whole_file_total(data))
+
+    def test_unbalanced_quote_is_refused(self):
+        data = b'Month,Basic Salary,Benefits\nJan,"100000,5000\n' + b"Feb,100000,5000\n" * 20000
+        with self.assertRaises(csv.Error):
+            parse_chunks(data[i:i + 65536] for i in range(0, len(data), 65536))
+
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username="taxpayer", role="taxpayer"))
+        response = client.post("/api/upload-p9/", {"file": SimpleUploadedFile("p9.csv", data)})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Could not read P9", response.json()["file"][0])
+        self.assertFalse(P9Form.objects.exists())
+
+
+# 🇰🇪 PAYE per tax year, one income at a time or a whole column at once
+class TaxRulesTests(TestCase):
+    # 2025 bands (migration 0004) less the 2,400 personal relief
+    EXPECTED = {
+        0: 0, 24000: 0, 24001: 0.25, 32333: 2083.25, 32334: 2083.55, 100000: 22383.35,
+        500000: 142383.35, 500002: 142384, 800000: 239883.35, 800001: 239883.7, 1000000: 309883.35,
+    }
+
+    def setUp(self):
+        # Compiled rules outlive the test's transaction
+        self.addCleanup(invalidate_rules)
+
+    def test_band_boundaries(self):
+        rules = get_rules("2025")
+        for income, paye in self.EXPECTED.items():
+            self.assertAlmostEqual(rules.paye(income), paye, places=2, msg=income)
+
+    def test_vectorized_matches_scalar(self):
+        rules = get_rules("2025")
+        incomes = [limit + delta for limit in (24000, 32333, 500000, 800000) for delta in (-0.01, 0, 0.01)]
+        incomes += list(self.EXPECTED) + [i * 7919.37 for i in range(200)]
+        expected = [rules.paye(income) for income in incomes]
+        self.assertEqual(rules.paye_many(incomes), expected)
+        with mock.patch("core.tax.np", None):
+            self.assertEqual(rules.paye_many(incomes), expected)
+
+    def test_rules_per_year(self):
+        TaxYearRules.objects.create(
+            year="2030", bands=[[10000, 0.1], [None, 0.2]], personal_relief=0,
+            shif_rate=0, shif_minimum=0, nssf=0, housing_levy_rate=0,
+        )
+        self.assertEqual(get_rules().year, "2030")
+        self.assertEqual(get_rules("2030").paye(20000), 3000)
+        self.assertEqual(get_rules("2025").paye(100000), 22383.35)
+        with self.assertRaises(TaxYearRules.DoesNotExist):
+            get_rules("1999")
+
+    def test_recompute_paye(self):
+        user = User.objects.create_user(username="taxpayer", role="taxpayer")
+        stale = TaxRecord.objects.create(user=user, year="2025", gross_income=100000, taxable_income=100000,
+                                         computed_paye=1)
+        current = TaxRecord.objects.create(user=user, year="2025", gross_income=500000, taxable_income=500000,
+                                           computed_paye=Decimal("142383.35"))
+        unknown = TaxRecord.objects.create(user=user, year="1999", gross_income=1, taxable_income=1, computed_paye=5)
+
+        out = io.StringIO()
+        call_command("recompute_paye", "--dry-run", stdout=out)
+        self.assertIn(f"TaxRecord {stale.id} (2025)", out.getvalue())
+        stale.refresh_from_db()
+        self.assertEqual(stale.computed_paye, 1)
+
+        call_command("recompute_paye", "--chunk-size", "2", stdout=io.StringIO())
+        for record, paye in ((stale, Decimal("22383.35")), (current, Decimal("142383.35")), (unknown, 5)):
+            record.refresh_from_db()
+            self.assertEqual(record.computed_paye, paye)
+
+
+# 🌊 ZIP exports stream as they are built and are reused while the records stay the same
+class ZipExportTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        clear_caches()
+        self.taxpayer = User.objects.create_user(username="taxpayer", role="taxpayer")
+        for year in ("2023", "2024"):
+            TaxRecord.objects.create(user=self.taxpayer, year=year, gross_income=100000,
+                                     taxable_income=100000, computed_paye=Decimal("22383.35"))
+        self.client = APIClient()
+        self.client.force_authenticate(self.taxpayer)
+
+    def summary_csv(self, content):
+        with zipfile.ZipFile(io.BytesIO(content)) as zf:
+            self.assertIsNone(zf.testzip())
+            return zf.read("tax_summary.csv").decode()
+
+    def test_streamed_zip(self):
+        response = self.client.get("/api/generate-zip/", {"stream": 1})
+        self.assertTrue(response.streaming)
+        self.assertFalse(response.has_header("Content-Length"))
+        self.assertIn("attachment;", response["Content-Disposition"])
+        lines = self.summary_csv(b"".join(response.streaming_content)).splitlines()
+        self.assertEqual([line.split(",")[0] for line in lines[1:]], ["2023", "2024"])
+        self.assertFalse(TaxZip.objects.exists())
+
+    def test_large_entries_stream_in_chunks(self):
+        rng = random.Random(0)
+        lines = [f"{i},{rng.getrandbits(256):x}\n" for i in range(5000)]
+        chunks = list(iter_zip([("a.csv", iter(lines)), ("empty.csv", [])]))
+        self.assertGreater(len(chunks), 2)
+        with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as zf:
+            self.assertEqual(zf.read("a.csv").decode(), "".join(lines))
+            self.assertEqual(zf.read("empty.csv"), b"")
+
+    def test_same_records_reuse_archive(self):
+        first = self.client.get("/api/generate-zip/").json()["download_url"]
+        second = self.client.get("/api/generate-zip/").json()["download_url"]
+        self.assertEqual(TaxZip.objects.count(), 1)
+        self.assertEqual(first.split("?")[0], second.split("?")[0])
+        # A stored archive is also what the streamed export serves
+        streamed = self.client.get("/api/generate-zip/", {"stream": 1})
+        self.assertEqual(b"".join(streamed.streaming_content), TaxZip.objects.get().zip_file.read())
+
+    def test_new_record_invalidates_archive(self):
+        self.client.get("/api/generate-zip/")
+        TaxRecord.objects.create(user=self.taxpayer, year="2025", gross_income=200000,
+                                 taxable_income=200000, computed_paye=0)
+        self.client.get("/api/generate-zip/")
+        self.assertEqual(TaxZip.objects.count(), 2)
+        old, new = TaxZip.objects.order_by("id")
+        self.assertNotEqual(old.fingerprint, new.fingerprint)
+        self.assertIn("2025,", self.summary_csv(new.zip_file.read()))
+
+    def test_command_and_endpoint_share_agent_archive(self):
+        agent = User.objects.create_user(username="agent", role="agent")
+        ClientProfile.objects.create(agent=agent, taxpayer=self.taxpayer)
+        call_command("export_agent_clients", "agent", stdout=io.StringIO())
+        built = TaxZip.objects.get()
+        self.assertEqual((built.user, built.created_by), (agent, agent))
+
+        self.client.force_authenticate(agent)
+        self.assertEqual(self.client.get("/api/agent/clients/zip/").json()["clients"], 1)
+        self.assertEqual(TaxZip.objects.get(), built)
+
+        TaxRecord.objects.create(user=self.taxpayer, year="2025", gross_income=200000,
+                                 taxable_income=200000, computed_paye=0)
+        self.client.get("/api/agent/clients/zip/")
+        self.assertEqual(TaxZip.objects.count(), 2)
+
+
+# 🗜️ Members deflated in worker processes still make an archive zipfile can read
+class DeflatedZipWriterTests(TestCase):
+    def test_writer_output_opens_with_zipfile(self):
+        rng = random.Random(0)
+        contents = {
+            "a_summary.csv": "Tax Year,Gross Income\n2024,100000.00",
+            "empty.csv": "",
+            "large.csv": "".join(f"{rng.getrandbits(256):x}\n" for _ in range(4000)),
+            "mwangi_kāmau.csv": "2025,1.00",
+        }
+        self.assertGreater(len(contents["large.csv"]), FLUSH_BYTES)
+        buffer = io.BytesIO()
+        writer = DeflatedZipWriter(buffer)
+        for arcname, text in contents.items():
+            writer.add(*deflate_member(arcname, text))
+        writer.close()
+
+        with zipfile.ZipFile(io.BytesIO(buffer.getvalue())) as zf:
+            self.assertIsNone(zf.testzip())
+            self.assertEqual(zf.namelist(), list(contents))
+            self.assertEqual({name: zf.read(name).decode() for name in zf.namelist()}, contents)
+
+    def test_agent_archive_across_processes(self):
+        agent = User.objects.create_user(username="agent", role="agent")
+        make_clients(agent, PARALLEL_EXPORT_MIN_CLIENTS + 1, years=("2024",))
+        zip_file, count = build_agent_zip_file(agent, "clients.zip", processes=2)
+        with zip_file, zipfile.ZipFile(zip_file) as zf:
+            self.assertIsNone(zf.testzip())
+            self.assertEqual(len(zf.namelist()), count)
+            self.assertEqual(zf.read("agent_client0_summary.csv").decode().splitlines()[1].split(",")[0], "2024")
+
+
+# ⏳ Jobs left running by a dead worker are retried, and failed once out of attempts
+class BackgroundJobTests(TestCase):
+    def setUp(self):
+        self.taxpayer = User.objects.create_user(username="taxpayer", role="taxpayer")
+        self.client = APIClient()
+        self.client.force_authenticate(self.taxpayer)
+
+    def stale_job(self, attempts):
+        started_at = timezone.now() - datetime.timedelta(seconds=STALE_JOB_SECONDS + 60)
+        p9 = P9Form.objects.create(user=self.taxpayer, year="2025")
+        return P9Job.objects.create(p9=p9, year="2025", status="running", attempts=attempts, started_at=started_at)
+
+    def test_stale_job_is_reclaimed(self):
+        job = self.stale_job(attempts=1)
+        claimed = claim_next_job()
+        self.assertEqual((claimed.id, claimed.status, claimed.attempts), (job.id, "running", 2))
+
+    def test_stale_job_out_of_attempts_fails(self):
+        job = self.stale_job(attempts=MAX_ATTEMPTS)
+        self.assertIsNone(claim_next_job())
+        body = self.client.get(f"/api/upload-p9/jobs/{job.id}/").json()
+        self.assertEqual(body["status"], "failed")
+        self.assertTrue(body["error"])
+
+
+# 🧑‍💼 Agent client list must not issue a query per client
+class AgentClientQueryCountTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.agent = User.objects.create_user(username="agent", role="agent")
+        self.client = APIClient()
+        self.client.force_authenticate(self.agent)
+
+    def test_query_count_is_constant(self):
+        make_clients(self.agent, 3)
+        with self.assertNumQueries(2):
+            response = self.client.get("/api/agent/clients/")
+        self.assertEqual(len(response.json()["results"]), 3)
+
+        make_clients(self.agent, 20, years=("2025",))
+        with self.assertNumQueries(2):
+            response = self.client.get("/api/agent/clients/", {"page_size": 100})
+        self.assertEqual(len(response.json()["results"]), 23)
+
+    def test_year_filter_applies_to_prefetched_records(self):
+        make_clients(self.agent, 2)
+        with self.assertNumQueries(2):
+            response = self.client.get("/api/agent/clients/", {"year": "2024"})
+        for client in response.json()["results"]:
+            self.assertEqual([r["year"] for r in client["tax_records"]], ["2024"])
+
+
+# 📄 Cursor pagination on the list endpoints
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.agent = User.objects.create_user(username="agent", role="agent")
+        self.client = APIClient()
+
+    def test_agent_clients_follow_next_cursor(self):
+        make_clients(self.agent, 5, years=("2025",))
+        self.client.force_authenticate(self.agent)
+        response = self.client.get("/api/agent/clients/", {"page_size": 2})
+        names = []
+        while True:
+            body = response.json()
+            self.assertNotIn("count", body)
+            names += [c["taxpayer_name"] for c in body["results"]]
+            if not body["next"]:
+                break
+            response = self.client.get(body["next"])
+        self.assertEqual(names, [f"agent_client{i}" for i in range(5)])
+
+    def test_user_list_is_paginated(self):
+        admin = User.objects.create_user(username="admin", role="admin", is_staff=True)
+        make_clients(self.agent, 3, years=())
+        self.client.force_authenticate(admin)
+        body = self.client.get("/api/users/", {"page_size": 2}).json()
+        self.assertEqual(len(body["results"]), 2)
+        self.assertIsNotNone(body["next"])
+        self.assertIsNone(body["previous"])
+
+    def test_user_counts_cover_every_page(self):
+        admin = User.objects.create_user(username="admin", role="admin", is_staff=True)
+        make_clients(self.agent, 60, years=())
+        User.objects.create_user(username="gone", role="taxpayer", deleted_at=timezone.now())
+        self.client.force_authenticate(admin)
+        body = self.client.get("/api/users/counts/").json()
+        self.assertEqual(body, {"total": 62, "taxpayers": 60, "agents": 1, "admins": 1})
+
+
+# 🔎 Hot lookups must be served by an index, never a full table scan
+class QueryPlanTests(TestCase):
+    def setUp(self):
+        if connection.vendor == "postgresql":
+            # Tiny test tables would otherwise always be seq-scanned
+            with connection.cursor() as cursor:
+                cursor.execute("SET enable_seqscan = off")
+        elif connection.vendor != "sqlite":
+            self.skipTest(f"No plan checks for {connection.vendor}")
+
+        self.agent = User.objects.create_user(username="agent", role="agent")
+        make_clients(self.agent, 3)
+        self.taxpayer = User.objects.filter(role="taxpayer").first()
+
+    def assertIndexed(self, queryset):
+        plan = queryset.explain()
+        if connection.vendor == "postgresql":
+            scans = re.findall(r"Seq Scan on \w+", plan)
+        else:
+            scans = re.findall(r"\bSCAN (?!CONSTANT)\w+", plan)
+        self.assertEqual(scans, [], f"Sequential scan in plan:\n{plan}")
+
+    def test_tax_records_by_user_and_year(self):
+        self.assertIndexed(TaxRecord.objects.filter(user=self.taxpayer, year="2025").order_by("created_at"))
+
+    def test_tax_records_by_user_ordered(self):
+        self.assertIndexed(TaxRecord.objects.filter(user=self.taxpayer).order_by("created_at"))
+
+    def test_prefetch_records_for_many_users(self):
+        users = list(User.objects.filter(role="taxpayer").values_list("id", flat=True))
+        self.assertIndexed(TaxRecord.objects.filter(user__in=users, year="2025"))
+
+    def test_client_assignment_check(self):
+        self.assertIndexed(ClientProfile.objects.filter(agent=self.agent, taxpayer=self.taxpayer))
+
+    def test_agent_client_page(self):
+        self.assertIndexed(ClientProfile.objects.filter(agent=self.agent, id__gt=0).order_by("id"))
+
+    def test_users_by_role(self):
+        self.assertIndexed(User.objects.filter(role="agent"))
+
+    def test_export_cache_lookup(self):
+        self.assertIndexed(TaxZip.objects.filter(user=self.taxpayer, fingerprint="x").order_by("-id"))
+
+
+# 🗄️ Cached agent dashboards, ETags and precise invalidation
+class DashboardCacheTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.agent = User.objects.create_user(username="agent", role="agent")
+        self.other = User.objects.create_user(username="other", role="agent")
+        make_clients(self.agent, 2, years=("2025",))
+        make_clients(self.other, 2, years=("2025",))
+        self.client = APIClient()
+        self.client.force_authenticate(self.agent)
+
+    def test_repeat_request_is_served_from_cache(self):
+        first = self.client.get("/api/agent/clients/", {"year": "2025"})
+        with self.assertNumQueries(0):
+            second = self.client.get("/api/agent/clients/", {"year": "2025"})
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(first["ETag"], second["ETag"])
+
+    def test_if_none_match_returns_304(self):
+        etag = self.client.get("/api/agent/clients/")["ETag"]
+        response = self.client.get("/api/agent/clients/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_record_write_invalidates_only_affected_agents(self):
+        etag = self.client.get("/api/agent/clients/")["ETag"]
+        self.client.force_authenticate(self.other)
+        other_etag = self.client.get("/api/agent/clients/")["ETag"]
+
+        taxpayer = self.agent.clients.first().taxpayer
+        TaxRecord.objects.create(
+            user=taxpayer, year="2024", gross_income=1, taxable_income=1, computed_paye=0
+        )
+
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/agent/clients/", HTTP_IF_NONE_MATCH=other_etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.client.force_authenticate(self.agent)
+        response = self.client.get("/api/agent/clients/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+
+# 🪪 Stateless JWT auth only touches the DB once per status TTL
+class StatelessJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        self.agent = User.objects.create_user(username="agent", role="agent")
+        forget_user_status(self.agent.id)
+        token = RefreshToken.for_user(self.agent).access_token
+        self.request = RequestFactory().get("/", HTTP_AUTHORIZATION=f"Bearer {token}")
+        self.auth = StatelessJWTAuthentication()
+
+    def test_permission_checks_skip_user_lookup(self):
+        with self.assertNumQueries(1):
+            self.auth.authenticate(self.request)
+        with self.assertNumQueries(0):
+            user, _ = self.auth.authenticate(self.request)
+            self.assertTrue(IsAgent().has_permission(SimpleNamespace(user=user), None))
+            self.assertEqual((user.id, user.role, user.is_authenticated), (self.agent.id, "agent", True))
+        with self.assertNumQueries(1):
+            self.assertEqual(user.username, "agent")
+
+    def test_admin_endpoint_skips_user_lookup(self):
+        admin = User.objects.create_user(username="admin", role="admin", is_staff=True)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(admin).access_token}")
+        # Views read DEFAULT_AUTHENTICATION_CLASSES once, at import
+        with mock.patch.object(APIView, "authentication_classes", [StatelessJWTAuthentication]):
+            self.assertEqual(client.get("/api/users/counts/").status_code, 200)
+            # IsAdminUser is answered from the claims: the only query left is the count itself
+            with self.assertNumQueries(1):
+                self.assertEqual(client.get("/api/users/counts/").json()["admins"], 1)
+
+    def test_role_change_is_picked_up(self):
+        self.auth.authenticate(self.request)
+        self.agent.role = "taxpayer"
+        self.agent.save()
+        user, _ = self.auth.authenticate(self.request)
+        self.assertEqual(user.role, "taxpayer")
+
+    def test_inactive_user_is_rejected(self):
+        self.agent.is_active = False
+        self.agent.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate(self.request)
+
+
+# 🩺 Every request reports its DB and serialization time; slow ones are logged
+class PerformanceInstrumentationTests(TestCase):
+    TIMING = re.compile(r'app;dur=([\d.]+), db;dur=([\d.]+);desc="(\d+) queries", ser;dur=([\d.]+)')
+
+    def setUp(self):
+        clear_caches()
+        self.admin = User.objects.create_user(username="admin", role="admin", is_staff=True)
+        make_clients(User.objects.create_user(username="agent", role="agent"), 3, years=())
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def timing(self, response):
+        app, db, queries, ser = self.TIMING.fullmatch(response["Server-Timing"]).groups()
+        return float(app), float(db), int(queries), float(ser)
+
+    def test_server_timing_counts_queries(self):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get("/api/users/")
+        app, db, queries, ser = self.timing(response)
+        self.assertEqual(queries, len(captured))
+        self.assertGreater(queries, 0)
+        self.assertLessEqual(db + ser, app)
+
+    def test_row_serializer_and_rendering_are_timed(self):
+        real_many = RowSerializer.many
+
+        def slow_many(serializer, rows):
+            # Stands in for a large page; the query itself must not count
+            with serializing():
+                time.sleep(0.02)
+            return real_many(serializer, rows)
+
+        with mock.patch.object(RowSerializer, "many", slow_many):
+            _, _, _, ser = self.timing(self.client.get("/api/users/"))
+        self.assertGreaterEqual(ser, 20)
+
+        with mock.patch("core.renderers.dumps", side_effect=lambda data: time.sleep(0.02) or b"{}"):
+            _, _, _, ser = self.timing(self.client.get("/api/users/"))
+        self.assertGreaterEqual(ser, 20)
+
+    def test_slow_requests_are_logged(self):
+        # The middleware reads SLOW_REQUEST_MS when a client first loads it
+        with self.settings(SLOW_REQUEST_MS=10 ** 6), self.assertNoLogs("core.performance", "WARNING"):
+            self.client.get("/api/users/")
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        with self.settings(SLOW_REQUEST_MS=0), self.assertLogs("core.performance", "WARNING") as logs:
+            client.get("/api/users/")
+        message = logs.output[0]
+        self.assertIn("Slow request GET /api/users/", message)
+        self.assertRegex(message, r"\d+ queries .*Worst queries:\n  [\d.]+ms SELECT")
+
+
+# 🌱 Synthetic benchmark data is reproducible and parses like a real P9
+class SeedDataTests(TestCase):
+    def test_seed_creates_requested_shape(self):
+        seed(taxpayers=6, agents=2, clients_per_agent=3, years=["2024", "2025"], seed=1)
+        self.assertEqual(User.objects.filter(role="taxpayer").count(), 6)
+        self.assertEqual(ClientProfile.objects.count(), 6)
+        self.assertEqual(TaxRecord.objects.count(), 12)
+        for agent in User.objects.filter(role="agent"):
+            self.assertEqual(agent.clients.count(), 3)
+
+    def test_synthetic_p9_is_deterministic(self):
+        csv = synthetic_p9(rows=24, seed=3)
+        self.assertEqual(csv, synthetic_p9(rows=24, seed=3))
+        totals = P9Totals()
+        totals.feed(csv)
+        totals.close()
+        self.assertEqual(totals.rows, 24)
+        self.assertGreater(totals.total_income, 0)
+
+
+# ⏱️ Timed uploads are new files each time; the duplicate shortcut is its own case
+class BenchmarkTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        clear_caches()
+        seed(taxpayers=4, agents=1, clients_per_agent=2, years=["2025"])
+
+    def test_uploads_vary_per_iteration(self):
+        results = run_benchmark(iterations=3, memory_iterations=1, host="testserver")
+        # Four varied uploads plus the one the duplicate case repeats
+        self.assertEqual(P9Form.objects.count(), 5)
+        self.assertEqual(len(set(P9Form.objects.values_list("content_hash", flat=True))), 5)
+        self.assertEqual(results["endpoints"]["upload-p9/"]["statuses"], [200])
+        self.assertEqual(results["endpoints"]["upload-p9/ duplicate"]["requests"], 3)
+
+    def test_limits_do_not_apply_and_errors_fail(self):
+        tight = dict(settings.REST_FRAMEWORK, DEFAULT_THROTTLE_RATES={"upload": "1/min", "export": "1/min"})
+        with self.settings(REST_FRAMEWORK=tight, EXPENSIVE_REQUEST_SLOTS=0):
+            results = run_benchmark(iterations=3, memory_iterations=1, host="testserver")
+            self.assertEqual({s for stats in results["endpoints"].values() for s in stats["statuses"]}, {200})
+
+            # The agent's client has nothing to export once their records are gone
+            TaxRecord.objects.all().delete()
+            with self.assertRaisesMessage(RequestFailed, "/zip/ answered 404"):
+                run_benchmark(iterations=3, memory_iterations=1, host="testserver")
+
+
+# 📥 Authorized downloads with ranges, ETags and proxy offload
+class DownloadTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        clear_caches()
+
+        self.agent = User.objects.create_user(username="agent", role="agent")
+        make_clients(self.agent, 1)
+        self.taxpayer = User.objects.get(role="taxpayer")
+        self.body = bytes(range(256)) * 40
+        self.zip = TaxZip.objects.create(
+            user=self.taxpayer, zip_file=SimpleUploadedFile("export.zip", self.body)
+        )
+        self.url = f"/api/downloads/zips/{self.zip.id}/"
+        self.client = APIClient()
+
+    def read(self, response):
+        return b"".join(response.streaming_content)
+
+    def test_owner_and_assigned_agent_only(self):
+        self.client.force_authenticate(self.taxpayer)
+        self.assertEqual(self.read(self.client.get(self.url)), self.body)
+        self.client.force_authenticate(self.agent)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        stranger = User.objects.create_user(username="stranger", role="agent")
+        self.client.force_authenticate(stranger)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_signed_link_from_client_zip_view(self):
+        self.client.force_authenticate(self.agent)
+        link = self.client.get(f"/api/agent/clients/{self.taxpayer.id}/zip/").json()["download_url"]
+        self.assertIn("/api/downloads/zips/", link)
+        self.client.force_authenticate(None)
+        response = self.client.get(link)
+        self.assertEqual(response.status_code, 200)
+        with zipfile.ZipFile(io.BytesIO(self.read(response))) as zf:
+            self.assertEqual(len(zf.namelist()), 1)
+        self.assertEqual(self.client.get(link.replace("token=", "token=x")).status_code, 403)
+
+    def test_range_and_etag(self):
+        self.client.force_authenticate(self.taxpayer)
+        full = self.client.get(self.url)
+        etag = full["ETag"]
+        self.assertEqual(full["Accept-Ranges"], "bytes")
+
+        partial = self.client.get(self.url, HTTP_RANGE="bytes=10-19")
+        self.assertEqual(partial.status_code, 206)
+        self.assertEqual(partial["Content-Range"], f"bytes 10-19/{len(self.body)}")
+        self.assertEqual(self.read(partial), self.body[10:20])
+
+        suffix = self.client.get(self.url, HTTP_RANGE="bytes=-5", HTTP_IF_RANGE=etag)
+        self.assertEqual(self.read(suffix), self.body[-5:])
+        stale = self.client.get(self.url, HTTP_RANGE="bytes=0-1", HTTP_IF_RANGE='"stale"')
+        self.assertEqual(stale.status_code, 200)
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE="bytes=99999-").status_code, 416)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_media_root_is_not_served(self):
+        self.client.force_authenticate(self.taxpayer)
+        p9 = SimpleUploadedFile("p9.csv", b"Month,Basic Salary,Benefits\nJan,100000,5000\n")
+        body = self.client.post("/api/upload-p9/", {"file": p9}).json()["p9"]
+        self.assertNotIn("file", body)
+        stored = P9Form.objects.get(user=self.taxpayer).file.name
+        self.assertEqual(self.client.get(f"/media/{stored}").status_code, 404)
+        self.assertEqual(self.client.get(f"/media/{self.zip.zip_file.name}").status_code, 404)
+
+        self.client.force_authenticate(None)
+        self.assertIn("/api/downloads/p9/", body["download_url"])
+        response = self.client.get(body["download_url"])
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(self.read(response).startswith(b"Month,Basic Salary"))
+
+    def test_p9_download_is_not_compressed(self):
+        self.client.force_authenticate(self.taxpayer)
+        rows = "".join(f"{month},100000,5000\n" for month in ("Jan", "Feb", "Mar", "Apr") * 10)
+        p9 = SimpleUploadedFile("p9.csv", f"Month,Basic Salary,Benefits\n{rows}".encode())
+        link = self.client.post("/api/upload-p9/", {"file": p9}).json()["p9"]["download_url"]
+        response = self.client.get(link, HTTP_ACCEPT_ENCODING="gzip, br")
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertNotIn("Content-Encoding", response)
+        self.assertFalse(response["ETag"].startswith("W/"))
+        self.assertEqual(response["Content-Length"], str(P9Form.objects.get(user=self.taxpayer).file.size))
+        self.read(response)
+
+    def test_offload_to_proxy(self):
+        self.client.force_authenticate(self.taxpayer)
+        with self.settings(DOWNLOAD_OFFLOAD="x-accel-redirect"):
+            response = self.client.get(self.url)
+        self.assertEqual(response["X-Accel-Redirect"], f"/protected-media/{self.zip.zip_file.name}")
+        self.assertEqual(response.content, b"")
+        self.assertIn("ETag", response)
+
+
+# ⚡ Async views return what the sync views return
+class AsyncViewTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        clear_caches()
+
+        self.agent = User.objects.create_user(username="agent", role="agent")
+        make_clients(self.agent, 3)
+        self.taxpayer = User.objects.filter(role="taxpayer").first()
+        self.tokens = {user.id: RefreshToken.for_user(user).access_token for user in (self.agent, self.taxpayer)}
+
+    def bearer(self, user):
+        return {"headers": {"Authorization": f"Bearer {self.tokens[user.id]}"}}
+
+    async def test_upload_computes_tax_record(self):
+        p9 = SimpleUploadedFile("p9.csv", b"Month,Basic Salary,Benefits\nJan,100000,5000\nFeb,100000,5000\n")
+        response = await AsyncClient().post("/api/async/upload-p9/", {"file": p9}, **self.bearer(self.taxpayer))
+        self.assertEqual(response.status_code, 200)
+        record = response.json()["tax_record"]
+        self.assertEqual(Decimal(record["gross_income"]), 210000)
+        self.assertTrue(await P9Form.objects.filter(user=self.taxpayer).aexists())
+        self.assertIn("db;dur=", response["Server-Timing"])
+
+        link = response.json()["p9"]["download_url"]
+        self.assertEqual((await AsyncClient().get(link)).status_code, 200)
+
+    async def test_permissions_match_sync_views(self):
+        client = AsyncClient()
+        self.assertEqual((await client.get("/api/async/generate-zip/")).status_code, 401)
+        response = await client.get("/api/async/agent/clients/", **self.bearer(self.taxpayer))
+        self.assertEqual(response.status_code, 403)
+
+    async def test_generate_zip_reuses_archive(self):
+        client = AsyncClient()
+        first = (await client.get("/api/async/generate-zip/", **self.bearer(self.taxpayer))).json()
+        second = (await client.get("/api/async/generate-zip/", **self.bearer(self.taxpayer))).json()
+        self.assertIn("/api/downloads/zips/", first["download_url"])
+        self.assertEqual(await TaxZip.objects.filter(user=self.taxpayer).acount(), 1)
+        self.assertEqual(first["download_url"].split("?")[0], second["download_url"].split("?")[0])
+        self.assertEqual((await client.get(first["download_url"])).status_code, 200)
+
+    async def test_streamed_zip_is_built_asynchronously(self):
+        response = await AsyncClient().get("/api/async/generate-zip/", {"stream": 1}, **self.bearer(self.taxpayer))
+        self.assertTrue(response.is_async)
+        body = b"".join([chunk async for chunk in response.streaming_content])
+        with zipfile.ZipFile(io.BytesIO(body)) as zf:
+            lines = zf.read("tax_summary.csv").decode().splitlines()
+        self.assertEqual(len(lines), 1 + await TaxRecord.objects.filter(user=self.taxpayer).acount())
+        self.assertFalse(await TaxZip.objects.aexists())
+
+    async def test_async_zip_matches_sync_zip(self):
+        rng = random.Random(0)
+        lines = [f"{i},{rng.getrandbits(256):x}\n" for i in range(5000)]
+
+        async def alines():
+            for line in lines:
+                yield line
+
+        chunks = [chunk async for chunk in aiter_zip("a.csv", alines(), batch_size=500)]
+        self.assertGreater(len(chunks), 2)
+        with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as zf:
+            self.assertEqual(zf.read("a.csv").decode(), "".join(lines))
+
+    def test_agent_clients_match_sync_view(self):
+        sync = APIClient()
+        sync.force_authenticate(self.agent)
+        expected = sync.get("/api/agent/clients/", {"page_size": 2}).json()
+        clear_caches()
+        response = async_to_sync(AsyncClient().get)(
+            "/api/async/agent/clients/", {"page_size": 2}, **self.bearer(self.agent)
+        )
+        body = response.json()
+        self.assertEqual(body["results"], expected["results"])
+        self.assertIn("/api/async/agent/clients/", body["next"])
+
+
+# 🔀 Read-heavy endpoints use the replica; writers and opted-out requests stay on primary
+@skipUnless("replica" in settings.DATABASES, "needs taxika.settings_test_replica")
+@override_settings(REPLICA_DATABASE="replica")
+class ReplicaRoutingTests(TempMediaMixin, TestCase):
+    databases = {"default", "replica"} if "replica" in settings.DATABASES else {"default"}
+
+    def setUp(self):
+        super().setUp()
+        clear_caches()
+        self.agent = User.objects.create_user(username="agent", role="agent")
+        make_clients(self.agent, 2)
+        self.client = APIClient()
+        self.client.force_authenticate(self.agent)
+
+    def test_list_reads_replica(self):
+        # Nothing replicates in tests, so the replica has no clients
+        self.assertEqual(self.client.get("/api/agent/clients/").json()["results"], [])
+
+    def test_stick_to_primary_header(self):
+        response = self.client.get("/api/agent/clients/", HTTP_X_STICK_TO_PRIMARY="1")
+        self.assertEqual(len(response.json()["results"]), 2)
+
+    def test_writer_reads_own_writes(self):
+        taxpayer = User.objects.filter(role="taxpayer").first()
+        self.client.force_authenticate(taxpayer)
+        self.assertEqual(self.client.get("/api/generate-zip/").status_code, 404)
+
+        p9 = SimpleUploadedFile("p9.csv", b"Month,Basic Salary,Benefits\nJan,100000,0\n")
+        self.assertEqual(self.client.post("/api/upload-p9/", {"file": p9}).status_code, 200)
+        self.assertEqual(self.client.get("/api/generate-zip/").status_code, 200)
+
+    def test_writes_always_go_to_primary(self):
+        replica_user = User(id=999, username="ghost")
+        replica_user._state.db = "replica"
+        router = PrimaryReplicaRouter()
+        self.assertEqual(router.db_for_write(User, instance=replica_user), "default")
+        # Outside a request, reads stay on primary
+        self.assertEqual(router.db_for_read(User), "default")
+
+
+# 🗓️ Re-uploading a P9 only rewrites the months that changed
+class IncrementalP9Tests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        clear_caches()
+
+        self.taxpayer = User.objects.create_user(username="taxpayer", role="taxpayer")
+        self.client = APIClient()
+        self.client.force_authenticate(self.taxpayer)
+
+    def upload(self, rows, **params):
+        csv = "Month,Basic Salary,Benefits\n" + "".join(f"{m},{s},{b}\n" for m, s, b in rows)
+        path = "/api/upload-p9/" + (f"?{urlencode(params)}" if params else "")
+        return self.client.post(path, {"file": SimpleUploadedFile("p9.csv", csv.encode())})
+
+    def test_reupload_updates_one_record(self):
+        year = [("Jan", 100000, 5000), ("Feb", 100000, 5000), ("Mar", 100000, 5000)]
+        first = self.upload(year).json()
+        self.assertEqual(first["changed_months"], 3)
+        self.assertEqual(P9Line.objects.filter(user=self.taxpayer).count(), 3)
+
+        year[1] = ("Feb", 120000, 5000)
+        second = self.upload(year).json()
+        self.assertEqual(second["changed_months"], 1)
+        self.assertEqual(second["tax_record"]["id"], first["tax_record"]["id"])
+        self.assertEqual(Decimal(second["tax_record"]["gross_income"]), 335000)
+        self.assertEqual(TaxRecord.objects.filter(user=self.taxpayer).count(), 1)
+
+        self.assertEqual(self.upload(year).json()["changed_months"], 0)
+
+    def test_dropped_month_is_removed(self):
+        self.upload([("Jan", 1000, 0), ("Feb", 1000, 0)])
+        body = self.upload([("Jan", 1000, 0)]).json()
+        self.assertEqual(body["changed_months"], 1)
+        self.assertEqual(list(P9Line.objects.values_list("month", flat=True)), ["Jan"])
+        self.assertEqual(Decimal(body["tax_record"]["gross_income"]), 1000)
+
+    def test_full_reprocess_adds_a_record(self):
+        self.upload([("Jan", 1000, 0)])
+        self.upload([("Jan", 2000, 0)], incremental=0)
+        self.assertEqual(TaxRecord.objects.filter(user=self.taxpayer).count(), 2)
+        self.assertEqual(P9Line.objects.get().basic_salary, 2000)
+
+
+# ♻️ Identical re-uploads return the existing result; identical files are stored once
+class P9DeduplicationTests(TempMediaMixin, TestCase):
+    CSV = b"Month,Basic Salary,Benefits\nJan,100000,5000\n"
+
+    def setUp(self):
+        super().setUp()
+        clear_caches()
+
+        self.taxpayer = User.objects.create_user(username="taxpayer", role="taxpayer")
+        self.client = APIClient()
+        self.client.force_authenticate(self.taxpayer)
+
+    def upload(self, body, name="p9.csv"):
+        return self.client.post("/api/upload-p9/", {"file": SimpleUploadedFile(name, body)}).json()
+
+    def test_repeat_upload_returns_existing_result(self):
+        first = self.upload(self.CSV)
+        with self.assertNumQueries(3):
+            second = self.upload(self.CSV, name="again.csv")
+        self.assertTrue(second["duplicate"])
+        self.assertEqual(second["tax_record"], first["tax_record"])
+        self.assertEqual(P9Form.objects.count(), 1)
+        self.assertEqual(len(os.listdir(os.path.join(self.media.name, "p9_uploads"))), 1)
+
+    def test_reverting_to_an_older_file_is_processed(self):
+        self.upload(self.CSV)
+        self.upload(self.CSV.replace(b"100000", b"200000"))
+        body = self.upload(self.CSV)
+        self.assertNotIn("duplicate", body)
+        self.assertEqual(Decimal(body["tax_record"]["gross_income"]), 105000)
+
+    def test_identical_files_share_storage_across_users(self):
+        self.upload(self.CSV)
+        other = User.objects.create_user(username="other", role="taxpayer")
+        self.client.force_authenticate(other)
+        body = self.upload(self.CSV)
+        self.assertNotIn("duplicate", body)
+        names = set(P9Form.objects.values_list("file", flat=True))
+        self.assertEqual(len(names), 1)
+        self.assertEqual(TaxRecord.objects.filter(user=other).count(), 1)
+
+
+# 🏭 Agents ingest many clients' P9s in one request
+class AgentBulkP9Tests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        clear_caches()
+
+        self.agent = User.objects.create_user(username="agent", role="agent")
+        self.client = APIClient()
+        self.client.force_authenticate(self.agent)
+
+    def archive(self, names, salary=100000):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as zf:
+            for name in names:
+                zf.writestr(name, f"Month,Basic Salary,Benefits\nJan,{salary},0\nFeb,{salary},0\n")
+        return SimpleUploadedFile("batch.zip", buffer.getvalue())
+
+    def ingest(self, names, **kwargs):
+        return self.client.post("/api/agent/p9/bulk/", {"archive": self.archive(names, **kwargs)}).json()
+
+    def test_report_per_file(self):
+        make_clients(self.agent, 2, years=())
+        User.objects.create_user(username="stranger", role="taxpayer")
+        body = self.ingest(["agent_client0.csv", "agent_client1/p9.csv", "stranger.csv", "agent_client0/again.csv"])
+
+        statuses = {entry["file"]: entry["status"] for entry in body["files"]}
+        self.assertEqual(statuses, {
+            "agent_client0.csv": "created", "agent_client1/p9.csv": "created",
+            "stranger.csv": "error", "agent_client0/again.csv": "error",
+        })
+        self.assertEqual(body["summary"], {"created": 2, "error": 2})
+        self.assertEqual(TaxRecord.objects.count(), 2)
+        self.assertEqual(P9Line.objects.count(), 4)
+
+    def test_reingest_updates_and_dedupes(self):
+        make_clients(self.agent, 2, years=())
+        names = ["agent_client0.csv", "agent_client1.csv"]
+        self.ingest(names)
+        self.assertEqual(self.ingest(names)["summary"], {"duplicate": 2})
+        body = self.ingest(names, salary=150000)
+        self.assertEqual(body["summary"], {"updated": 2})
+        self.assertEqual(TaxRecord.objects.count(), 2)
+        self.assertEqual(TaxRecord.objects.first().gross_income, 300000)
+
+    def test_query_count_does_not_grow_with_batch(self):
+        make_clients(self.agent, 13, years=())
+        # The first batch creates the agent's summary rows; later ones update them
+        self.ingest(["agent_client12.csv"])
+        with CaptureQueriesContext(connection) as small:
+            self.ingest([f"agent_client{i}.csv" for i in range(2)])
+        with CaptureQueriesContext(connection) as large:
+            self.ingest([f"agent_client{i}.csv" for i in range(2, 12)])
+        self.assertEqual(len(small), len(large))
+
+    def test_parallel_parse_matches_serial(self):
+        make_clients(self.agent, 8, years=())
+        rules = get_rules()
+        files = [(f"agent_client{i}.csv", f"Month,Basic Salary,Benefits\nJan,{i}000,0\n".encode()) for i in range(8)]
+        report = ingest_p9_files(self.agent, rules, files, processes=2)
+        self.assertEqual([entry["status"] for entry in report], ["created"] * 8)
+        self.assertEqual(
+            sorted(TaxRecord.objects.values_list("gross_income", flat=True)), [i * 1000 for i in range(8)]
+        )
+
+
+# 📊 Year summaries follow record and assignment changes without a rescan
+class TaxSummaryTests(TestCase):
+    def setUp(self):
+        self.agent = User.objects.create_user(username="agent", role="agent")
+        make_clients(self.agent, 3, years=("2024",))
+        self.client = APIClient()
+        self.client.force_authenticate(self.agent)
+
+    def summary(self, year="2024", agent="self"):
+        agent = self.agent if agent == "self" else agent
+        row = TaxSummary.objects.filter(agent=agent, year=year).first()
+        return row and (row.filed, row.gross_income, row.computed_paye)
+
+    def test_endpoint_reports_filed_and_unfiled(self):
+        make_clients(self.agent, 1, years=())
+        body = self.client.get("/api/summary/").json()
+        self.assertEqual(body["clients"], 4)
+        self.assertEqual(len(body["years"]), 1)
+        year = body["years"][0]
+        self.assertEqual((year["year"], year["filed"], year["unfiled"]), ("2024", 3, 1))
+        self.assertEqual(Decimal(year["gross_income"]), 300000)
+
+    def test_records_update_totals_in_place(self):
+        taxpayer = User.objects.get(username="agent_client0")
+        record = TaxRecord.objects.get(user=taxpayer)
+        record.gross_income = 200000
+        record.save()
+        self.assertEqual(self.summary()[:2], (3, 400000))
+
+        # A newer record for the year replaces the old one in the totals
+        TaxRecord.objects.create(
+            user=taxpayer, year="2024", gross_income=50000, taxable_income=50000, computed_paye=0
+        )
+        self.assertEqual(self.summary()[:2], (3, 250000))
+
+        TaxRecord.objects.filter(user=taxpayer).delete()
+        self.assertEqual(self.summary()[:2], (2, 200000))
+        self.assertEqual(self.summary(agent=None)[:2], (2, 200000))
+
+    def test_assignments_and_user_deletion(self):
+        other = User.objects.create_user(username="other", role="agent")
+        taxpayer = User.objects.get(username="agent_client0")
+        ClientProfile.objects.create(agent=other, taxpayer=taxpayer)
+        self.assertEqual(self.summary(agent=other)[:2], (1, 100000))
+
+        ClientProfile.objects.filter(agent=self.agent, taxpayer=taxpayer).delete()
+        self.assertEqual(self.summary()[:2], (2, 200000))
+
+        taxpayer.delete()
+        self.assertIsNone(self.summary(agent=other))
+        self.assertEqual(self.summary(agent=None)[:2], (2, 200000))
+
+        self.agent.delete()
+        self.assertEqual(rebuild_summaries(check_only=True), [])
+
+    def test_admin_sees_everyone(self):
+        admin = User.objects.create_user(username="admin", role="admin", is_staff=True)
+        self.client.force_authenticate(admin)
+        make_clients(User.objects.create_user(username="agent2", role="agent"), 2, years=("2024",))
+        body = self.client.get("/api/summary/").json()
+        self.assertEqual((body["agent"], body["years"][0]["filed"]), (None, 5))
+        body = self.client.get(f"/api/summary/?agent={self.agent.id}").json()
+        self.assertEqual(body["years"][0]["filed"], 3)
+
+    def test_rebuild_fixes_drift(self):
+        # bulk_update skips signals, so the summaries drift
+        TaxRecord.objects.update(gross_income=1)
+        with self.assertRaises(CommandError):
+            call_command("rebuild_summaries", "--check", stdout=io.StringIO())
+        call_command("rebuild_summaries", stdout=io.StringIO())
+        self.assertEqual(self.summary()[:2], (3, 3))
+        self.assertEqual(rebuild_summaries(check_only=True), [])
+
+
+
+# 🧮 Databases that had TaxRecords before the summary tables existed get them filled on migrate
+class SummaryBackfillMigrationTests(TransactionTestCase):
+    before = [("core", "0013_taxzip_created_by")]
+    after = [("core", "0014_backfill_tax_summaries")]
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_migrate_backfills_existing_records(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        apps = executor.loader.project_state(self.before).apps
+        users, profiles, records = (
+            apps.get_model("core", name) for name in ("User", "ClientProfile", "TaxRecord")
+        )
+        agent = users.objects.create(username="agent", role="agent")
+        for i in range(3):
+            taxpayer = users.objects.create(username=f"taxpayer{i}", role="taxpayer")
+            profiles.objects.create(agent=agent, taxpayer=taxpayer)
+            records.objects.create(
+                user=taxpayer, year="2024", gross_income=100000, taxable_income=90000, computed_paye=20000
+            )
+        # Only the latest record of the year counts
+        records.objects.create(
+            user=taxpayer, year="2024", gross_income=40000, taxable_income=40000, computed_paye=0
+        )
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.after)
+
+        for owner in (agent.id, None):
+            row = TaxSummary.objects.get(agent_id=owner, year="2024")
+            self.assertEqual((row.filed, row.gross_income, row.computed_paye), (3, 240000, 40000))
+        self.assertEqual(TaxpayerSummary.objects.count(), 3)
+        self.assertEqual(rebuild_summaries(check_only=True), [])
+
+# ⚡ Fast read path: same JSON as the DRF serializers, compressed on the wire
+class FastListTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.agent = User.objects.create_user(username="agent", role="agent", email="agent@example.com")
+        make_clients(self.agent, 30)
+        self.client = APIClient()
+        self.client.force_authenticate(self.agent)
+
+    def test_rows_match_model_serializers(self):
+        records = TaxRecord.objects.order_by("id")
+        self.assertEqual(
+            TAX_RECORD_ROWS.many(TAX_RECORD_ROWS.rows(records)), TaxRecordSerializer(records, many=True).data
+        )
+        users = User.objects.order_by("id")
+        self.assertEqual(USER_ROWS.many(USER_ROWS.rows(users)), UserSerializer(users, many=True).data)
+
+    def test_renderer_matches_drf(self):
+        data = {"records": TaxRecordSerializer(TaxRecord.objects.all(), many=True).data, "total": Decimal("1.50")}
+        self.assertEqual(json.loads(FastJSONRenderer().render(data)), json.loads(JSONRenderer().render(data)))
+
+    def test_client_list_is_compressed_and_revalidates(self):
+        response = self.client.get("/api/agent/clients/", headers={"Accept-Encoding": "gzip"})
+        self.assertIn(response["Content-Encoding"], ("gzip", "br"))
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertTrue(response["ETag"].startswith("W/"))
+        response = self.client.get(
+            "/api/agent/clients/", headers={"Accept-Encoding": "gzip", "If-None-Match": response["ETag"]}
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_zip_downloads_are_not_recompressed(self):
+        self.client.force_authenticate(User.objects.get(username="agent_client0"))
+        response = self.client.get("/api/generate-zip/", {"stream": "1"}, headers={"Accept-Encoding": "gzip, br"})
+        self.assertEqual(response["Content-Type"], "application/zip")
+        self.assertFalse(response.has_header("Content-Encoding"))
+        response.close()
+
+
+# 🗑️ Users are deactivated at once and removed in batches by the worker, files included
+class UserDeletionTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        clear_caches()
+
+        self.agent = User.objects.create_user(username="agent", role="agent")
+        make_clients(self.agent, 2)
+        self.taxpayer = User.objects.get(username="agent_client0")
+        self.files = []
+        for i in range(3):
+            p9 = P9Form(user=self.taxpayer, year="2024")
+            p9.file.save(f"p9_{i}.csv", SimpleUploadedFile(f"p9_{i}.csv", b"Month,Basic Salary\nJan,1\n"))
+            self.files.append(p9.file.path)
+        tax_zip = TaxZip(user=self.taxpayer)
+        tax_zip.zip_file.save("export.zip", SimpleUploadedFile("export.zip", b"zip"))
+        self.files.append(tax_zip.zip_file.path)
+
+        self.admin = User.objects.create_user(username="admin", role="admin", is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_delete_is_queued_then_done_in_batches(self):
+        # Another user's P9 shares the first blob and must keep it
+        P9Form.objects.create(user=self.agent, year="2024", file=P9Form.objects.filter(user=self.taxpayer).first().file)
+
+        response = self.client.delete(f"/api/users/{self.taxpayer.id}/")
+        self.assertEqual(response.status_code, 202)
+        self.taxpayer.refresh_from_db()
+        self.assertFalse(self.taxpayer.is_active)
+        self.assertEqual(self.summary_filed(), 1)
+        self.assertNotIn("agent_client0", [u["username"] for u in self.client.get("/api/users/").json()["results"]])
+        self.assertTrue(all(os.path.exists(path) for path in self.files))
+
+        with mock.patch("core.offboarding.DELETE_BATCH_SIZE", 2):
+            self.assertEqual(run_worker(once=True), 1)
+        job = self.client.get(response.json()["jobs"][0]["status_url"]).json()
+        self.assertEqual(job["status"], "done")
+        self.assertEqual(job["deleted_files"], 3)
+        self.assertFalse(User.objects.filter(id=self.taxpayer.id).exists())
+        self.assertFalse(TaxRecord.objects.filter(user_id=self.taxpayer.id).exists())
+        self.assertEqual([os.path.exists(path) for path in self.files], [True, False, False, False])
+        self.assertEqual(rebuild_summaries(check_only=True), [])
+
+    def test_pending_deletion_is_left_out_of_exports_ingest_and_counts(self):
+        self.assertEqual(self.client.delete(f"/api/users/{self.taxpayer.id}/").status_code, 202)
+        self.client.force_authenticate(self.agent)
+
+        body = self.client.get("/api/agent/clients/zip/").json()
+        self.assertEqual(body["clients"], 1)
+        with zipfile.ZipFile(io.BytesIO(b"".join(self.client.get(body["download_url"]).streaming_content))) as zf:
+            self.assertEqual(zf.namelist(), ["agent_client1_summary.csv"])
+        self.assertEqual(self.client.get(f"/api/agent/clients/{self.taxpayer.id}/zip/").status_code, 404)
+
+        p9 = SimpleUploadedFile("agent_client0.csv", b"Month,Basic Salary,Benefits\nJan,100000,0\n")
+        body = self.client.post("/api/agent/p9/bulk/", {"files": [p9]}).json()
+        self.assertEqual(body["summary"], {"error": 1})
+        self.assertEqual(self.client.get("/api/summary/").json()["clients"], 1)
+
+    def test_foreground_delete_uses_the_same_batches(self):
+        response = self.client.delete(f"/api/users/{self.taxpayer.id}/?background=0")
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(User.objects.filter(id=self.taxpayer.id).exists())
+        self.assertFalse(any(os.path.exists(path) for path in self.files))
+
+    def test_foreground_delete_leaves_a_claimed_job_to_its_worker(self):
+        UserDeletionJob.objects.create(
+            user=self.taxpayer, username=self.taxpayer.username, status="running", attempts=1,
+            started_at=timezone.now()
+        )
+        response = self.client.delete(f"/api/users/{self.taxpayer.id}/?background=0")
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()["jobs"][0]["status"], "running")
+        self.assertTrue(User.objects.filter(id=self.taxpayer.id).exists())
+        self.assertEqual(UserDeletionJob.objects.get().attempts, 1)
+
+    def test_stale_deletion_out_of_attempts_fails(self):
+        stale = timezone.now() - datetime.timedelta(seconds=STALE_DELETION_SECONDS + 60)
+        retry, last = (
+            UserDeletionJob.objects.create(user=user, username=user.username, status="running", attempts=attempts)
+            for user, attempts in ((self.agent, 1), (self.taxpayer, DELETION_MAX_ATTEMPTS))
+        )
+        UserDeletionJob.objects.update(started_at=stale, updated_at=stale)
+
+        self.assertEqual(claim_next_deletion().id, retry.id)
+        self.assertIsNone(claim_next_deletion())
+        last.refresh_from_db()
+        self.assertEqual(last.status, "failed")
+        self.assertIsNotNone(last.finished_at)
+
+    def test_bulk_offboarding(self):
+        ids = [self.agent.id, self.taxpayer.id, self.admin.id]
+        response = self.client.post("/api/users/offboard/", {"ids": ids}, format="json")
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(len(response.json()["jobs"]), 2)
+        run_worker(once=True)
+        self.assertEqual(set(User.objects.values_list("username", flat=True)), {"admin", "agent_client1"})
+        self.assertFalse(TaxSummary.objects.exclude(agent=None).exists())
+        self.assertEqual(UserDeletionJob.objects.filter(status="done").count(), 2)
+        self.assertEqual(rebuild_summaries(check_only=True), [])
+
+    def summary_filed(self):
+        return TaxSummary.objects.get(agent=self.agent, year="2024").filed
+
+
+# 🧺 Export retention and orphan cleanup keep media/ bounded
+@override_settings(TAXZIP_KEEP_LAST=2, TAXZIP_MAX_AGE_DAYS=30)
+class StorageRetentionTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="taxpayer", role="taxpayer")
+
+    def make_zip(self, user, days_old=0, created_by=None):
+        tax_zip = TaxZip(user=user, created_by=created_by)
+        tax_zip.zip_file.save("export.zip", SimpleUploadedFile("export.zip", b"x" * 100))
+        TaxZip.objects.filter(id=tax_zip.id).update(created_at=timezone.now() - datetime.timedelta(days=days_old))
+        return tax_zip
+
+    def test_keep_last_and_max_age(self):
+        zips = [self.make_zip(self.user, days_old) for days_old in (40, 3, 2, 1)]
+        agent = User.objects.create_user(username="agent", role="agent")
+        agent_zips = [self.make_zip(agent, 1) for _ in range(3)]
+        with self.settings(TAXZIP_RETENTION_BY_ROLE={"agent": {"keep_last": None}}):
+            self.assertEqual(sorted(expired_zip_ids()), [zips[0].id, zips[1].id])
+
+            report = collect_garbage()
+        self.assertEqual(report["expired_exports"], {"rows": 2, "files": 2, "bytes": 200})
+        self.assertEqual(
+            set(TaxZip.objects.values_list("id", flat=True)), {zips[2].id, zips[3].id, *(z.id for z in agent_zips)}
+        )
+        self.assertFalse(os.path.exists(zips[0].zip_file.path))
+
+    def test_agent_exports_of_a_client_count_against_the_agent(self):
+        agent = User.objects.create_user(username="agent", role="agent")
+        other = User.objects.create_user(username="other", role="taxpayer")
+        own = [self.make_zip(self.user, days_old, created_by=self.user) for days_old in (3, 2)]
+        by_agent = [self.make_zip(self.user, days_old, created_by=agent) for days_old in (5, 1, 0)]
+        others = [self.make_zip(other, days_old) for days_old in (3, 2, 1)]
+        # One user per page, so the keyset walk has to carry on past the first page
+        with mock.patch("core.retention.RETENTION_BATCH_SIZE", 1):
+            expired = sorted(expired_zip_ids())
+        self.assertEqual(expired, [by_agent[0].id, others[0].id])
+        self.assertTrue(all(z.id not in expired for z in own))
+
+    def test_orphans_both_ways(self):
+        kept = self.make_zip(self.user)
+        gone = self.make_zip(self.user)
+        os.remove(gone.zip_file.path)
+        stray = os.path.join(self.media.name, "p9_uploads", "stray.csv")
+        os.makedirs(os.path.dirname(stray), exist_ok=True)
+        with open(stray, "wb") as f:
+            f.write(b"y" * 50)
+        fresh = os.path.join(self.media.name, "p9_uploads", "uploading.csv")
+        open(fresh, "wb").close()
+        os.utime(stray, (0, 0))
+
+        dry = collect_garbage(dry_run=True)
+        self.assertEqual(dry["orphan_files"], {"files": 1, "bytes": 50})
+        self.assertTrue(os.path.exists(stray))
+
+        report = collect_garbage()
+        self.assertEqual(report["reclaimed_bytes"], 50)
+        self.assertEqual(report["missing_files"], {"TaxZip": 1})
+        self.assertFalse(os.path.exists(stray))
+        self.assertTrue(os.path.exists(fresh))
+        self.assertEqual(list(TaxZip.objects.values_list("id", flat=True)), [kept.id])
+
+    def test_expired_p9_files_keep_rows_and_shared_blobs(self):
+        old = P9Form(user=self.user, year="2024")
+        old.file.save("p9.csv", SimpleUploadedFile("p9.csv", b"Month,Basic Salary\nJan,1\n"))
+        P9Form.objects.filter(id=old.id).update(uploaded_at=timezone.now() - datetime.timedelta(days=400))
+        other = P9Form(user=self.user, year="2024", file=old.file.name)
+        other.save()
+        with self.settings(P9_UPLOAD_MAX_AGE_DAYS=365):
+            collect_garbage(orphans=False)
+        old.refresh_from_db()
+        self.assertEqual(old.file.name, "")
+        self.assertTrue(os.path.exists(other.file.path))
+
+    def test_expired_p9_ids_are_paged(self):
+        forms = []
+        for i in range(3):
+            p9 = P9Form(user=self.user, year="2024")
+            p9.file.save(f"p9_{i}.csv", SimpleUploadedFile(f"p9_{i}.csv", b"Month,Basic Salary\nJan,1\n"))
+            forms.append(p9)
+        P9Form.objects.update(uploaded_at=timezone.now() - datetime.timedelta(days=400))
+        with self.settings(P9_UPLOAD_MAX_AGE_DAYS=365), mock.patch("core.retention.RETENTION_BATCH_SIZE", 1):
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(list(expired_p9_ids()), [p9.id for p9 in forms])
+            report = collect_garbage(orphans=False)
+        # One query per page, plus the empty one that ends the walk
+        self.assertEqual(len(queries), 4)
+        self.assertEqual(report["expired_p9_uploads"]["rows"], 3)
+        self.assertFalse(P9Form.objects.exclude(file="").exists())
+
+
+# 🚦 Expensive endpoints: per-role rates (429), size limits (413) and a concurrency cap (503)
+class ThrottlingTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        clear_caches()
+
+        self.agent = User.objects.create_user(username="agent", role="agent")
+        make_clients(self.agent, 2)
+        self.taxpayer = User.objects.filter(role="taxpayer").first()
+        self.clients = {}
+        for user in (self.agent, self.taxpayer):
+            self.clients[user.id] = APIClient()
+            self.clients[user.id].force_authenticate(user)
+
+    def rates(self, **rates):
+        return self.settings(REST_FRAMEWORK=dict(settings.REST_FRAMEWORK, DEFAULT_THROTTLE_RATES=rates))
+
+    def test_rates_depend_on_role(self):
+        taxpayer, agent = self.clients[self.taxpayer.id], self.clients[self.agent.id]
+        with self.rates(**{"export": "2/min", "export.agent": "3/min"}):
+            self.assertEqual([taxpayer.get("/api/generate-zip/").status_code for _ in range(3)], [200, 200, 429])
+            response = taxpayer.get("/api/generate-zip/")
+            self.assertTrue(int(response["Retry-After"]) > 0)
+            url = f"/api/agent/clients/{self.taxpayer.id}/zip/"
+            self.assertEqual([agent.get(url).status_code for _ in range(4)], [200, 200, 200, 429])
+
+    def test_throttle_history_survives_page_cache_culling(self):
+        taxpayer = self.clients[self.taxpayer.id]
+        with self.rates(export="1/min"):
+            self.assertEqual(taxpayer.get("/api/generate-zip/").status_code, 200)
+            # What a cull of the page/fingerprint cache would do
+            cache.clear()
+            self.assertEqual(taxpayer.get("/api/generate-zip/").status_code, 429)
+
+    def test_role_total_is_shared_by_the_role(self):
+        other = User.objects.create_user(username="other_agent", role="agent")
+        ClientProfile.objects.create(agent=other, taxpayer=User.objects.filter(role="taxpayer").last())
+        other_client = APIClient()
+        other_client.force_authenticate(other)
+        with self.rates(**{"export": "10/min", "export.agent.all": "2/min"}):
+            self.assertEqual(self.clients[self.agent.id].get("/api/agent/clients/zip/").status_code, 200)
+            self.assertEqual(self.clients[self.agent.id].get("/api/agent/clients/zip/").status_code, 200)
+            self.assertEqual(other_client.get("/api/agent/clients/zip/").status_code, 429)
+            # Taxpayers have no shared cap
+            self.assertEqual(self.clients[self.taxpayer.id].get("/api/generate-zip/").status_code, 200)
+
+    def test_oversized_upload_refused(self):
+        p9 = SimpleUploadedFile("p9.csv", b"Month,Basic Salary,Benefits\n" + b"Jan,100000,5000\n" * 20)
+        with self.settings(P9_UPLOAD_MAX_BYTES=200):
+            response = self.clients[self.taxpayer.id].post("/api/upload-p9/", {"file": p9})
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(P9Form.objects.exists())
+        self.assertEqual(gate.in_flight(), 0)
+
+        # Bodies without a Content-Length are cut off as the chunks arrive
+        handler = SizeLimitUploadHandler(max_bytes=10)
+        self.assertEqual(handler.receive_data_chunk(b"x" * 8, 0), b"x" * 8)
+        with self.assertRaises(UploadTooLarge):
+            handler.receive_data_chunk(b"x" * 8, 8)
+
+    def test_saturated_process_answers_503(self):
+        with self.settings(EXPENSIVE_REQUEST_SLOTS=1, EXPENSIVE_RETRY_AFTER_SECONDS=3):
+            release = admit("taxpayer")
+            try:
+                response = self.clients[self.taxpayer.id].get("/api/generate-zip/")
+                self.assertEqual(response.status_code, 503)
+                self.assertEqual(response["Retry-After"], "3")
+                bearer = {"Authorization": f"Bearer {RefreshToken.for_user(self.taxpayer).access_token}"}
+                response = async_to_sync(AsyncClient().get)("/api/async/generate-zip/", headers=bearer)
+                self.assertEqual(response.status_code, 503)
+            finally:
+                release()
+            self.assertEqual(self.clients[self.taxpayer.id].get("/api/generate-zip/").status_code, 200)
+
+    def test_agents_leave_slots_for_taxpayers(self):
+        with self.settings(EXPENSIVE_REQUEST_SLOTS=2, EXPENSIVE_SLOTS_BY_ROLE={"agent": 1}):
+            release = admit("agent")
+            try:
+                self.assertEqual(self.clients[self.agent.id].get("/api/agent/clients/zip/").status_code, 503)
+                self.assertEqual(self.clients[self.taxpayer.id].get("/api/generate-zip/").status_code, 200)
+            finally:
+                release()
+
+    def test_streamed_export_holds_slot_until_sent(self):
+        response = self.clients[self.taxpayer.id].get("/api/generate-zip/", {"stream": 1})
+        self.assertEqual(gate.in_flight("taxpayer"), 1)
+        zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+        self.assertEqual(gate.in_flight("taxpayer"), 0)
+
+        # A response the server closes without sending (client gone) gives its slot back too
+        unread = self.clients[self.taxpayer.id].get("/api/generate-zip/", {"stream": 1})
+        self.assertEqual(gate.in_flight("taxpayer"), 1)
+        unread.close()
+        self.assertEqual(gate.in_flight("taxpayer"), 0)
+
+    def test_cached_export_streams_the_stored_file(self):
+        self.clients[self.taxpayer.id].get("/api/generate-zip/")
+        # The view's own response: the test client rewraps streaming content, dropping file_to_stream
+        request = APIRequestFactory().get("/api/generate-zip/", {"stream": 1})
+        force_authenticate(request, self.taxpayer)
+        response = resolve("/api/generate-zip/").func(request)
+        self.assertIsNotNone(response.file_to_stream)
+        self.assertEqual(gate.in_flight("taxpayer"), 1)
+        response.close()
+        self.assertEqual(gate.in_flight("taxpayer"), 0)
+
+    def test_async_streamed_export_holds_slot_until_sent(self):
+        headers = {"Authorization": f"Bearer {RefreshToken.for_user(self.taxpayer).access_token}"}
+
+        async def export():
+            response = await AsyncClient().get("/api/async/generate-zip/", {"stream": 1}, headers=headers)
+            held = gate.in_flight("taxpayer")
+            return held, b"".join([chunk async for chunk in response.streaming_content])
+
+        held, body = async_to_sync(export)()
+        self.assertEqual(held, 1)
+        zipfile.ZipFile(io.BytesIO(body))
+        self.assertEqual(gate.in_flight("taxpayer"), 0)
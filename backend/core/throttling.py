@@ -0,0 +1,212 @@
+import threading
+from collections import Counter
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler
+from rest_framework import exceptions
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+from .routers import coordination_cache
+
+
+class UploadTooLarge(exceptions.APIException):
+    status_code = 413
+    default_detail = "Upload is too large."
+    default_code = "upload_too_large"
+
+
+class Saturated(exceptions.APIException):
+    status_code = 503
+    default_detail = "The server is busy; try again shortly."
+    default_code = "saturated"
+
+    def __init__(self, wait):
+        super().__init__()
+        # DRF's exception handler turns this into Retry-After
+        self.wait = wait
+
+
+# 🚦 Per-user limit for the view's throttle_scope at the user's role's rate:
+# "<scope>.<role>" in DEFAULT_THROTTLE_RATES, falling back to "<scope>"
+class RoleRateThrottle(SimpleRateThrottle):
+    def __init__(self):
+        # The rate depends on who is asking, so it is resolved in allow_request
+        pass
+
+    def allow_request(self, request, view):
+        self.scope = getattr(view, "throttle_scope", None)
+        if not self.scope or not request.user.is_authenticated:
+            return True
+        self.rate = self.rate_for(api_settings.DEFAULT_THROTTLE_RATES, request.user.role)
+        if self.rate is None:
+            return True
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        self.cache = coordination_cache()
+        return super().allow_request(request, view)
+
+    def rate_for(self, rates, role):
+        return rates.get(f"{self.scope}.{role}", rates.get(self.scope))
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {"scope": self.scope, "ident": request.user.pk}
+
+
+# 👥 One bucket shared by a whole role ("<scope>.<role>.all"), so one role can't use up the capacity
+class RoleTotalThrottle(RoleRateThrottle):
+    def rate_for(self, rates, role):
+        return rates.get(f"{self.scope}.{role}.all")
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {"scope": self.scope, "ident": f"role-{request.user.role}"}
+
+
+# 🎟️ Slots for expensive requests in this process, with a smaller share per role
+class _Gate:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._total = 0
+        self._roles = Counter()
+
+    def _full(self, role):
+        slots = getattr(settings, "EXPENSIVE_REQUEST_SLOTS", 8)
+        role_slots = getattr(settings, "EXPENSIVE_SLOTS_BY_ROLE", {}).get(role)
+        return self._total >= slots or (role_slots is not None and self._roles[role] >= role_slots)
+
+    def enter(self, role):
+        with self._lock:
+            if self._full(role):
+                return False
+            self._total += 1
+            self._roles[role] += 1
+        return True
+
+    def leave(self, role):
+        with self._lock:
+            self._total -= 1
+            self._roles[role] -= 1
+
+    def in_flight(self, role=None):
+        with self._lock:
+            return self._total if role is None else self._roles[role]
+
+
+gate = _Gate()
+
+
+# 🎟️ Take a slot or raise Saturated at once (no queueing behind slow exports);
+# returns the callable that gives it back
+def admit(role):
+    if not gate.enter(role):
+        raise Saturated(getattr(settings, "EXPENSIVE_RETRY_AFTER_SECONDS", 2))
+    released = False
+
+    def release():
+        nonlocal released
+        if not released:
+            released = True
+            gate.leave(role)
+    return release
+
+
+class _ReleasingContent:
+    # Stands in for a streamed response's content; servers close every response when they are
+    # done with it, so the slot comes back after the last chunk, a client going away, or no read at all
+    def __init__(self, content, release):
+        self.content = content
+        self.release = release
+
+    def close(self):
+        self.release()
+
+
+class _ReleasingIterator(_ReleasingContent):
+    def __iter__(self):
+        try:
+            yield from self.content
+        finally:
+            self.release()
+
+
+class _ReleasingAsyncIterator(_ReleasingContent):
+    async def __aiter__(self):
+        try:
+            async for chunk in self.content:
+                yield chunk
+        finally:
+            self.release()
+
+
+# 📦 Give the slot back once the response is sent: streamed ZIPs hold theirs until the last chunk
+def release_when_sent(response, release):
+    if hasattr(response, "file_to_stream"):
+        # Stored files stay untouched for wsgi.file_wrapper / sendfile(); closing the response releases
+        response._resource_closers.append(release)
+    elif response.streaming:
+        wrapper = _ReleasingAsyncIterator if response.is_async else _ReleasingIterator
+        response.streaming_content = wrapper(response.streaming_content, release)
+    else:
+        release()
+    return response
+
+
+# 📏 Stops a multipart upload once it passes max_bytes, also when no Content-Length was sent
+class SizeLimitUploadHandler(FileUploadHandler):
+    def __init__(self, request=None, max_bytes=None):
+        super().__init__(request)
+        self.max_bytes = max_bytes
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.max_bytes:
+            raise UploadTooLarge()
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+
+def check_upload_size(request, max_bytes):
+    if not max_bytes:
+        return
+    # Refused from the header alone, before a byte of the body is read
+    try:
+        content_length = int(request.META.get("CONTENT_LENGTH") or 0)
+    except ValueError:
+        content_length = 0
+    if content_length > max_bytes:
+        raise UploadTooLarge()
+    request.upload_handlers.insert(0, SizeLimitUploadHandler(request, max_bytes))
+
+
+# 🛂 Admission for expensive DRF views: per-user and per-role rates (429), a size limit
+# checked before the body is read (413), and a per-process concurrency cap (503)
+class AdmissionMixin:
+    throttle_classes = [RoleRateThrottle, RoleTotalThrottle]
+    throttle_scope = None
+
+    def max_upload_bytes(self):
+        return None
+
+    def initial(self, request, *args, **kwargs):
+        # Authentication, permissions and throttles run first
+        super().initial(request, *args, **kwargs)
+        check_upload_size(request, self.max_upload_bytes())
+        self._release_slot = admit(request.user.role)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        release = getattr(self, "_release_slot", None)
+        if release is not None:
+            self._release_slot = None
+            release_when_sent(response, release)
+        return response
+
+
+# 🛂 The same checks for the async views, which are plain Django views; returns the slot's release
+def admit_request(drf_request, scope, max_bytes=None):
+    view = type("Scoped", (), {"throttle_scope": scope})()
+    for throttle in (RoleRateThrottle(), RoleTotalThrottle()):
+        if not throttle.allow_request(drf_request, view):
+            raise exceptions.Throttled(throttle.wait())
+    check_upload_size(drf_request, max_bytes)
+    return admit(drf_request.user.role)
@@ -4,12 +4,21 @@ from .views import (
     RegisterView,
     CustomTokenObtainPairView,
     P9UploadView,
+    P9JobStatusView,
     GenerateZipView,
     AgentClientListView,
     GenerateClientZipView,
+    AgentBulkZipView,
+    AgentBulkP9UploadView,
+    TaxSummaryView,
+    DownloadView,
     UserListView,
+    UserCountsView,
     UserDeleteView,
+    UserOffboardView,
+    UserDeletionStatusView,
 )
+from .async_views import AsyncP9UploadView, AsyncGenerateZipView, AsyncAgentClientListView
 
 urlpatterns = [
     # 🔐 Auth
@@ -19,13 +28,31 @@ urlpatterns = [
 
     # 👤 Taxpayer
     path("upload-p9/", P9UploadView.as_view(), name="upload-p9"),
+    path("upload-p9/jobs/<int:job_id>/", P9JobStatusView.as_view(), name="p9-job-status"),
     path("generate-zip/", GenerateZipView.as_view(), name="generate-zip"),
 
     # 🧑‍💼 Agent
     path("agent/clients/", AgentClientListView.as_view(), name="agent-clients"),
+    path("agent/clients/zip/", AgentBulkZipView.as_view(), name="agent-clients-zip"),
     path("agent/clients/<int:user_id>/zip/", GenerateClientZipView.as_view(), name="agent-client-zip"),
+    path("agent/p9/bulk/", AgentBulkP9UploadView.as_view(), name="agent-p9-bulk"),
+
+    # 📊 Year totals (agents: own book; admins: everyone)
+    path("summary/", TaxSummaryView.as_view(), name="tax-summary"),
+
+    # 📥 Downloads
+    path("downloads/zips/<int:pk>/", DownloadView.as_view(kind="zip"), name="download-zip"),
+    path("downloads/p9/<int:pk>/", DownloadView.as_view(kind="p9"), name="download-p9"),
+
+    # ⚡ Async variants (run under ASGI, e.g. uvicorn taxika.asgi:application)
+    path("async/upload-p9/", AsyncP9UploadView.as_view(), name="async-upload-p9"),
+    path("async/generate-zip/", AsyncGenerateZipView.as_view(), name="async-generate-zip"),
+    path("async/agent/clients/", AsyncAgentClientListView.as_view(), name="async-agent-clients"),
 
     # 🛠️ Admin
     path("users/", UserListView.as_view(), name="user-list"),
+    path("users/counts/", UserCountsView.as_view(), name="user-counts"),
     path("users/<int:id>/", UserDeleteView.as_view(), name="user-delete"),
+    path("users/offboard/", UserOffboardView.as_view(), name="user-offboard"),
+    path("users/deletions/<int:job_id>/", UserDeletionStatusView.as_view(), name="user-deletion-status"),
 ]
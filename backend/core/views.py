@@ -1,24 +1,74 @@
-import csv, io, zipfile, datetime
+import datetime
+from collections import defaultdict
 from rest_framework import generics, permissions
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from django.urls import reverse
 from .permissions import IsTaxpayer, IsAgent
-from .models import User, P9Form, TaxRecord, TaxZip, ClientProfile
+from .pagination import KeysetPagination
+from .dashboard import dashboard_cache_key, cache_dashboard, etag_matches
+from .models import (
+    User, P9Form, TaxRecord, TaxZip, ClientProfile, TaxYearRules, P9Job, TaxSummary, UserDeletionJob,
+    active_clients, active_users,
+)
+from .jobs import accept_p9
+from .ingest import MAX_BULK_BYTES, IngestError, collect_files, ingest_p9_files
+from .offboarding import request_deletion, claim_deletion, process_deletion
+from .exports import (
+    tax_summary_lines, build_zip_file, iter_zip, zip_response, find_cached_zip, agent_zip
+)
+from .downloads import DOWNLOADS, download_url, link_user_id, can_download, serve_file
+from .routers import read_from_replica
+from .throttling import AdmissionMixin
+from .p9 import P9UploadHandler
+from .tax import get_rules
 from .serializers import (
     RegisterSerializer,
     P9UploadSerializer,
     TaxRecordSerializer,
+    P9JobSerializer,
     TaxZipSerializer,
-    ClientProfileSerializer,
-    UserSerializer
+    TaxSummarySerializer,
+    UserDeletionJobSerializer,
+    UserSerializer,
+    TAX_RECORD_ROWS,
+    USER_ROWS
 )
 from rest_framework.permissions import IsAdminUser
 from rest_framework.generics import ListAPIView, DestroyAPIView
 
+def _flag(request, name, default=False):
+    value = request.query_params.get(name)
+    if value is None:
+        return default
+    return value.lower() in ("1", "true", "yes")
+
+def p9_job_accepted(request, job):
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": request.build_absolute_uri(reverse("p9-job-status", args=[job.id]))
+    }
+
+def deletion_accepted(request, jobs):
+    return {
+        "jobs": [
+            {
+                "job_id": job.id,
+                "user_id": job.user_id,
+                "status": job.status,
+                "status_url": request.build_absolute_uri(reverse("user-deletion-status", args=[job.id]))
+            }
+            for job in jobs
+        ]
+    }
+
 # ✅ Admin-Restricted Agent/Admin Registration
 class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
@@ -40,100 +90,87 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
 class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
 
-# 📤 Upload P9 CSV + PAYE Computation (2025 Rates)
-class P9UploadView(APIView):
+# 📤 Upload P9 CSV + PAYE Computation (per tax year rules)
+class P9UploadView(AdmissionMixin, APIView):
     permission_classes = [IsTaxpayer]
     parser_classes = [MultiPartParser]
+    throttle_scope = "upload"
+
+    def max_upload_bytes(self):
+        return getattr(settings, "P9_UPLOAD_MAX_BYTES", 10 * 1024 * 1024)
 
     def post(self, request):
+        background = _flag(request, "background", getattr(settings, "P9_BACKGROUND_UPLOADS", False))
+
+        # Hash (and total, unless queued) the P9 chunk by chunk while the upload streams in
+        p9_handler = P9UploadHandler(request, parse=not background)
+        request.upload_handlers.insert(0, p9_handler)
+
         serializer = P9UploadSerializer(data=request.data)
         if serializer.is_valid():
-            p9 = serializer.save(user=request.user)
-            file = request.FILES['file']
-            decoded = file.read().decode('utf-8').splitlines()
-            reader = csv.DictReader(decoded)
-
-            total_income = 0
-            for row in reader:
-                try:
-                    salary = float(row.get("Basic Salary", 0))
-                    benefits = float(row.get("Benefits", 0))
-                    total_income += salary + benefits
-                except:
-                    continue
-
-            # 🇰🇪 Kenya PAYE (2025) + Reliefs + Deductions
-            def compute_paye(income):
-                bands = [
-                    (24000, 0.10),
-                    (32333, 0.25),
-                    (500000, 0.30),
-                    (800000, 0.325),
-                    (float('inf'), 0.35),
-                ]
-                tax = 0
-                prev = 0
-                for limit, rate in bands:
-                    if income > limit:
-                        tax += (limit - prev) * rate
-                        prev = limit
-                    else:
-                        tax += (income - prev) * rate
-                        break
-
-                # Apply statutory deductions
-                shif = max(300, round(income * 0.0275, 2))
-                nssf = 1080
-                housing_levy = round(income * 0.015, 2)
-                personal_relief = 2400
-
-                net_tax = tax - personal_relief
-                net_tax = max(0, net_tax)  # No negative tax
-                return round(net_tax, 2)
-
-            paye = compute_paye(total_income)
-
-            tax_record = TaxRecord.objects.create(
-                user=request.user,
-                year="2025",
-                gross_income=total_income,
-                taxable_income=total_income,
-                computed_paye=paye
+            if p9_handler.error:
+                return Response({"file": [p9_handler.error]}, status=400)
+            try:
+                rules = get_rules(request.data.get("year"))
+            except TaxYearRules.DoesNotExist:
+                return Response({"year": ["No tax rules for this year."]}, status=400)
+
+            incremental = _flag(request, "incremental", getattr(settings, "P9_INCREMENTAL_UPLOADS", True))
+            p9, job, tax_record, changed, duplicate = accept_p9(
+                request.user.id, rules, p9_handler.content_hash, p9_handler.totals,
+                serializer.validated_data["file"], background, incremental
             )
-
-            return Response({
-                "p9": P9UploadSerializer(p9).data,
-                "tax_record": TaxRecordSerializer(tax_record).data
-            })
+            if job:
+                return Response(p9_job_accepted(request, job), status=202)
+            body = {
+                "p9": P9UploadSerializer(p9, context={"request": request}).data,
+                "tax_record": TaxRecordSerializer(tax_record).data,
+                "changed_months": changed
+            }
+            if duplicate:
+                body["duplicate"] = True
+            return Response(body)
         return Response(serializer.errors, status=400)
 
+# ⏳ Status of a background P9 upload
+class P9JobStatusView(APIView):
+    permission_classes = [IsTaxpayer]
+
+    def get(self, request, job_id):
+        try:
+            job = P9Job.objects.select_related("tax_record").get(id=job_id, p9__user_id=request.user.id)
+        except P9Job.DoesNotExist:
+            return Response({"error": "Job not found."}, status=404)
+        return Response(P9JobSerializer(job).data)
+
 # 📦 Generate ZIP for Taxpayer
-class GenerateZipView(APIView):
+class GenerateZipView(AdmissionMixin, APIView):
     permission_classes = [IsTaxpayer]
+    throttle_scope = "export"
 
     def get(self, request):
         user = request.user
+        read_from_replica(user)
         tax_records = TaxRecord.objects.filter(user=user)
         if not tax_records.exists():
             return Response({"error": "No tax records found."}, status=404)
 
-        lines = ["Tax Year,Gross Income,Taxable Income,Computed PAYE"]
-        for record in tax_records:
-            lines.append(f"{record.year},{record.gross_income},{record.taxable_income},{record.computed_paye}")
-        csv_content = "\n".join(lines)
-
-        mem_zip = io.BytesIO()
-        with zipfile.ZipFile(mem_zip, "w", zipfile.ZIP_DEFLATED) as zf:
-            zf.writestr("tax_summary.csv", csv_content)
-        mem_zip.seek(0)
-
+        arcname = "tax_summary.csv"
+        tax_zip, fingerprint = find_cached_zip(user, arcname, tax_records)
+        entries = [(arcname, tax_summary_lines(tax_records))]
         file_name = f"taxika_{user.username}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
-        django_file = ContentFile(mem_zip.read(), name=file_name)
-        tax_zip = TaxZip.objects.create(user=user, zip_file=django_file)
+        if _flag(request, "stream"):
+            if tax_zip:
+                return serve_file(request, tax_zip.zip_file)
+            return zip_response(iter_zip(entries), file_name)
+
+        if tax_zip is None:
+            with build_zip_file(entries, file_name) as zip_file:
+                tax_zip = TaxZip.objects.create(user=user, created_by=user, zip_file=zip_file, fingerprint=fingerprint)
 
         return Response({
             "message": "ZIP generated",
-            "download_url": request.build_absolute_uri(tax_zip.zip_file.url)
+            "download_url": download_url(request, "zip", tax_zip)
         })
 
 # 🧑‍💼 Agent: View Clients (Filtered)
@@ -141,74 +178,273 @@ class AgentClientListView(APIView):
     permission_classes = [IsAgent]
 
     def get(self, request):
-        agent = request.user
+        read_from_replica(request.user)
+        entry = self.cached_page(request)
+        headers = {"ETag": entry["etag"]}
+        if etag_matches(request, entry["etag"]):
+            return Response(status=304, headers=headers)
+        return Response(entry["data"], headers=headers)
+
+    def cached_page(self, request):
+        # Served from cache until a client or their records change
+        key = dashboard_cache_key(request.user.id, request)
+        entry = cache.get(key)
+        if entry is None:
+            entry = cache_dashboard(key, self.client_page(request))
+        return entry
+
+    def client_page(self, request):
         year = request.query_params.get("year")
         status = request.query_params.get("status")
 
-        clients = ClientProfile.objects.filter(agent=agent)
-        filtered_data = []
-
-        for client in clients:
-            tax_records = client.taxpayer.taxrecord_set.all()
-            if year:
-                tax_records = tax_records.filter(year=year)
-            if status == "filed":
-                tax_records = tax_records.exclude(computed_paye__isnull=True)
-            elif status == "unfiled":
-                tax_records = tax_records.filter(computed_paye__isnull=True)
+        tax_records = TaxRecord.objects.all()
+        if year:
+            tax_records = tax_records.filter(year=year)
+        if status == "filed":
+            tax_records = tax_records.exclude(computed_paye__isnull=True)
+        elif status == "unfiled":
+            tax_records = tax_records.filter(computed_paye__isnull=True)
+
+        # One query for clients + taxpayers, one for all their records; plain rows, no model instances
+        clients = active_clients(agent_id=request.user.id).values(
+            "id", "taxpayer_id", "taxpayer__username", "taxpayer__email"
+        )
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(clients, request, view=self)
+
+        records = defaultdict(list)
+        page_records = tax_records.filter(user_id__in=[client["taxpayer_id"] for client in page]).order_by("id")
+        for record in TAX_RECORD_ROWS.many(TAX_RECORD_ROWS.rows(page_records)):
+            records[record["user"]].append(record)
 
+        filtered_data = []
+        for client in page:
             filtered_data.append({
-                "taxpayer_name": client.taxpayer.username,
-                "taxpayer_email": client.taxpayer.email,
-                "tax_records": TaxRecordSerializer(tax_records, many=True).data
+                "taxpayer_name": client["taxpayer__username"],
+                "taxpayer_email": client["taxpayer__email"],
+                "tax_records": records[client["taxpayer_id"]]
             })
 
-        return Response(filtered_data)
+        return paginator.get_paginated_response(filtered_data).data
 
 # 📦 Agent: Generate ZIP for a client
-class GenerateClientZipView(APIView):
+class GenerateClientZipView(AdmissionMixin, APIView):
     permission_classes = [IsAgent]
+    throttle_scope = "export"
 
     def get(self, request, user_id):
         try:
-            client = User.objects.get(id=user_id, role="taxpayer")
+            client = active_users().get(id=user_id, role="taxpayer")
         except User.DoesNotExist:
             return Response({"error": "Client not found or not a taxpayer."}, status=404)
 
-        if not ClientProfile.objects.filter(agent=request.user, taxpayer=client).exists():
+        if not ClientProfile.objects.filter(agent_id=request.user.id, taxpayer=client).exists():
             return Response({"error": "You are not assigned to this client."}, status=403)
 
+        # Assignment was checked on primary; the record scans can use the replica
+        read_from_replica(request.user)
         tax_records = TaxRecord.objects.filter(user=client)
         if not tax_records.exists():
             return Response({"error": "No tax records found for this client."}, status=404)
 
-        lines = ["Tax Year,Gross Income,Taxable Income,Computed PAYE"]
-        for record in tax_records:
-            lines.append(f"{record.year},{record.gross_income},{record.taxable_income},{record.computed_paye}")
-
-        mem_zip = io.BytesIO()
-        with zipfile.ZipFile(mem_zip, "w", zipfile.ZIP_DEFLATED) as zf:
-            filename = f"{client.username}_summary_{datetime.datetime.now().strftime('%Y%m%d')}.csv"
-            zf.writestr(filename, "\n".join(lines))
-
-        mem_zip.seek(0)
+        summary_name = f"{client.username}_summary_{datetime.datetime.now().strftime('%Y%m%d')}.csv"
+        tax_zip, fingerprint = find_cached_zip(client, summary_name, tax_records)
+        entries = [(summary_name, tax_summary_lines(tax_records))]
         file_name = f"{client.username}_tax_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
-        django_file = ContentFile(mem_zip.read(), name=file_name)
-        TaxZip.objects.create(user=client, zip_file=django_file)
+        if _flag(request, "stream"):
+            if tax_zip:
+                return serve_file(request, tax_zip.zip_file)
+            return zip_response(iter_zip(entries), file_name)
+
+        if tax_zip is None:
+            with build_zip_file(entries, file_name) as zip_file:
+                tax_zip = TaxZip.objects.create(
+                    user=client, created_by=request.user, zip_file=zip_file, fingerprint=fingerprint
+                )
 
         return Response({
             "message": "Client ZIP generated",
-            "download_url": request.build_absolute_uri(django_file.name)
+            "download_url": download_url(request, "zip", tax_zip)
+        })
+
+# 📦 Agent: One ZIP with every client's summary
+class AgentBulkZipView(AdmissionMixin, APIView):
+    permission_classes = [IsAgent]
+    throttle_scope = "export"
+
+    def get(self, request):
+        agent = request.user
+        if not active_clients(agent=agent).exists():
+            return Response({"error": "You have no assigned clients."}, status=404)
+
+        read_from_replica(agent)
+        year = request.query_params.get("year")
+        suffix = f"_{year}" if year else ""
+        file_name = f"{agent.username}_clients{suffix}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+        tax_zip, client_count = agent_zip(agent, file_name, year=year)
+
+        return Response({
+            "message": "Bulk client ZIP generated",
+            "clients": client_count,
+            "download_url": download_url(request, "zip", tax_zip)
         })
 
+# 🏭 Agent: ingest P9s for many clients at once (a ZIP and/or several files)
+class AgentBulkP9UploadView(AdmissionMixin, APIView):
+    permission_classes = [IsAgent]
+    parser_classes = [MultiPartParser]
+    throttle_scope = "upload"
+
+    def max_upload_bytes(self):
+        # Room for the multipart framing around a full batch
+        return MAX_BULK_BYTES + 1024 * 1024
+
+    def post(self, request):
+        try:
+            rules = get_rules(request.data.get("year"))
+        except TaxYearRules.DoesNotExist:
+            return Response({"year": ["No tax rules for this year."]}, status=400)
+        try:
+            files = collect_files(request.FILES.get("archive"), request.FILES.getlist("files"))
+        except IngestError as e:
+            return Response({"error": str(e)}, status=400)
+
+        report = ingest_p9_files(request.user, rules, files)
+        summary = {}
+        for entry in report:
+            summary[entry["status"]] = summary.get(entry["status"], 0) + 1
+        return Response({"year": rules.year, "summary": summary, "files": report})
+
+# 📊 Agent (own book) or admin (everyone, or ?agent=<id>): per-year totals from the summary table
+class TaxSummaryView(APIView):
+    permission_classes = [IsAgent | IsAdminUser]
+
+    def get(self, request):
+        agent_id = None
+        if request.user.role == "agent":
+            agent_id = request.user.id
+        elif request.query_params.get("agent"):
+            try:
+                agent_id = int(request.query_params["agent"])
+            except ValueError:
+                return Response({"agent": ["Must be a user id."]}, status=400)
+
+        read_from_replica(request.user)
+        if agent_id is None:
+            clients = active_users().filter(role="taxpayer").count()
+        else:
+            clients = active_clients(agent_id=agent_id).count()
+        rows = TaxSummary.objects.filter(agent_id=agent_id).order_by("-year")
+        if request.query_params.get("year"):
+            rows = rows.filter(year=request.query_params["year"])
+
+        return Response({
+            "agent": agent_id,
+            "clients": clients,
+            "years": TaxSummarySerializer(rows, many=True, context={"clients": clients}).data
+        })
+
+# 📥 Download a stored export or P9 (bearer token or signed link from the views above)
+class DownloadView(APIView):
+    permission_classes = [permissions.AllowAny]
+    kind = None
+
+    def get(self, request, pk):
+        token = request.query_params.get("token")
+        if token:
+            user_id = link_user_id(token, self.kind, pk)
+            if user_id is None:
+                return Response({"error": "Download link is invalid or has expired."}, status=403)
+        elif request.user.is_authenticated:
+            user_id = request.user.id
+        else:
+            return Response({"error": "Authentication required."}, status=401)
+
+        model, field, _ = DOWNLOADS[self.kind]
+        obj = model.objects.filter(pk=pk).only("id", "user_id", field).first()
+        if obj is None:
+            return Response({"error": "File not found."}, status=404)
+        if not can_download(user_id, obj.user_id):
+            return Response({"error": "You do not have access to this file."}, status=403)
+
+        field_file = getattr(obj, field)
+        if not field_file or not field_file.storage.exists(field_file.name):
+            return Response({"error": "File not found."}, status=404)
+        return serve_file(request, field_file)
+
 # 👥 Admin-only User Management
 class UserListView(ListAPIView):
-    queryset = User.objects.all()
+    # Users queued for deletion are already gone as far as admins are concerned
+    queryset = active_users()
     serializer_class = UserSerializer
     permission_classes = [IsAdminUser]
+    pagination_class = KeysetPagination
+
+    def list(self, request, *args, **kwargs):
+        read_from_replica(request.user)
+        page = self.paginate_queryset(USER_ROWS.rows(self.filter_queryset(self.get_queryset())))
+        return self.get_paginated_response(USER_ROWS.many(page))
+
+# 🔢 Admin: users per role, counted in the database (the list only ever returns one page)
+class UserCountsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        read_from_replica(request.user)
+        counts = dict(
+            active_users().order_by().values_list("role").annotate(n=Count("id"))
+        )
+        return Response({
+            "total": sum(counts.values()),
+            "taxpayers": counts.get("taxpayer", 0),
+            "agents": counts.get("agent", 0),
+            "admins": counts.get("admin", 0),
+        })
 
 class UserDeleteView(DestroyAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [IsAdminUser]
     lookup_field = "id"
+
+    def destroy(self, request, *args, **kwargs):
+        job, = request_deletion([self.get_object()])
+        if _flag(request, "background", getattr(settings, "USER_DELETION_BACKGROUND", True)):
+            return Response(deletion_accepted(request, [job]), status=202)
+        claimed = claim_deletion(job)
+        if claimed is None:
+            # A worker is already on it
+            return Response(deletion_accepted(request, [job]), status=202)
+        # Same batches, run here; the user is already deactivated if this times out
+        job = process_deletion(claimed)
+        if job.status != "done":
+            return Response(UserDeletionJobSerializer(job).data, status=500)
+        return Response(status=204)
+
+# 🚪 Admin: deactivate many users now and delete them in the background
+class UserOffboardView(APIView):
+    permission_classes = [IsAdminUser]
+    max_users = 1000
+
+    def post(self, request):
+        ids = request.data.get("ids")
+        if not isinstance(ids, list) or not ids or not all(isinstance(i, int) for i in ids):
+            return Response({"ids": ["A non-empty list of user ids is required."]}, status=400)
+        if len(ids) > self.max_users:
+            return Response({"ids": [f"At most {self.max_users} users per request."]}, status=400)
+
+        users = list(User.objects.filter(id__in=ids).exclude(id=request.user.id).only("id", "username"))
+        if not users:
+            return Response({"error": "No matching users."}, status=404)
+        return Response(deletion_accepted(request, request_deletion(users)), status=202)
+
+# ⏳ Admin: progress of a background user deletion
+class UserDeletionStatusView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, job_id):
+        try:
+            job = UserDeletionJob.objects.get(id=job_id)
+        except UserDeletionJob.DoesNotExist:
+            return Response({"error": "Job not found."}, status=404)
+        return Response(UserDeletionJobSerializer(job).data)
@@ -30,10 +30,35 @@ ALLOWED_HOSTS = []
 
 # Application definition
 
+# Authorize API calls from the JWT's user id plus a per-process cache of the
+# user's role/active flags (re-read every JWT_USER_STATUS_SECONDS) instead of
+# loading the User row on every request; the row is still loaded on first use
+JWT_STATELESS_AUTH = False
+JWT_USER_STATUS_SECONDS = 60
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-    )
+        'core.authentication.StatelessJWTAuthentication' if JWT_STATELESS_AUTH
+        else 'rest_framework_simplejwt.authentication.JWTAuthentication',
+    ),
+    # Cursor pagination for list endpoints (see core.pagination)
+    'DEFAULT_PAGINATION_CLASS': 'core.pagination.KeysetPagination',
+    'PAGE_SIZE': 50,
+    # orjson when installed, DRF's stdlib renderer otherwise
+    'DEFAULT_RENDERER_CLASSES': (
+        'core.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    # Per-user rates for the expensive endpoints (core.throttling): '<scope>.<role>'
+    # overrides '<scope>', and '<scope>.<role>.all' caps everyone in that role together
+    'DEFAULT_THROTTLE_RATES': {
+        'upload': '20/min',
+        'upload.agent': '30/min',
+        'upload.agent.all': '300/min',
+        'export': '20/min',
+        'export.agent': '60/min',
+        'export.agent.all': '600/min',
+    },
 }
 
 
@@ -51,6 +76,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.instrumentation.PerformanceMiddleware',
+    'core.compression.CompressionMiddleware',
+    'core.routers.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -95,6 +123,37 @@ DATABASES = {
     }
 }
 
+# Read-heavy endpoints (client lists, user list, export scans) read from this
+# alias when it is configured; see taxika/settings_replica.py. Users who just
+# wrote, and requests sending "X-Stick-To-Primary: 1", stay on primary.
+DATABASE_ROUTERS = ['core.routers.PrimaryReplicaRouter']
+REPLICA_DATABASE = 'replica'
+REPLICA_PIN_SECONDS = 10
+
+
+# Cache
+# File-based so every worker process on a host sees the same entries and
+
+# signal-driven invalidations (point at Redis/Memcached when scaling out).
+# Django's default MAX_ENTRIES (300) would cull on nearly every write once
+# dashboard pages and export fingerprints pile up, so both are sized here.
+# Replica pins and throttle histories live apart in 'coordination': culling
+# them would bring back stale reads and reset rate windows.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / '.cache',
+        'OPTIONS': {'MAX_ENTRIES': 20000, 'CULL_FREQUENCY': 10},
+    },
+    'coordination': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / '.cache' / 'coordination',
+        'OPTIONS': {'MAX_ENTRIES': 50000, 'CULL_FREQUENCY': 10},
+    },
+}
+COORDINATION_CACHE = 'coordination'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -142,3 +201,68 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = 'core.User'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+
+# Request instrumentation (core.instrumentation): requests slower than this are
+# logged with their worst queries; histograms land in PERF_METRICS_DIR and are
+# summarised by `manage.py perf_report`
+SLOW_REQUEST_MS = 1000
+PERF_METRICS_DIR = BASE_DIR / '.perf'
+
+# Queue P9 uploads for `manage.py process_p9_jobs` instead of processing them in
+# the request (can also be chosen per request with ?background=1)
+P9_BACKGROUND_UPLOADS = False
+
+# Deleting a user deactivates them at once and leaves the row and file removal
+# to `manage.py process_p9_jobs`, in small batches (?background=0 runs the
+# same batches in the request)
+USER_DELETION_BACKGROUND = True
+
+# Re-uploads for a year update that year's TaxRecord from the stored monthly
+# P9 lines, writing only months that changed (?incremental=0 adds a new record)
+P9_INCREMENTAL_UPLOADS = True
+
+# An upload with the same bytes as the user's last one for that year returns
+# the existing result; identical files from different users share one blob
+P9_SHARE_IDENTICAL_FILES = True
+
+# File downloads (core.downloads): set to 'x-accel-redirect' behind nginx or
+# 'x-sendfile' behind Apache/lighttpd so the proxy streams the bytes. For nginx,
+# map the prefix onto MEDIA_ROOT with an internal location, e.g.
+#   location /protected-media/ { internal; alias /path/to/backend/media/; }
+DOWNLOAD_OFFLOAD = None
+DOWNLOAD_ACCEL_PREFIX = '/protected-media/'
+
+# Threads the async views (core.async_views) use for CSV parsing, compression
+# and file writes; defaults to min(4, CPU count)
+ASYNC_CPU_WORKERS = None
+
+# Processes that parse P9s in agent bulk ingests (core.ingest); defaults to
+# the CPU count. Batches under 8 files are always parsed in-process
+BULK_INGEST_PROCESSES = None
+
+# Processes that deflate client summaries for agent bulk exports (core.exports);
+# defaults to the CPU count. Agents with fewer than 20 clients are exported in-process
+BULK_EXPORT_PROCESSES = None
+
+# JSON and text responses are brotli-compressed for clients that accept it
+# (when the brotli package is installed) and gzipped otherwise
+RESPONSE_COMPRESSION = True
+
+# Export retention (`manage.py gc_storage`): each user keeps their newest
+# TAXZIP_KEEP_LAST exports, none older than TAXZIP_MAX_AGE_DAYS; None turns a
+# limit off. Per-role overrides, e.g. {'agent': {'keep_last': 20}}
+TAXZIP_KEEP_LAST = 5
+TAXZIP_MAX_AGE_DAYS = 30
+TAXZIP_RETENTION_BY_ROLE = {}
+# Uploaded P9 CSVs older than this are deleted (their months stay in P9Line); None keeps them
+P9_UPLOAD_MAX_AGE_DAYS = None
+
+# Uploads (P9s, agent bulk ingests) and ZIP exports run at most
+# EXPENSIVE_REQUEST_SLOTS at a time per process, and a role at most its share in
+# EXPENSIVE_SLOTS_BY_ROLE, so agents' batches leave room for taxpayers. A full
+# process answers 503 with Retry-After instead of queueing
+EXPENSIVE_REQUEST_SLOTS = 8
+EXPENSIVE_SLOTS_BY_ROLE = {'agent': 6}
+EXPENSIVE_RETRY_AFTER_SECONDS = 2
+# P9 uploads larger than this are refused (413) before the body is read
+P9_UPLOAD_MAX_BYTES = 10 * 1024 * 1024
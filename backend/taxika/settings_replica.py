@@ -0,0 +1,38 @@
+"""
+Primary + read replica with pooled connections.
+
+    DJANGO_SETTINGS_MODULE=taxika.settings_replica
+
+Hosts come from TAXIKA_DB_HOST / TAXIKA_REPLICA_HOST. With psycopg 3 and
+psycopg-pool installed each process keeps a connection pool per alias;
+otherwise connections are kept open between requests (CONN_MAX_AGE).
+"""
+import os
+
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASES as _BASE_DATABASES
+
+try:
+    import psycopg_pool  # noqa: F401
+except ImportError:
+    _CONNECTIONS = {'CONN_MAX_AGE': 60, 'CONN_HEALTH_CHECKS': True}
+else:
+    # Django's pool needs CONN_MAX_AGE = 0; the pool itself keeps connections open
+    _CONNECTIONS = {'CONN_MAX_AGE': 0, 'OPTIONS': {'pool': {'min_size': 2, 'max_size': 10, 'timeout': 10}}}
+
+_primary = _BASE_DATABASES['default']
+
+DATABASES = {
+    'default': {
+        **_primary,
+        **_CONNECTIONS,
+        'HOST': os.environ.get('TAXIKA_DB_HOST', _primary['HOST']),
+    },
+    'replica': {
+        **_primary,
+        **_CONNECTIONS,
+        'HOST': os.environ.get('TAXIKA_REPLICA_HOST', _primary['HOST']),
+        # Tests create no separate replica; it mirrors the test primary
+        'TEST': {'MIRROR': 'default'},
+    },
+}
@@ -0,0 +1,20 @@
+"""
+Two independent local SQLite databases for exercising replica routing:
+
+    python manage.py test core.tests.ReplicaRoutingTests --settings=taxika.settings_test_replica
+
+Nothing replicates between them, so a read that reaches the replica sees
+none of the rows written to primary. The rest of the suite runs here too:
+reads only go to the replica where a test turns routing on with
+override_settings(REPLICA_DATABASE='replica').
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR
+
+DATABASES = {
+    'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / 'primary.sqlite3'},
+    'replica': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / 'replica.sqlite3'},
+}
+
+# Routing off unless a test opts in; see ReplicaRoutingTests
+REPLICA_DATABASE = None
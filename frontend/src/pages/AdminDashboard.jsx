@@ -12,28 +12,47 @@ export default function AdminDashboard() {
     admins: 0,
   });
 
+  const [next, setNext] = useState(null); // 📄 cursor URL of the next page, if any
+
   useEffect(() => {
     fetchUsers();
   }, []);
 
+  const authHeaders = () => ({
+    Authorization: `Bearer ${localStorage.getItem("access")}`,
+  });
+
+  // 🔢 Counted by the server; the list below only holds the pages loaded so far
+  const fetchCounts = async () => {
+    try {
+      const res = await axios.get("http://localhost:8000/api/users/counts/", {
+        headers: authHeaders(),
+      });
+      setCounts(res.data);
+    } catch (err) {
+      console.error("Error fetching user counts", err);
+    }
+  };
+
   const fetchUsers = async () => {
+    fetchCounts();
     try {
       const res = await axios.get("http://localhost:8000/api/users/", {
-        headers: {
-          Authorization: `Bearer ${localStorage.getItem("access")}`,
-        },
+        headers: authHeaders(),
       });
 
-      const users = res.data;
-      const count = {
-        total: users.length,
-        taxpayers: users.filter((u) => u.role === "taxpayer").length,
-        agents: users.filter((u) => u.role === "agent").length,
-        admins: users.filter((u) => u.role === "admin").length,
-      };
+      setUsers(res.data.results);
+      setNext(res.data.next);
+    } catch (err) {
+      console.error("Error fetching users", err);
+    }
+  };
 
-      setUsers(users);
-      setCounts(count);
+  const loadMore = async () => {
+    try {
+      const res = await axios.get(next, { headers: authHeaders() });
+      setUsers((loaded) => [...loaded, ...res.data.results]);
+      setNext(res.data.next);
     } catch (err) {
       console.error("Error fetching users", err);
     }
@@ -45,12 +64,11 @@ export default function AdminDashboard() {
 
     try {
       await axios.delete(`http://localhost:8000/api/users/${userId}/`, {
-        headers: {
-          Authorization: `Bearer ${localStorage.getItem("access")}`,
-        },
+        headers: authHeaders(),
       });
 
       setUsers(users.filter((u) => u.id !== userId));
+      fetchCounts();
     } catch (err) {
       alert("Failed to delete user.");
       console.error(err);
@@ -120,6 +138,16 @@ export default function AdminDashboard() {
             {users.length === 0 && (
               <p className="text-center py-4 text-gray-500">No users found.</p>
             )}
+            {next && (
+              <div className="text-center pt-4">
+                <button
+                  onClick={loadMore}
+                  className="bg-indigo-600 hover:bg-indigo-700 text-white px-4 py-1 rounded text-sm"
+                >
+                  ⬇️ Load more
+                </button>
+              </div>
+            )}
           </div>
         </div>
       </section>
@@ -7,6 +7,7 @@ export default function AgentDashboard() {
   const [year, setYear] = useState("");         // 🔍 year filter
   const [status, setStatus] = useState("");     // 🔍 tax status filter
   const [loading, setLoading] = useState(true);
+  const [next, setNext] = useState(null);       // 📄 cursor URL of the next page, if any
   const token = localStorage.getItem("access");
 
   useEffect(() => {
@@ -24,7 +25,8 @@ export default function AgentDashboard() {
         headers: { Authorization: `Bearer ${token}` },
       });
 
-      setClients(res.data);
+      setClients(res.data.results);
+      setNext(res.data.next);
     } catch (err) {
       alert("❌ Failed to load client list.");
     } finally {
@@ -32,6 +34,19 @@ export default function AgentDashboard() {
     }
   };
 
+  // ⬇️ The next cursor page keeps the year and status filters
+  const loadMore = async () => {
+    try {
+      const res = await api.get(next, {
+        headers: { Authorization: `Bearer ${token}` },
+      });
+      setClients((loaded) => [...loaded, ...res.data.results]);
+      setNext(res.data.next);
+    } catch (err) {
+      alert("❌ Failed to load more clients.");
+    }
+  };
+
   const handleDownloadZip = async (userId) => {
     try {
       const res = await api.post(`/agent/clients/${userId}/zip/`, {}, {
@@ -126,6 +141,16 @@ export default function AgentDashboard() {
                 )}
               </div>
             ))}
+            {next && (
+              <div className="text-center">
+                <button
+                  onClick={loadMore}
+                  className="bg-white text-indigo-700 hover:bg-indigo-100 px-4 py-2 rounded text-sm font-semibold"
+                >
+                  ⬇️ Load more clients
+                </button>
+              </div>
+            )}
           </div>
         )}
       </main>